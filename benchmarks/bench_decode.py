@@ -0,0 +1,106 @@
+"""Benchmark of decoding and merging large consumption payloads.
+
+Compares the previous pipeline (response.json() with the stdlib parser,
+then nested .get() lookups) to brunata.decode.consumption_lines with orjson,
+when installed, and with the stdlib fallback. Each pipeline merges the
+values of a synthetic payload into a new ConsumptionStore.
+
+    python benchmarks/bench_decode.py
+    python benchmarks/bench_decode.py --meters 100 --days 366
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import date, timedelta
+import json
+import statistics
+import time
+from unittest.mock import patch
+
+from common import setup_path
+
+setup_path()
+
+from custom_components.maxx_hacs_testing.brunata import decode  # noqa: E402
+from custom_components.maxx_hacs_testing.brunata.const import Consumption, Interval  # noqa: E402
+from custom_components.maxx_hacs_testing.brunata.store import ConsumptionStore  # noqa: E402
+
+
+def payload(meters: int, days: int) -> bytes:
+    """Return a consumption payload with some meters of daily values."""
+    start = date(2024, 1, 1)
+    return json.dumps(
+        {
+            "consumptionLines": [
+                {
+                    "meter": {"meterId": f"meter-{index}", "placement": f"Room {index}"},
+                    "consumptionValues": [
+                        {
+                            "fromDate": f"{start + timedelta(days=day)}T00:00:00.000Z",
+                            "toDate": f"{start + timedelta(days=day)}T23:59:59.999Z",
+                            "consumption": None if day % 50 == 49 else day * 0.1,
+                        }
+                        for day in range(days)
+                    ],
+                }
+                for index in range(meters)
+            ]
+        }
+    ).encode()
+
+
+def previous(body: bytes, store: ConsumptionStore) -> None:
+    """The pipeline before the decoding stage."""
+    lines = json.loads(body)
+    for index, meter in enumerate(lines["consumptionLines"]):
+        store.merge(
+            Consumption.WATER,
+            Interval.DAY,
+            meter.get("meter").get("meterId") or index,
+            meter.get("meter").get("placement") or index,
+            (
+                (entry.get("fromDate")[:10], entry.get("consumption"))
+                for entry in meter["consumptionValues"]
+                if entry.get("consumption") is not None
+            ),
+        )
+
+
+def decoded(body: bytes, store: ConsumptionStore) -> None:
+    """The pipeline with the decoding stage."""
+    for meter_id, name, values in decode.consumption_lines(body, 10):
+        store.merge(Consumption.WATER, Interval.DAY, meter_id, name, values)
+
+
+def measure(pipeline, body: bytes, rounds: int) -> float:
+    """Return the median milliseconds of a pipeline."""
+    timings = []
+    for _ in range(rounds):
+        store = ConsumptionStore()
+        start = time.perf_counter()
+        pipeline(body, store)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--meters", type=int, default=30)
+    parser.add_argument("--days", type=int, default=366)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    body = payload(args.meters, args.days)
+    print(
+        f"{args.meters} meters x {args.days} days = {args.meters * args.days} values, "
+        f"{len(body) / 1024:.0f} KiB"
+    )
+    print(f"previous (json, .get)     {measure(previous, body, args.rounds):8.2f} ms")
+    if decode.loads is not json.loads:
+        print(f"decode (orjson)           {measure(decoded, body, args.rounds):8.2f} ms")
+    with patch.object(decode, "loads", json.loads):
+        print(f"decode (json fallback)    {measure(decoded, body, args.rounds):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark of the time it takes to import the integration.
+
+Imports each module of the integration in a fresh interpreter with
+python -X importtime and reports the median over some rounds. The total
+counts every module it pulls in, the own time only the modules of the
+integration. Home Assistant is stubbed when it is not installed. The libraries
+Home Assistant itself has already loaded (aiohttp, orjson) are imported
+first, so they do not count. Bytecode is written by a first untimed round,
+as it is when Home Assistant runs.
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --rounds 20 --top 10
+"""
+from __future__ import annotations
+
+import argparse
+from collections import defaultdict
+import importlib.util
+import os
+from pathlib import Path
+import re
+import statistics
+import subprocess
+import sys
+
+from common import STUBBED
+
+PACKAGE = "custom_components.maxx_hacs_testing"
+# Modules Home Assistant loads on its own: setup, config flow, client
+MODULES = (PACKAGE, f"{PACKAGE}.config_flow", f"{PACKAGE}.brunata.api")
+# Libraries already imported by Home Assistant when the integration loads
+PRELOAD = ("aiohttp", "orjson")
+IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def import_times(module: str) -> list[tuple[str, int, int]]:
+    """Import a module in a fresh interpreter, returning (name, self µs, cumulative µs)."""
+    preload = [name for name in PRELOAD if importlib.util.find_spec(name)]
+    code = (
+        "from common import setup_path\n"
+        "setup_path()\n"
+        + "".join(f"import {name}\n" for name in preload)
+        + "import sys\n"
+        "sys.stderr.write('--- start\\n')\n"
+        f"import {module}\n"
+    )
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONDONTWRITEBYTECODE"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=Path(__file__).parent,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    times = []
+    for line in result.stderr.split("--- start\n", 1)[1].splitlines():
+        if match := IMPORTTIME.match(line):
+            times.append((match[4], int(match[1]), int(match[2])))
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports to list")
+    args = parser.parse_args()
+
+    print(f"{'module':<48}{'total ms':>10}{'own ms':>10}")
+    heaviest: dict[str, list[int]] = defaultdict(list)
+    for module in MODULES:
+        import_times(module)
+        totals, owns = [], []
+        for _ in range(args.rounds):
+            times = import_times(module)
+            # Modules are listed after their imports, the target comes last
+            totals.append(times[-1][2] if times else 0)
+            owns.append(sum(own for name, own, _ in times if name.startswith(PACKAGE)))
+            if module == PACKAGE:
+                for name, own, _ in times:
+                    if not name.startswith(PACKAGE) and name.split(".")[0] not in STUBBED:
+                        heaviest[name].append(own)
+        print(
+            f"{module:<48}{statistics.median(totals) / 1000:>10.2f}"
+            f"{statistics.median(owns) / 1000:>10.2f}"
+        )
+
+    print(f"\nHeaviest imports pulled in by {PACKAGE}:")
+    for name, times in sorted(
+        heaviest.items(), key=lambda item: statistics.median(item[1]), reverse=True
+    )[: args.top]:
+        print(f"  {name:<46}{statistics.median(times) / 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
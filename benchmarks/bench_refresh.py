@@ -0,0 +1,291 @@
+"""Benchmark of a full refresh against a local fake Brunata server.
+
+Drives MaxxHacsTestingApiClient.async_get_data end to end against the fake
+server of the tests, which runs on its own thread and event loop so that its
+work does not count as client time. For each scenario a cold refresh (login,
+topology and whole month), a warm one (valid token, incremental) and a steady
+one (the same incremental windows again) are run, reporting wall time,
+requests, bytes received, peak memory and the longest event loop stall.
+
+Results are compared to the baseline when it exists, and the script exits
+with 1 on regressions. --save writes the results as the new baseline instead.
+The refreshes run on a pinned date, so their requests and bytes only depend
+on the code and are kept in benchmarks/baseline.json, which is committed.
+Timings and memory depend on the machine and are kept in
+benchmarks/baseline.local.json, which is not.
+
+    python benchmarks/bench_refresh.py
+    python benchmarks/bench_refresh.py --units 400 --meters 2 --latency 0.05
+    python benchmarks/bench_refresh.py --save
+
+--etags makes the server send ETags and answer unchanged responses with
+304 Not Modified.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import datetime
+import json
+import logging
+from pathlib import Path
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from common import setup_path
+
+BASELINE = Path(__file__).with_name("baseline.json")
+LOCAL_BASELINE = Path(__file__).with_name("baseline.local.json")
+setup_path()
+
+from custom_components.maxx_hacs_testing.api import (  # noqa: E402
+    MaxxHacsTestingApiClient,
+    create_client_session,
+)
+from custom_components.maxx_hacs_testing.brunata import api as brunata_api  # noqa: E402
+from fake_brunata import FakeBrunata  # noqa: E402
+
+# name: (allocation units, meters per unit, latency in seconds)
+SCENARIOS = {
+    "small": (2, 1, 0.0),
+    "medium": (50, 2, 0.01),
+    "large": (200, 2, 0.02),
+}
+# Relative increase of each metric counted as a regression
+TOLERANCES = {
+    "wall_s": 0.5,
+    "requests": 0.0,
+    "bytes": 0.0,
+    "peak_kib": 0.5,
+    "stall_ms": 1.0,
+}
+# Metrics kept in BASELINE, the others in LOCAL_BASELINE
+DETERMINISTIC = ("requests", "bytes")
+# Date of the refreshes, so the windows asked for don't depend on the day
+TODAY = datetime(2026, 1, 15, 12)
+# Seconds between event loop stall probes
+STALL_PROBE = 0.001
+
+
+class ServerThread:
+    """Runs a FakeBrunata on its own thread and event loop."""
+
+    def __init__(self, **kwargs) -> None:
+        self.server = FakeBrunata(**kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def __enter__(self) -> FakeBrunata:
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.__aenter__(), self._loop).result()
+        return self.server
+
+    def __exit__(self, *exc) -> None:
+        asyncio.run_coroutine_threadsafe(self.server.__aexit__(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class _PinnedDatetime(datetime):
+    """datetime whose now() is TODAY."""
+
+    @classmethod
+    def now(cls, tz=None):
+        return TODAY if tz is None else TODAY.astimezone(tz)
+
+
+def spread_units(count: int) -> dict[int, list[str]]:
+    """Spread allocation units over the consumption types."""
+    types = [consumption.value for consumption in brunata_api.Consumption]
+    units: dict[int, list[str]] = {}
+    for index in range(count):
+        units.setdefault(types[index % len(types)], []).append(f"U{index}")
+    return units
+
+
+async def _probe_stalls(stall: list[float]) -> None:
+    """Record how much later than asked the event loop wakes up."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(STALL_PROBE)
+        stall[0] = max(stall[0], loop.time() - start - STALL_PROBE)
+
+
+async def _measure(
+    client: MaxxHacsTestingApiClient, server: FakeBrunata, trace_memory: bool
+) -> dict:
+    """Run one refresh and return its metrics.
+
+    Tracing memory slows everything down, so the timings of such a run are
+    left out and the other runs do not report memory.
+    """
+    requests, received = len(server.requests), server.bytes_sent
+    stall = [0.0]
+    probe = asyncio.create_task(_probe_stalls(stall))
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    await client.async_get_data()
+    wall = time.perf_counter() - start
+    probe.cancel()
+    metrics = {
+        "requests": len(server.requests) - requests,
+        "bytes": server.bytes_sent - received,
+    }
+    if trace_memory:
+        metrics["peak_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    else:
+        metrics["wall_s"] = wall
+        metrics["stall_ms"] = stall[0] * 1000
+    return metrics
+
+
+async def _run_round(
+    units: int, meters: int, latency: float, etags: bool, trace_memory: bool = False
+) -> dict:
+    """Run a cold, a warm and a steady refresh on a new server and client."""
+    with ServerThread(
+        latency=latency,
+        units=spread_units(units),
+        meters_per_unit=meters,
+        etags=etags,
+        today=TODAY,
+    ) as server, patch.dict(
+        brunata_api.__dict__, {**server.urls(), "datetime": _PinnedDatetime}
+    ):
+        session = create_client_session()
+        try:
+            client = MaxxHacsTestingApiClient("user", "pass", session)
+            return {
+                "cold": await _measure(client, server, trace_memory),
+                "warm": await _measure(client, server, trace_memory),
+                "steady": await _measure(client, server, trace_memory),
+            }
+        finally:
+            await session.close()
+
+
+def run_scenario(
+    units: int, meters: int, latency: float, rounds: int, etags: bool = False
+) -> dict:
+    """Return the median timings over some rounds and the peak memory of one more."""
+    results = [
+        asyncio.run(_run_round(units, meters, latency, etags)) for _ in range(rounds)
+    ]
+    memory = asyncio.run(_run_round(units, meters, latency, etags, trace_memory=True))
+    return {
+        phase: {
+            "wall_s": statistics.median(result[phase]["wall_s"] for result in results),
+            "requests": results[0][phase]["requests"],
+            "bytes": results[0][phase]["bytes"],
+            "peak_kib": memory[phase]["peak_kib"],
+            "stall_ms": statistics.median(result[phase]["stall_ms"] for result in results),
+        }
+        for phase in ("cold", "warm", "steady")
+    }
+
+
+def load_baseline() -> dict:
+    """Return the committed and the local baseline, merged by scenario and phase."""
+    baseline: dict = {}
+    for path in (BASELINE, LOCAL_BASELINE):
+        if not path.exists():
+            continue
+        for name, phases in json.loads(path.read_text()).items():
+            for phase, metrics in phases.items():
+                baseline.setdefault(name, {}).setdefault(phase, {}).update(metrics)
+    return baseline
+
+
+def save_baseline(baseline: dict) -> None:
+    """Save the deterministic metrics to BASELINE and the others to LOCAL_BASELINE."""
+    for path, deterministic in ((BASELINE, True), (LOCAL_BASELINE, False)):
+        split = {
+            name: {
+                phase: {
+                    metric: value
+                    for metric, value in metrics.items()
+                    if (metric in DETERMINISTIC) == deterministic
+                }
+                for phase, metrics in phases.items()
+            }
+            for name, phases in baseline.items()
+        }
+        path.write_text(json.dumps(split, indent=2) + "\n")
+        print(f"Saved baseline to {path}")
+
+
+def regressions(name: str, result: dict, baseline: dict) -> list[str]:
+    """Return the metrics of a scenario that got worse than the baseline."""
+    found = []
+    for phase, metrics in result.items():
+        for metric, value in metrics.items():
+            if (before := baseline.get(phase, {}).get(metric)) is None:
+                continue
+            limit = before * (1 + TOLERANCES[metric])
+            # Tiny timings are noise, give them some absolute slack
+            if metric == "stall_ms":
+                limit = max(limit, 5.0)
+            if value > limit:
+                found.append(f"{name} {phase} {metric}: {value:.3f} > {before:.3f}")
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, help="allocation units of a custom scenario")
+    parser.add_argument("--meters", type=int, default=1, help="meters per unit")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--etags", action="store_true", help="server sends ETags and 304s")
+    parser.add_argument("--save", action="store_true", help="save as the new baseline")
+    args = parser.parse_args()
+    for logger in ("custom_components", "aiohttp.access", "asyncio"):
+        logging.getLogger(logger).setLevel(logging.WARNING)
+
+    if args.units:
+        scenarios = {
+            f"custom-{args.units}x{args.meters}@{args.latency}": (
+                args.units, args.meters, args.latency
+            )
+        }
+    else:
+        scenarios = SCENARIOS
+    if args.etags:
+        scenarios = {f"{name}+etags": scenario for name, scenario in scenarios.items()}
+    baseline = load_baseline()
+
+    results = {}
+    found = []
+    print(f"{'scenario':<24}{'phase':<6}{'wall s':>9}{'requests':>10}{'bytes':>11}"
+          f"{'peak KiB':>10}{'stall ms':>10}")
+    for name, (units, meters, latency) in scenarios.items():
+        results[name] = result = run_scenario(
+            units, meters, latency, args.rounds, args.etags
+        )
+        for phase, metrics in result.items():
+            print(
+                f"{name:<24}{phase:<6}{metrics['wall_s']:>9.3f}{metrics['requests']:>10.0f}"
+                f"{metrics['bytes']:>11.0f}{metrics['peak_kib']:>10.0f}"
+                f"{metrics['stall_ms']:>10.1f}"
+            )
+        if name in baseline:
+            found += regressions(name, result, baseline[name])
+
+    if args.save:
+        save_baseline({**baseline, **results})
+        return 0
+    for regression in found:
+        print(f"REGRESSION {regression}")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Shared setup of the benchmarks."""
+from importlib.abc import Loader, MetaPathFinder
+import importlib.util
+from pathlib import Path
+import sys
+from types import ModuleType
+
+ROOT = Path(__file__).resolve().parents[1]
+# Home Assistant and the libraries it brings that the integration imports
+STUBBED = ("homeassistant", "voluptuous")
+
+
+class _Stub(type):
+    """A stand-in for anything of a stubbed package.
+
+    It can be subclassed, used as a decorator, and its attributes are stubs
+    too. Unlike mocks, stubs cost next to nothing to create, so they do not
+    skew the timings.
+    """
+
+    def __new__(mcs, name, bases=(), namespace=None, **kwargs):
+        return super().__new__(mcs, name, bases, dict(namespace or {}))
+
+    def __init__(cls, name, bases=(), namespace=None, **kwargs):
+        super().__init__(name, bases, dict(namespace or {}))
+
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        setattr(cls, name, stub := _Stub(name))
+        return stub
+
+    def __getitem__(cls, item):
+        return cls
+
+    def __call__(cls, *args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return _Stub(cls.__name__)
+
+
+class _StubModule(ModuleType):
+    """A module of a stubbed package whose attributes are stubs."""
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        setattr(self, name, stub := _Stub(name))
+        return stub
+
+
+class _StubFinder(MetaPathFinder, Loader):
+    """Imports every module of some packages as a stub module."""
+
+    def __init__(self, packages: list[str]) -> None:
+        self._packages = packages
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname.split(".", 1)[0] in self._packages:
+            return importlib.util.spec_from_loader(fullname, self, is_package=True)
+        return None
+
+    def create_module(self, spec):
+        return _StubModule(spec.name)
+
+    def exec_module(self, module):
+        pass
+
+
+def setup_path() -> None:
+    """Make the integration and the fake server of the tests importable.
+
+    Only the integration is measured, so Home Assistant is stubbed when it
+    is not installed.
+    """
+    sys.path[:0] = [str(ROOT), str(ROOT / "tests")]
+    if missing := [name for name in STUBBED if importlib.util.find_spec(name) is None]:
+        sys.meta_path.append(_StubFinder(missing))
@@ -1,41 +1,117 @@
 """The Maxx HACS Testing integration."""
 from __future__ import annotations
 
+from datetime import date, timedelta
+from functools import partial
+
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.helpers.storage import Store
 
-from .api import MaxxHacsTestingApiClient
-from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD
+from .client_registry import async_get_client_registry
+from .const import (
+    DOMAIN,
+    CONF_USERNAME,
+    CONF_PASSWORD,
+    CONF_TOPOLOGY_TTL,
+    CONF_BACKFILL_START,
+    CONF_MAX_INTERVAL,
+    CONF_MIN_INTERVAL,
+    CONF_POLL_HOURS,
+    DEFAULT_MAX_INTERVAL,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_TOPOLOGY_TTL,
+    SERVICE_REDISCOVER_METERS,
+    STORAGE_VERSION,
+)
 from .coordinator import MaxxHacsTestingDataUpdateCoordinator
+from .response_cache import async_get_response_cache
+from .schedule import AdaptivePollSchedule, parse_hours
+from .statistics import MaxxHacsTestingStatisticsImporter
 
 PLATFORMS: list[Platform] = [Platform.SENSOR]
 
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
-
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Maxx HACS Testing from a config entry."""
     hass.data.setdefault(DOMAIN, {})
 
-    session = async_get_clientsession(hass)
-    client = MaxxHacsTestingApiClient(
-        username=entry.data[CONF_USERNAME],
-        password=entry.data[CONF_PASSWORD],
-        session=session,
+    # Entries of the same account share one client, and the one the config
+    # flow logged in with, so setting up does not log in again
+    registry = await async_get_client_registry(hass)
+    client = await registry.async_acquire(
+        entry.entry_id,
+        entry.data[CONF_USERNAME],
+        entry.data[CONF_PASSWORD],
+        topology_ttl=timedelta(
+            hours=entry.options.get(CONF_TOPOLOGY_TTL, DEFAULT_TOPOLOGY_TTL)
+        ),
+    )
+    entry.async_on_unload(partial(registry.async_release, entry.entry_id))
+    response_cache = await async_get_response_cache(hass)
+    store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+    backfill = None
+    if backfill_start := entry.options.get(CONF_BACKFILL_START):
+        # Only entries with a backfill start need it
+        from .backfill import MaxxHacsTestingBackfill
+
+        backfill = MaxxHacsTestingBackfill(client, date.fromisoformat(backfill_start))
+    schedule = AdaptivePollSchedule(
+        min_interval=timedelta(
+            minutes=entry.options.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL)
+        ),
+        max_interval=timedelta(
+            minutes=entry.options.get(CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL)
+        ),
+        poll_hours=parse_hours(entry.options.get(CONF_POLL_HOURS, "")),
     )
-    coordinator = MaxxHacsTestingDataUpdateCoordinator(hass, client)
-    
+    coordinator = MaxxHacsTestingDataUpdateCoordinator(
+        hass, client, store, backfill, schedule, response_cache
+    )
+    entry.async_on_unload(coordinator.async_cancel_retry)
+    await coordinator.async_load()
+
     await coordinator.async_config_entry_first_refresh()
+    # Refreshes made for the other entries of the account update this one too
+    entry.async_on_unload(client.add_data_listener(coordinator.async_set_shared_data))
+
+    # Daily values go into long-term statistics on their real dates
+    importer = MaxxHacsTestingStatisticsImporter(hass, client, entry.entry_id)
+    entry.async_on_unload(coordinator.async_add_listener(importer.async_schedule_import))
+    importer.async_schedule_import()
 
     hass.data[DOMAIN][entry.entry_id] = coordinator
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+
+    if not hass.services.has_service(DOMAIN, SERVICE_REDISCOVER_METERS):
+
+        async def async_rediscover_meters(call: ServiceCall) -> None:
+            """Download the meter topology of every account again."""
+            for coordinator in hass.data[DOMAIN].values():
+                await coordinator.async_rediscover_meters()
+
+        hass.services.async_register(
+            DOMAIN, SERVICE_REDISCOVER_METERS, async_rediscover_meters
+        )
+
     return True
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
         hass.data[DOMAIN].pop(entry.entry_id)
+        if not hass.data[DOMAIN]:
+            hass.services.async_remove(DOMAIN, SERVICE_REDISCOVER_METERS)
 
     return unload_ok
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the tokens, topology and backfill progress stored for an entry."""
+    await Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}").async_remove()
+
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload a config entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
@@ -1,26 +1,79 @@
 """Sample API Client."""
+from __future__ import annotations
+
 import logging
 import asyncio
 import random
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
 import aiohttp
 from .brunata import api as brunata_api
+from .const import DEFAULT_TOPOLOGY_TTL
 
 _LOGGER = logging.getLogger(__name__)
 
+# Idle connections are kept this long so a refresh reuses warm TLS connections
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+
+
+# Consumption types and the names they are reported under
+CONSUMPTION_TYPES = (
+    (brunata_api.Consumption.HEATING, "Heating"),
+    (brunata_api.Consumption.WATER, "Water"),
+    (brunata_api.Consumption.ELECTRICITY, "Electricity"),
+    (brunata_api.Consumption.OTHER, "Other"),
+)
+
+
+def create_client_session() -> aiohttp.ClientSession:
+    """Create a session with a connection pool sized for one Brunata account."""
+    connector = aiohttp.TCPConnector(
+        limit_per_host=brunata_api.MAX_CONCURRENT_REQUESTS,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
 class MaxxHacsTestingApiClient:
     """Sample API Client."""
 
     def __init__(
-        self, username: str, password: str, session: aiohttp.ClientSession
+        self,
+        username: str,
+        password: str,
+        session: aiohttp.ClientSession,
+        topology_ttl: timedelta = timedelta(hours=DEFAULT_TOPOLOGY_TTL),
+        response_cache: brunata_api.ResponseCache | None = None,
     ) -> None:
         """Sample API Client."""
         self._username = username
         self._password = password
-        #self._session = session
-        self._session = aiohttp.ClientSession()
+        self._topology_ttl = topology_ttl
+        # timestamp of the last meter topology download
+        self._topology_fetched_on: float | None = None
+        self._session = session
+        # consumption types whose last fetch failed, see async_retry_failed
+        self._failed_types = set()
+        # meters not fetched since this time serve stale values
+        self._refresh_started = 0.0
+        # seconds spent in each phase of the last refresh
+        self._phases: dict[str, float] = {}
+        # Only one refresh runs at a time, see async_get_data
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_generation = 0
+        # Called with the data of every refresh, see add_data_listener
+        self._data_listeners: list[Callable[[dict, bool], None]] = []
 
         # initialize Brunata API client
-        self._brunata_client = brunata_api.BrunataOnlineApiClient(self._username, self._password, self._session)
+        self._response_cache = response_cache
+        self._brunata_client = brunata_api.BrunataOnlineApiClient(
+            self._username,
+            self._password,
+            self._session,
+            **({} if response_cache is None else {"cache": response_cache}),
+        )
 
     async def _async_validate_credentials(self) -> bool:
         """Validate credentials."""
@@ -29,38 +82,328 @@ class MaxxHacsTestingApiClient:
 
         return tokens_valid
 
-    # Helper to find latest value in Meter category
-    def _get_latest_value(self, json_data: dict, category_name: str) -> float | None:
-        category_data = json_data.get(category_name, {})
-        meters = category_data.get("Meters", {}).get("Day", {})
-        
-        for meter_id, meter_info in meters.items():
-            values = meter_info.get("Values", {})
-            if values:
-                # keys are dates, sort them to find max
-                latest_date = max(values.keys())
-                return float(values[latest_date])
-        return None
+    # Helper to find when the meters of a type were last fetched, oldest first
+    def _get_updated(self, consumption_type) -> str | None:
+        updated = self._brunata_client.get_meter_updated(
+            brunata_api.Interval.DAY, consumption_type
+        )
+        if not updated:
+            return None
+        return self._timestamp(min(updated.values()))
+
+    @property
+    def topology_ttl(self) -> timedelta:
+        """How long the meter topology is used before it is downloaded again."""
+        return self._topology_ttl
+
+    @topology_ttl.setter
+    def topology_ttl(self, topology_ttl: timedelta) -> None:
+        self._topology_ttl = topology_ttl
+
+    @property
+    def failed_types(self) -> set:
+        """Consumption types whose last fetch failed."""
+        return self._failed_types
+
+    def get_topology(self) -> dict:
+        """Return the cached meter topology and when it was downloaded."""
+        return {
+            "meters": self._brunata_client.get_topology(),
+            "fetched_on": self._topology_fetched_on,
+        }
+
+    def restore_topology(self, topology: dict) -> None:
+        """Restore a meter topology previously returned by get_topology.
+
+        The client is shared by the entries of the account, a topology it
+        already has is only replaced by one downloaded later.
+        """
+        if not topology.get("meters"):
+            return
+        if self._topology_fetched_on is not None and (
+            topology.get("fetched_on") or 0
+        ) <= self._topology_fetched_on:
+            return
+        self._brunata_client.set_topology(topology["meters"])
+        self._topology_fetched_on = topology.get("fetched_on")
+
+    def get_token_data(self) -> dict:
+        """Return the current tokens, tagged with the account they belong to."""
+        return {"username": self._username, "tokens": self._brunata_client.get_token_data()}
+
+    def restore_token_data(self, token_data: dict) -> None:
+        """Restore tokens previously returned by get_token_data."""
+        # tokens saved for another account (before a reconfigure) are ignored
+        tokens = token_data.get("tokens")
+        if token_data.get("username") != self._username or not tokens:
+            return
+        # tokens of another entry of the account are only replaced by ones
+        # that expire later
+        current = self._brunata_client.get_token_data()
+        if current and (current.get("expires_on") or 0) >= (tokens.get("expires_on") or 0):
+            return
+        self._brunata_client.set_token_data(tokens)
+
+    async def _async_update_topology(self, force: bool = False) -> None:
+        """Download the meter topology when it is older than the TTL."""
+        fresh = (
+            not force
+            and self._topology_fetched_on is not None
+            and time.time() - self._topology_fetched_on < self._topology_ttl.total_seconds()
+        )
+        self._brunata_client.metrics.cache("topology", fresh)
+        if fresh:
+            return
+        await self._brunata_client.fetch_meters()
+        if self._brunata_client.get_topology():
+            self._topology_fetched_on = time.time()
+
+    async def async_rediscover_meters(self) -> None:
+        """Download the meter topology now, regardless of the TTL."""
+        if await self._brunata_client._get_tokens():
+            await self._async_update_topology(force=True)
 
     async def async_authenticate(self) -> bool:
         """Authenticate with the API."""
         return await self._async_validate_credentials()
 
+    async def _async_fetch_consumption(self, consumption_type) -> None:
+        """Fetch DAY consumption for one type and record how long it took."""
+        start = time.monotonic()
+        try:
+            await self._brunata_client.fetch_consumption(
+                consumption_type, brunata_api.Interval.DAY, incremental=True
+            )
+        finally:
+            elapsed = self._phases[dict(CONSUMPTION_TYPES)[consumption_type]] = (
+                time.monotonic() - start
+            )
+        _LOGGER.debug("Fetched %s consumption in %.3f seconds", consumption_type, elapsed)
+
+    async def _async_fetch_types(self, consumption_types) -> None:
+        """Fetch several consumption types at once, each failing on its own."""
+        results = await asyncio.gather(
+            *(self._async_fetch_consumption(consumption_type) for consumption_type in consumption_types),
+            return_exceptions=True,
+        )
+        for consumption_type, result in zip(consumption_types, results):
+            if isinstance(result, Exception):
+                _LOGGER.warning("Keeping last %s data: %s", consumption_type, result)
+                self._failed_types.add(consumption_type)
+            else:
+                self._failed_types.discard(consumption_type)
+        # types without allocation units have nothing to fetch and never fail
+        with_units = [
+            (consumption_type, result)
+            for consumption_type, result in zip(consumption_types, results)
+            if self._brunata_client.get_units(consumption_type)
+        ]
+        if with_units and all(isinstance(result, Exception) for _, result in with_units):
+            # nothing was fetched at all, report the refresh as failed
+            raise with_units[0][1]
+
+    def add_data_listener(self, listener: Callable[[dict, bool], None]) -> Callable[[], None]:
+        """Call a listener with the data of every refresh, returning a function removing it.
+
+        The listener also gets whether it was a full refresh or only a retry
+        of the failed types. The entries of an account share the client, this
+        is how they learn of the refreshes made for the others.
+        """
+        self._data_listeners.append(listener)
+        return lambda: self._data_listeners.remove(listener)
+
+    def _notify(self, data: dict, full: bool) -> None:
+        for listener in list(self._data_listeners):
+            listener(data, full)
+
     async def async_get_data(self) -> dict:
-        """Get data from the API."""
-        # try to fetch all available data at the DAY granularity
-        await self._brunata_client.fetch_meters()
-        await self._brunata_client.fetch_consumption(brunata_api.Consumption.WATER, brunata_api.Interval.DAY)
-        await self._brunata_client.fetch_consumption(brunata_api.Consumption.ELECTRICITY, brunata_api.Interval.DAY)
-        await self._brunata_client.fetch_consumption(brunata_api.Consumption.HEATING, brunata_api.Interval.DAY)
-        await self._brunata_client.fetch_consumption(brunata_api.Consumption.OTHER, brunata_api.Interval.DAY)
+        """Get data from the API.
+
+        The entries of an account share the client: a refresh asked for while
+        another one runs waits for it and reuses its result.
+        """
+        generation = self._refresh_generation
+        async with self._refresh_lock:
+            if generation != self._refresh_generation:
+                # Another entry refreshed while we were waiting
+                return self._build_data()
+            try:
+                data = await self._async_refresh()
+            finally:
+                self._refresh_generation += 1
+        self._notify(data, True)
+        return data
+
+    async def _async_refresh(self) -> dict:
+        """Fetch the tokens, the topology and the consumption of every type."""
+        self._refresh_started = time.time()
+        self._phases = {}
+        trace = self._brunata_client.metrics.start_trace()
+        start = time.monotonic()
+        try:
+            # get the token once, so the concurrent fetches below all reuse it
+            has_tokens = await self._brunata_client._get_tokens()
+            self._phases["token"] = time.monotonic() - start
+            if has_tokens:
+                # try to fetch all available data at the DAY granularity
+                topology_start = time.monotonic()
+                try:
+                    await self._async_update_topology()
+                except Exception as exception:  # pylint: disable=broad-except
+                    if self._topology_fetched_on is None:
+                        raise
+                    _LOGGER.warning("Using cached meter topology: %s", exception)
+                finally:
+                    self._phases["topology"] = time.monotonic() - topology_start
+                await self._async_fetch_types(
+                    tuple(consumption_type for consumption_type, _ in CONSUMPTION_TYPES)
+                )
+            else:
+                _LOGGER.warning("Could not get tokens, keeping previous data")
+        finally:
+            self._phases["total"] = time.monotonic() - start
+            trace["phases"] = dict(self._phases)
+            trace["failed_types"] = [
+                dict(CONSUMPTION_TYPES)[consumption_type]
+                for consumption_type in self._failed_types
+            ]
+        return self._build_data()
+
+    async def async_retry_failed(self) -> dict:
+        """Fetch the consumption types that failed during the last refresh again.
 
-        # now that the data has been loaded, we extract the data we need
-        json_data = self._brunata_client.get_consumption()
+        Types that fail again, or can't be fetched as the tokens can't be
+        renewed, stay failed for the next retry.
+        """
+        if self._failed_types:
+            try:
+                # the circuit is likely still open, renewing may fail too
+                if await self._brunata_client._get_tokens():
+                    await self._async_fetch_types(tuple(self._failed_types))
+            except Exception as exception:  # pylint: disable=broad-except
+                _LOGGER.warning("Retrying failed consumption types failed again: %s", exception)
+        data = self._build_data()
+        self._notify(data, False)
+        return data
 
-        # Current mapping: Water -> water_usage, Other -> electricity_usage 
-        # (works for my setup, will have to be changed to be more generic)        
+    def _build_data(self) -> dict:
+        """Extract the sensor data from the fetched consumption."""
         data = {}
-        data["water_usage"] = self._get_latest_value(json_data, "Water")
-        data["electricity_usage"] = self._get_latest_value(json_data, "Other")
+        # totals and individual meters of every type that has meters
+        data["totals"] = {}
+        data["meters"] = {}
+        for consumption_type, name in CONSUMPTION_TYPES:
+            meters = self._brunata_client.get_meter_info(
+                consumption_type, brunata_api.Interval.DAY
+            )
+            if not meters:
+                continue
+            # Sums of the month of the newest value, derived from the daily values
+            months = self._brunata_client.get_latest(
+                consumption_type, brunata_api.Interval.MONTH
+            )
+            data["meters"][name] = {
+                meter_id: {
+                    **meter,
+                    "month_to_date": self._month_value(months.get(meter_id), meter["date"]),
+                    "updated": self._timestamp(meter["updated"]),
+                    "stale": self._is_stale(meter["updated"]),
+                }
+                for meter_id, meter in meters.items()
+            }
+            newest, total = self._brunata_client.aggregate(
+                consumption_type, brunata_api.Interval.DAY, "sum"
+            )
+            data["totals"][name] = {
+                "value": total,
+                "date": newest,
+                "month_to_date": self._month_value(
+                    self._brunata_client.aggregate(
+                        consumption_type, brunata_api.Interval.MONTH, "sum"
+                    ),
+                    newest,
+                ),
+                "updated": self._get_updated(consumption_type),
+                "stale": any(meter["stale"] for meter in data["meters"][name].values()),
+            }
         return data
+
+    def get_metrics(self) -> dict:
+        """Return the request stats and the phase timings of the last refresh."""
+        metrics = self._brunata_client.metrics
+        return {
+            "totals": metrics.totals(),
+            "endpoints": metrics.snapshot(),
+            "phases": dict(self._phases),
+        }
+
+    def get_diagnostics(self) -> dict:
+        """Return the state of the client for diagnostics, without any request."""
+        now = time.time()
+        tokens = self._brunata_client.get_token_data()
+        return {
+            "tokens": {
+                # Seconds until each token expires, negative when expired
+                key: tokens[key] - now if tokens.get(key) else None
+                for key in ("expires_on", "refresh_token_expires_on")
+            },
+            "topology": self.get_topology(),
+            "store": self._brunata_client.get_store_sizes(),
+            "caches": self._brunata_client.metrics.cache_stats(),
+            "response_cache": {
+                "entries": len(self._response_cache),
+                "bytes": self._response_cache.size,
+            }
+            if self._response_cache is not None
+            else None,
+            "failed_types": [
+                dict(CONSUMPTION_TYPES)[consumption_type]
+                for consumption_type in self._failed_types
+            ],
+            "metrics": self.get_metrics(),
+            "traces": self._brunata_client.metrics.traces(),
+        }
+
+    def get_consumption_types(self) -> list[str]:
+        """Return the names of the consumption types that have meters."""
+        return [
+            name
+            for consumption_type, name in CONSUMPTION_TYPES
+            if self._brunata_client.get_units(consumption_type)
+        ]
+
+    async def async_fetch_month(self, consumption_type: str, month: str) -> None:
+        """Fetch the daily values of a whole "YYYY-MM" month of a type."""
+        types = {name: consumption_type for consumption_type, name in CONSUMPTION_TYPES}
+        await self._brunata_client.fetch_consumption(
+            types[consumption_type],
+            brunata_api.Interval.DAY,
+            window=brunata_api.month_window(month),
+        )
+
+    def get_daily_series(self) -> list[tuple]:
+        """Return the type name, meter id and daily series of every meter."""
+        return [
+            (name, meter_id, series)
+            for consumption_type, name in CONSUMPTION_TYPES
+            for meter_id, series in self._brunata_client.get_meters(
+                consumption_type, brunata_api.Interval.DAY
+            ).items()
+        ]
+
+    @staticmethod
+    def _month_value(month: tuple[str, float] | None, newest: str) -> float | None:
+        """Return the value of a monthly (key, value) if it is the month of a newest date."""
+        if month is None or month[0] != newest[:7]:
+            return None
+        return month[1]
+
+    @staticmethod
+    def _timestamp(updated: float | None) -> str | None:
+        if updated is None:
+            return None
+        return datetime.fromtimestamp(updated, timezone.utc).isoformat()
+
+    def _is_stale(self, updated: float | None) -> bool:
+        """Whether a meter was not fetched successfully during the last refresh."""
+        return updated is None or updated < self._refresh_started
@@ -0,0 +1,108 @@
+"""Resumable download of the history before the current month."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from datetime import date
+import logging
+
+from .api import MaxxHacsTestingApiClient
+from .const import BACKFILL_CONCURRENCY
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def months_back(start: date, end: date) -> list[str]:
+    """Return the "YYYY-MM" months before the one of end back to the one of start."""
+    months = []
+    year, month = end.year, end.month
+    while True:
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+        if (year, month) < (start.year, start.month):
+            return months
+        months.append(f"{year:04d}-{month:02d}")
+
+
+class MaxxHacsTestingBackfill:
+    """Downloads whole months of history back to a start date.
+
+    The months of each consumption type are fetched oldest first, a few at a
+    time, into the same store as the regular refreshes. The statistics sums
+    run forward, so each month only has the newer days imported again, not
+    the history fetched before it. Finished months are kept as progress, so
+    that a restart resumes where the last run stopped.
+    """
+
+    def __init__(
+        self,
+        client: MaxxHacsTestingApiClient,
+        start: date,
+        max_concurrency: int = BACKFILL_CONCURRENCY,
+    ) -> None:
+        """Initialize."""
+        self._client = client
+        self._start = start
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # "type:YYYY-MM" of the months fetched so far
+        self._done: set[str] = set()
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        """Whether a run is downloading months."""
+        return self._running
+
+    def get_progress(self) -> list[str]:
+        """Return the months fetched so far, to persist."""
+        return sorted(self._done)
+
+    def restore_progress(self, done: list[str]) -> None:
+        """Restore the months fetched by an earlier run."""
+        self._done = set(done)
+
+    def remaining(self) -> list[tuple[str, str]]:
+        """Return the consumption types and months still to fetch, oldest first."""
+        types = self._client.get_consumption_types()
+        return [
+            (consumption_type, month)
+            for month in reversed(months_back(self._start, date.today()))
+            for consumption_type in types
+            if f"{consumption_type}:{month}" not in self._done
+        ]
+
+    async def async_run(self, on_progress: Callable[[], None]) -> bool:
+        """Fetch the remaining months, returning whether all of them were fetched.
+
+        on_progress is called after every fetched month.
+        """
+        self._running = True
+        try:
+            results = await asyncio.gather(
+                *(
+                    self._async_fetch_month(consumption_type, month, on_progress)
+                    for consumption_type, month in self.remaining()
+                ),
+                return_exceptions=True,
+            )
+        finally:
+            self._running = False
+        errors = []
+        for result in results:
+            if isinstance(result, BaseException):
+                if not isinstance(result, Exception):
+                    raise result
+                errors.append(result)
+        if errors:
+            _LOGGER.warning(
+                "Backfill left %d months for later: %s", len(errors), errors[0]
+            )
+        return not errors
+
+    async def _async_fetch_month(
+        self, consumption_type: str, month: str, on_progress: Callable[[], None]
+    ) -> None:
+        """Fetch a month of a type and record it as done."""
+        async with self._semaphore:
+            await self._client.async_fetch_month(consumption_type, month)
+        self._done.add(f"{consumption_type}:{month}")
+        on_progress()
@@ -0,0 +1,65 @@
+"""Monthly sums of daily meter values."""
+
+from array import array
+from bisect import bisect_left
+from datetime import date
+
+# Series shorter than this are summed in pure Python, NumPy only pays off
+# for long histories and costs a heavy import
+NUMPY_MIN_VALUES = 2048
+# Ordinal of 1970-01-01, the epoch of numpy.datetime64
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+_numpy = None
+
+
+def _import_numpy():
+    """Return the numpy module, or False when it is not installed."""
+    global _numpy  # pylint: disable=global-statement
+    if _numpy is None:
+        try:
+            import numpy  # pylint: disable=import-outside-toplevel
+        except ImportError:  # NumPy is optional
+            numpy = False
+        _numpy = numpy
+    return _numpy
+
+
+def month_of(day_ordinal: int) -> int:
+    """Returns the month ordinal (year * 12 + month - 1) of a day ordinal"""
+    day = date.fromordinal(day_ordinal)
+    return day.year * 12 + day.month - 1
+
+
+def first_day(month_ordinal: int) -> int:
+    """Returns the day ordinal of the first day of a month ordinal"""
+    year, month = divmod(month_ordinal, 12)
+    return date(year, month + 1, 1).toordinal()
+
+
+def monthly_sums(ordinals: array, values: array) -> list[tuple[int, float]]:
+    """Sum sorted daily values per month, returning (month ordinal, sum) pairs.
+
+    Months without any daily value are left out.
+    """
+    if not ordinals:
+        return []
+    if len(ordinals) >= NUMPY_MIN_VALUES and (np := _import_numpy()):
+        return _numpy_sums(np, ordinals, values)
+    sums = []
+    index, end = 0, len(ordinals)
+    while index < end:
+        month = month_of(ordinals[index])
+        following = bisect_left(ordinals, first_day(month + 1), index)
+        sums.append((month, sum(values[index:following])))
+        index = following
+    return sums
+
+
+def _numpy_sums(np, ordinals: array, values: array) -> list[tuple[int, float]]:
+    """monthly_sums with NumPy, vectorized over the whole series."""
+    days = np.frombuffer(ordinals, dtype=np.intc).astype("int64") - EPOCH_ORDINAL
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype("int64")
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(months)) + 1))
+    sums = np.add.reduceat(np.frombuffer(values, dtype=np.float64), starts)
+    return list(zip((months[starts] + 1970 * 12).tolist(), sums.tolist()))
@@ -1,19 +1,19 @@
 """Brunata Online API Client"""
 
 import base64
+from email.utils import parsedate_to_datetime
 import hashlib
 import logging
 import os
+import random
 import re
+import time
 import urllib.parse
-from datetime import datetime, timedelta
-import copy
+from datetime import datetime, timedelta, timezone
 
 import asyncio
 from socket import gaierror
-from aiohttp import ClientResponse, ClientSession, ClientError
-from async_timeout import timeout as async_timeout
-from requests import Session
+from aiohttp import ClientResponse, ClientSession, ClientError, ClientTimeout
 
 from .const import (
     API_URL,
@@ -27,10 +27,34 @@ from .const import (
     Consumption,
     Interval,
 )
+from .cache import ResponseCache, ValidatorCache
+from .decode import consumption_lines, loads
+from .metrics import RequestMetrics
+from .store import ConsumptionStore
+from .exceptions import (
+    BrunataAuthError,
+    BrunataError,
+    BrunataCircuitOpenError,
+    BrunataConnectionError,
+    BrunataResponseError,
+)
 
-logging.basicConfig(level=logging.DEBUG)
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 TIMEOUT = 10
+# Upper bound on simultaneous consumption requests per client
+MAX_CONCURRENT_REQUESTS = 4
+# How far before the newest known value an incremental sync starts
+SYNC_OVERLAP = timedelta(days=2)
+# Tokens are renewed this long before they actually expire
+TOKEN_SKEW = timedelta(minutes=5)
+# GET requests are retried with capped exponential backoff and full jitter
+RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 10
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Consecutive failed requests before the circuit opens, and for how long
+CIRCUIT_THRESHOLD = 5
+CIRCUIT_RESET = 300
 
 
 def start_of_interval(interval: Interval, offset: timedelta | None) -> str:
@@ -57,44 +81,148 @@ def end_of_interval(interval: Interval, offset: timedelta | None) -> str:
     return f"{date.isoformat()}.999Z"
 
 
+def sync_window(interval: Interval, high_water: str, overlap: timedelta) -> tuple[str, str]:
+    """Returns a window from overlap before the high-water mark until today
+
+    For "M" the window is widened to whole months, ending with the current one
+    """
+    if interval is Interval.MONTH:
+        date = datetime.strptime(high_water, "%Y-%m") - overlap
+        date = date.replace(day=1)
+        return f"{date.isoformat()}.000Z", end_of_interval(Interval.DAY, offset=None)
+    date = datetime.strptime(high_water, "%Y-%m-%d") - overlap
+    end = datetime.now().replace(hour=23, minute=59, second=59, microsecond=0)
+    return f"{date.isoformat()}.000Z", f"{end.isoformat()}.999Z"
+
+
+def month_window(month: str) -> tuple[str, str]:
+    """Returns the window of a whole "YYYY-MM" month"""
+    date = datetime.strptime(month, "%Y-%m")
+    end = date.replace(day=28) + timedelta(days=4)
+    end -= timedelta(days=end.day)
+    end = end.replace(hour=23, minute=59, second=59)
+    return f"{date.isoformat()}.000Z", f"{end.isoformat()}.999Z"
+
+
+def retry_after(response: ClientResponse) -> float | None:
+    """Returns the delay in seconds asked for by a Retry-After header"""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class CircuitBreaker:
+    """Hold back requests for a while after repeated failures"""
+
+    def __init__(self, threshold: int = CIRCUIT_THRESHOLD, reset: float = CIRCUIT_RESET) -> None:
+        self._threshold = threshold
+        self._reset = reset
+        self._failures = 0
+        self._open_until = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        """Whether requests are currently held back."""
+        return time.monotonic() < self._open_until
+
+    def check(self, url: str) -> None:
+        """Raise if requests are held back."""
+        if self.is_open:
+            raise BrunataCircuitOpenError(
+                f"Not requesting {url}, Brunata Online is failing - retrying in "
+                f"{self._open_until - time.monotonic():.0f} seconds"
+            )
+
+    def record_success(self) -> None:
+        """Close the circuit again."""
+        self._failures = 0
+        self._open_until = 0.0
+
+    def record_failure(self) -> None:
+        """Count a failed request, opening the circuit at the threshold.
+
+        Once the reset time has passed requests are let through again, and
+        the first one to fail opens the circuit straight away.
+        """
+        self._failures += 1
+        if self._failures >= self._threshold:
+            self.open_for(self._reset)
+
+    def open_for(self, seconds: float) -> None:
+        """Hold back requests for at least the given time."""
+        self._open_until = max(self._open_until, time.monotonic() + seconds)
+
+
 class BrunataOnlineApiClient:
     """Brunata Online API Client"""
 
-    def __init__(self, username: str, password: str, session: ClientSession) -> None:
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        session: ClientSession,
+        max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+        sync_overlap: timedelta = SYNC_OVERLAP,
+        token_skew: timedelta = TOKEN_SKEW,
+        cache: ResponseCache | None = None,
+    ) -> None:
         self._username = username
         self._password = password
         self._session = session
-        self._power = {}
-        self._water = {}
-        self._heating = {}
-        self._other = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._sync_overlap = sync_overlap
+        # Meter ids of each unit, the newest value of a meter is its high-water mark
+        self._unit_meters = {interval: {} for interval in Interval}
+        # "YYYY-MM" months asked from the API per unit, see _missing_months
+        self._fetched_months: dict[str, set[str]] = {}
+        # Allocation units of each consumption type with meters
+        self._units: dict[Consumption, list] = {}
+        self._store = ConsumptionStore()
+        # Consumption responses by window, possibly shared with other clients
+        self._cache = cache
+        # Validators of the last responses, see api_wrapper
+        self._validators = ValidatorCache()
+        # Hash of the last payload merged per interval and unit, see fetch_consumption
+        self._payload_hashes: dict[tuple[Interval, str], bytes] = {}
+        self._topology = []
         self._tokens = {}
-        self._session.headers.update(HEADERS)
+        self._token_skew = token_skew
+        # Only one renewal runs at a time, see _get_tokens
+        self._token_lock = asyncio.Lock()
+        self._token_generation = 0
+        self._circuit = CircuitBreaker()
+        self._metrics = RequestMetrics()
+        # Request headers are kept on the client, the session may be shared
+        self._headers = dict(HEADERS)
 
     def _is_token_valid(self, token: str) -> bool:
+        """Check that a token exists and does not expire within the skew."""
         if not self._tokens:
             return False
         match token:
             case "access_token":
                 ts = self._tokens.get("expires_on")
-                if datetime.fromtimestamp(ts) < datetime.now():
-                    return False
-            case "refresh":
+            case "refresh_token":
                 ts = self._tokens.get("refresh_token_expires_on")
-                if datetime.fromtimestamp(ts) < datetime.now():
-                    return False
+            case _:
+                return False
+        if not ts or datetime.fromtimestamp(ts) - self._token_skew < datetime.now():
+            return False
         return True
 
     async def _renew_tokens(self) -> dict:
-        if self._is_token_valid("access_token"):
-            _LOGGER.debug(
-                "Token is not expired, expires in %d seconds",
-                self._tokens.get("expires_on") - int(datetime.now().timestamp()),
-            )
-            return self._tokens
         # Get OAuth 2.0 token object
         try:
-            tokens = await self.api_wrapper(
+            body = await self.api_wrapper(
                 method="POST",
                 url=f"{OAUTH2_URL}/token",
                 data={
@@ -103,12 +231,12 @@ class BrunataOnlineApiClient:
                     "CLIENT_ID": CLIENT_ID,
                 },
             )
-        except Exception as error:  # pylint: disable=broad-except
+        except BrunataError as error:
             _LOGGER.error("An error occurred while trying to renew tokens: %s", error)
             return {}
-        return await tokens.json()
+        return loads(body)
 
-    def _b2c_auth(self) -> dict:
+    async def _b2c_auth(self) -> dict:
         # Initialize challenge values
         code_verifier = base64.urlsafe_b64encode(os.urandom(40)).decode("utf-8")
         code_verifier = re.sub("[^a-zA-Z0-9]+", "", code_verifier)
@@ -116,9 +244,17 @@ class BrunataOnlineApiClient:
         code_challenge = (
             base64.urlsafe_b64encode(code_challenge).decode("utf-8").replace("=", "")
         )
-        with Session() as session:
+        # Use a short-lived session for its own cookie jar, but borrow the
+        # connector of the client session so no extra connection pool is made
+        async with ClientSession(
+            connector=self._session.connector,
+            connector_owner=False,
+            headers=self._headers,
+            timeout=ClientTimeout(total=TIMEOUT),
+            trace_configs=[self._metrics.trace_config()],
+        ) as session:
             # Initial authorization call
-            req_code = session.request(
+            async with session.request(
                 method="GET",
                 url=f"{API_URL.replace('webservice', 'auth-webservice')}/authorize",
                 params={
@@ -129,14 +265,18 @@ class BrunataOnlineApiClient:
                     "code_challenge": code_challenge,
                     "code_challenge_method": "S256",
                 },
-            )
+            ) as req_code:
+                settings = await req_code.text()
+                referer = str(req_code.url)
+                csrf_cookie = session.cookie_jar.filter_cookies(req_code.url).get(
+                    "x-ms-cpim-csrf"
+                ) or req_code.cookies.get("x-ms-cpim-csrf")
             # Get CSRF Token & Transaction ID
-            try:
-                csrf_token = str(req_code.cookies.get("x-ms-cpim-csrf"))
-            except KeyError as exception:
-                _LOGGER.error("Error while retrieving CSRF Token: %s", exception)
+            if csrf_cookie is None:
+                _LOGGER.error("Error while retrieving CSRF Token")
                 return {}
-            match = re.search(r"var SETTINGS = (\{[^;]*\});", req_code.text)
+            csrf_token = csrf_cookie.value
+            match = re.search(r"var SETTINGS = (\{[^;]*\});", settings)
             if match:  # Use a little magic to avoid proper JSON parsing ✨
                 transaction_id = [
                     i for i in match.group(1).split('","') if i.startswith("transId")
@@ -146,7 +286,7 @@ class BrunataOnlineApiClient:
                 _LOGGER.error("Failed to get Transaction ID")
                 return {}
             # Post credentials to B2C Endpoint
-            req_auth = session.request(
+            async with session.request(
                 method="POST",
                 url=f"{AUTHN_URL}/SelfAsserted",
                 params={
@@ -159,14 +299,15 @@ class BrunataOnlineApiClient:
                     "password": self._password,
                 },
                 headers={
-                    "Referer": str(req_code.url),
+                    "Referer": referer,
                     "X-Csrf-Token": csrf_token,
                     "X-Requested-With": "XMLHttpRequest",
                 },
                 allow_redirects=False,
-            )
+            ) as req_auth:
+                await req_auth.read()
             # Get authentication code
-            req_auth = session.request(
+            async with session.request(
                 method="GET",
                 url=f"{AUTHN_URL}/api/CombinedSigninAndSignup/confirmed",
                 params={
@@ -176,10 +317,10 @@ class BrunataOnlineApiClient:
                     "p": OAUTH2_PROFILE,
                 },
                 allow_redirects=False,
-            )
-            redirect = req_auth.headers["Location"]
-            assert redirect.startswith(REDIRECT)
-            _LOGGER.debug("%d - %s", req_auth.status_code, redirect)
+            ) as req_auth:
+                await req_auth.read()
+                redirect = req_auth.headers.get("Location", "")
+                _LOGGER.debug("%d - %s", req_auth.status, redirect)
             try:
                 auth_code = urllib.parse.parse_qs(
                     urllib.parse.urlparse(redirect).query
@@ -191,7 +332,7 @@ class BrunataOnlineApiClient:
                 )
                 return {}
             # Get OAuth 2.0 token object
-            tokens = session.request(
+            async with session.request(
                 method="POST",
                 url=f"{OAUTH2_URL}/token",
                 data={
@@ -201,33 +342,69 @@ class BrunataOnlineApiClient:
                     "code": auth_code,
                     "code_verifier": code_verifier,
                 },
-            )
-        return tokens.json()
+            ) as tokens:
+                return await tokens.json(content_type=None)
 
     async def _get_tokens(self) -> bool:
         """
         Get access/refresh tokens using credentials or refresh token
         Returns True if tokens are valid
+
+        Concurrent callers share a single renewal: whoever gets the lock
+        renews, the others wait for it and reuse its result.
         """
-        # Check values
+        valid = self._is_token_valid("access_token")
+        self._metrics.cache("token", valid)
+        if valid:
+            _LOGGER.debug(
+                "Token is not expired, expires in %d seconds",
+                self._tokens.get("expires_on") - int(datetime.now().timestamp()),
+            )
+            return True
+        generation = self._token_generation
+        async with self._token_lock:
+            if generation != self._token_generation:
+                # Another caller renewed the tokens while we were waiting,
+                # or failed to and left the expired ones
+                return self._is_token_valid("access_token")
+            try:
+                return await self._update_tokens()
+            finally:
+                self._token_generation += 1
+
+    async def _update_tokens(self) -> bool:
+        """Renew the tokens, logging in again if the refresh token can't be used."""
+        # Don't try to log in while Brunata Online is failing
+        self._circuit.check(OAUTH2_URL)
+        tokens = {}
         if self._is_token_valid("refresh_token"):
             tokens = await self._renew_tokens()
-        else:
-            tokens = self._b2c_auth()
+        if not tokens.get("access_token"):
+            try:
+                tokens = await self._b2c_auth()
+            except (asyncio.TimeoutError, ClientError, gaierror) as exception:
+                raise BrunataConnectionError(
+                    f"Error logging in to Brunata Online - {exception}"
+                ) from exception
         # Ensure validity of tokens
         if tokens.get("access_token"):
-            # Add access token to session headers
-            self._session.headers.update(
+            # Calculate access expiry if only the lifetime was given
+            if not tokens.get("expires_on") and tokens.get("expires_in"):
+                tokens["expires_on"] = int(datetime.now().timestamp()) + int(
+                    tokens["expires_in"]
+                )
+            # Add access token to request headers
+            self._headers.update(
                 {
                     "Authorization": f"{tokens.get('token_type')} {tokens.get('access_token')}",
                 }
             )
             # Calculate refresh expiry
-            if tokens.get("refresh_token") != self._tokens.get("refresh_token"):
+            if tokens.get("refresh_token_expires_in"):
                 tokens.update(
                     {
                         "refresh_token_expires_on": int(datetime.now().timestamp())
-                        + tokens.get("refresh_token_expires_in")
+                        + int(tokens.get("refresh_token_expires_in"))
                     }
                 )
             self._tokens.update(tokens)
@@ -236,19 +413,49 @@ class BrunataOnlineApiClient:
             _LOGGER.error("Failed to get tokens")
         return bool(self._tokens)
 
+    @property
+    def metrics(self) -> RequestMetrics:
+        """Return the stats of the requests made so far."""
+        return self._metrics
+
+    def get_token_data(self) -> dict:
+        """Return the current tokens and their expiry timestamps."""
+        return dict(self._tokens)
+
+    def set_token_data(self, tokens: dict) -> None:
+        """Restore tokens previously returned by get_token_data."""
+        self._tokens = dict(tokens)
+        if tokens.get("access_token"):
+            self._headers.update(
+                {
+                    "Authorization": f"{tokens.get('token_type')} {tokens.get('access_token')}",
+                }
+            )
+
     async def fetch_meters(self) -> None:
         """Get all meters associated with the account."""
         if not await self._get_tokens():
             return
-        meters = await (
-            await self.api_wrapper(
-                method="GET",
-                url=f"{API_URL}/consumer/superallocationunits",
-                headers={
-                    "Referer": CONSUMPTION_URL,
-                },
-            )
-        ).json()
+        body = await self.api_wrapper(
+            method="GET",
+            url=f"{API_URL}/consumer/superallocationunits",
+            headers={
+                "Referer": CONSUMPTION_URL,
+            },
+        )
+        self.set_topology(loads(body))
+
+    def get_units(self, _type: Consumption) -> list:
+        """Return the allocation units with meters of a type."""
+        return self._units.get(_type, [])
+
+    def get_topology(self) -> list:
+        """Return the superallocationunits payload the meters were built from."""
+        return self._topology
+
+    def set_topology(self, meters: list) -> None:
+        """Set up the meters of each consumption type from a superallocationunits payload."""
+        self._topology = meters
         water_units = []
         heating_units = []
         power_units = []
@@ -270,117 +477,360 @@ class BrunataOnlineApiClient:
                     power_units += meter.get("allocationUnits")
                 case Consumption.OTHER:  # Other
                     other_units += meter.get("allocationUnits")
-        _LOGGER.info("Meter info: %s", str(meters))
-        init = {"Meters": {"Day": {}, "Month": {}}}
+        # Keep values already fetched for a type, only the units are replaced
         if heating_units:
-            _LOGGER.debug("🔥 Heating meter(s) found")
-            self._heating.update(copy.deepcopy(init))
-            self._heating.update({"Units": heating_units})
+            self._units[Consumption.HEATING] = heating_units
         if water_units:
-            _LOGGER.debug("💧 Water meter(s) found")
-            self._water.update(copy.deepcopy(init))
-            self._water.update({"Units": water_units})
+            self._units[Consumption.WATER] = water_units
         if power_units:
-            _LOGGER.debug("⚡ Energy meter(s) found")
-            self._power.update(copy.deepcopy(init))
-            self._power.update({"Units": power_units})
+            self._units[Consumption.ELECTRICITY] = power_units
         if other_units:
-            _LOGGER.debug("🔌 Other meter(s) found")
-            self._other.update(copy.deepcopy(init))
-            self._other.update({"Units": other_units})
+            self._units[Consumption.OTHER] = other_units
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(
+                "Allocation units found: %s",
+                ", ".join(f"{key.name} {len(units)}" for key, units in self._units.items()),
+            )
+
+    async def fetch_consumption(
+        self,
+        _type: Consumption,
+        interval: Interval,
+        incremental: bool = False,
+        window: tuple[str, str] | None = None,
+    ) -> None:
+        """Get consumption data for a specific meter type.
+
+        With incremental set, units whose meters all have values are only
+        asked for the days since their high-water mark (minus the overlap).
+        A window fetches that (startdate, enddate) instead, e.g. for history,
+        and does not count as a refresh of the meters.
+
+        A payload equal to the last one merged for a unit, e.g. served from a
+        304 Not Modified, is not decoded and merged again.
 
-    async def fetch_consumption(self, _type: Consumption, interval: Interval) -> None:
-        """Get consumption data for a specific meter type."""
+        Monthly values are summed from the daily values as those are merged.
+        Without a window, the "M" interval only asks the API for the months
+        of the year the daily history does not cover.
+
+        Units are fetched independently: the values of units that succeed are
+        merged, failed units keep their last values, and the first error is
+        raised afterwards.
+        """
         if not await self._get_tokens():
-            return
-        match _type:
-            case Consumption.ELECTRICITY:
-                usage = self._power
-            case Consumption.WATER:
-                usage = self._water
-            case Consumption.HEATING:
-                usage = self._heating
-            case Consumption.OTHER:
-                usage = self._other
-        if not usage:
+            raise BrunataAuthError("Could not get tokens")
+        units = self._units.get(_type)
+        if not units:
             _LOGGER.debug("No %s meter was found", _type.name.lower())
             return
-        consumption = [
-            await (
-                await self.api_wrapper(
-                    method="GET",
-                    url=f"{API_URL}/consumer/consumption",
-                    params={
-                        "startdate": start_of_interval(
-                            interval, offset=timedelta(seconds=0)
-                        ),
-                        "enddate": end_of_interval(
-                            interval, offset=timedelta(seconds=0)
-                        ),
-                        "interval": interval.value,
-                        "allocationunit": unit,
-                    },
-                    headers={
-                        "Referer": f"{CONSUMPTION_URL}/{_type.name.lower()}",
-                    },
+        windows = {}
+        if interval is Interval.MONTH and window is None:
+            missing = {unit: self._missing_months(_type, unit) for unit in units}
+            for unit, months in missing.items():
+                self._metrics.cache("month", not months)
+                if months:
+                    windows[unit] = month_window(months[0])[0], month_window(months[-1])[1]
+            if not (units := list(windows)):
+                return
+        # Fan out over all units, gather keeps the order of the units
+        consumption = await asyncio.gather(
+            *(
+                self._fetch_unit_consumption(
+                    _type, interval, unit, incremental, windows.get(unit, window)
                 )
-            ).json()
-            for unit in usage["Units"]
-        ]
-        # Add all metrics that are not None
-        usage["Meters"][interval.name.capitalize()].update(
-            {
-                meter.get("meter").get("meterId")
-                or index: {
-                    "Name": meter.get("meter").get("placement") or index,
-                    "Values": {
-                        entry.get("fromDate")[
-                            : 10 if interval is Interval.DAY else 7
-                        ]: entry.get("consumption")
-                        for entry in meter["consumptionValues"]
-                        if entry.get("consumption") is not None
-                    },
-                }
-                for lines in consumption
-                for index, meter in enumerate(lines["consumptionLines"])
-            }
+                for unit in units
+            ),
+            return_exceptions=True,
         )
+        # Merge all metrics that are not None into the known values
+        updated = time.time()
+        errors = []
+        key_length = 10 if interval is Interval.DAY else 7
+        for unit, body in zip(units, consumption):
+            if isinstance(body, BaseException):
+                if not isinstance(body, Exception):
+                    raise body
+                _LOGGER.warning(
+                    "Keeping last %s values of unit %s: %s",
+                    _type.name.lower(),
+                    unit,
+                    body,
+                )
+                errors.append(body)
+                continue
+            # Windows, e.g. history, leave the state of the regular refreshes alone
+            if window is None:
+                digest = hashlib.blake2b(body, digest_size=16).digest()
+                unchanged = self._payload_hashes.get((interval, unit)) == digest
+                self._metrics.cache("payload", unchanged)
+                if unchanged:
+                    meters = self._store.meters(_type, interval)
+                    for meter_id in self._unit_meters[interval].get(unit, ()):
+                        meters[meter_id].updated = updated
+                    continue
+                self._payload_hashes[interval, unit] = digest
+            unit_meters = []
+            for meter_id, name, values in consumption_lines(body, key_length):
+                series = self._store.merge(_type, interval, meter_id, name, values)
+                if window is None:
+                    series.updated = updated
+                if interval is Interval.DAY and values:
+                    self._store.derive_months(
+                        _type, meter_id, min(key for key, _ in values)
+                    )
+                unit_meters.append(meter_id)
+            if window is None:
+                # The meters of the unit now, their newest values are the high-water mark
+                self._unit_meters[interval][unit] = unit_meters
+            if unit in windows:
+                self._fetched_months.setdefault(unit, set()).update(missing[unit])
+                # Months of the window the daily history covers keep their sums
+                for meter_id in self._unit_meters[Interval.DAY].get(unit, ()):
+                    self._store.derive_months(_type, meter_id, missing[unit][0])
+        if errors:
+            raise errors[0]
+
+    def get_meter_updated(
+        self, interval: Interval, _type: Consumption | None = None
+    ) -> dict:
+        """Return when the values of each meter were last fetched, as timestamps."""
+        return {
+            meter_id: series.updated
+            for consumption in (Consumption if _type is None else (_type,))
+            for meter_id, series in self._store.meters(consumption, interval).items()
+            if series.updated is not None
+        }
+
+    def get_latest(self, _type: Consumption, interval: Interval) -> dict:
+        """Return the newest date and value of each meter of a type."""
+        return self._store.latest(_type, interval)
+
+    def aggregate(
+        self, _type: Consumption, interval: Interval, how: str = "sum"
+    ) -> tuple[str, float] | None:
+        """Return the newest date and the "sum" or "latest" value over all meters of a type."""
+        return self._store.aggregate(_type, interval, how)
+
+    def get_meters(self, _type: Consumption, interval: Interval) -> dict:
+        """Return the series of each meter of a type by meter id."""
+        return self._store.meters(_type, interval)
+
+    def get_store_sizes(self) -> dict:
+        """Return the number of meters and values kept per type and interval."""
+        return self._store.sizes()
+
+    def get_meter_info(self, _type: Consumption, interval: Interval) -> dict:
+        """Return the name, newest date and value and last fetch time of each meter of a type."""
+        latest = self._store.latest(_type, interval)
+        return {
+            meter_id: {
+                "name": series.name,
+                "date": latest[meter_id][0],
+                "value": latest[meter_id][1],
+                "updated": series.updated,
+            }
+            for meter_id, series in self._store.meters(_type, interval).items()
+            if meter_id in latest
+        }
+
+    def _missing_months(self, _type: Consumption, unit: str) -> list[str]:
+        """Return the months of the year before this one a unit has no monthly value for.
+
+        Months asked from the API before are not asked again, nor is the
+        current month, which the daily sync always covers.
+        """
+        today = datetime.now()
+        months = [f"{today.year:04d}-{month:02d}" for month in range(1, today.month)]
+        fetched = self._fetched_months.get(unit, set())
+        meters = self._store.meters(_type, Interval.MONTH)
+        meter_ids = self._unit_meters[Interval.DAY].get(unit)
+        return [
+            month
+            for month in months
+            if month not in fetched
+            and (
+                not meter_ids
+                or any(
+                    meter_id not in meters or meters[meter_id].get(month) is None
+                    for meter_id in meter_ids
+                )
+            )
+        ]
+
+    def _unit_high_water(
+        self, _type: Consumption, interval: Interval, unit: str
+    ) -> str | None:
+        """Return the oldest high-water mark of the meters of a unit, if all have one."""
+        meter_ids = self._unit_meters[interval].get(unit)
+        if not meter_ids:
+            return None
+        meters = self._store.meters(_type, interval)
+        marks = []
+        for meter_id in meter_ids:
+            if (latest := meters[meter_id].latest()) is None:
+                return None
+            marks.append(latest[0])
+        return min(marks)
+
+    async def _fetch_unit_consumption(
+        self,
+        _type: Consumption,
+        interval: Interval,
+        unit: str,
+        incremental: bool,
+        window: tuple[str, str] | None = None,
+    ) -> bytes:
+        """Get the raw consumption payload of a single allocation unit.
+
+        Payloads are looked up in the response cache first, if the client has one.
+        """
+        if window is not None:
+            startdate, enddate = window
+        elif incremental and (high_water := self._unit_high_water(_type, interval, unit)):
+            startdate, enddate = sync_window(interval, high_water, self._sync_overlap)
+        else:
+            startdate = start_of_interval(interval, offset=timedelta(seconds=0))
+            enddate = end_of_interval(interval, offset=timedelta(seconds=0))
+        key = (unit, interval.value, startdate, enddate)
+        if self._cache is not None:
+            body = self._cache.get(key)
+            self._metrics.cache("response", body is not None)
+            if body is not None:
+                return body
+        async with self._semaphore:
+            body = await self.api_wrapper(
+                method="GET",
+                url=f"{API_URL}/consumer/consumption",
+                params={
+                    "startdate": startdate,
+                    "enddate": enddate,
+                    "interval": interval.value,
+                    "allocationunit": unit,
+                },
+                headers={
+                    "Referer": f"{CONSUMPTION_URL}/{_type.name.lower()}",
+                },
+            )
+        if self._cache is not None:
+            self._cache.put(key, body)
+        return body
 
     def get_consumption(self) -> dict:
-        """Return consumption data."""
+        """Return consumption data.
+
+        The values are read-only views of the consumption store, nothing is copied.
+        """
+        return {
+            "Heating": self._consumption_view(Consumption.HEATING),
+            "Water": self._consumption_view(Consumption.WATER),
+            "Electricity": self._consumption_view(Consumption.ELECTRICITY),
+            "Other": self._consumption_view(Consumption.OTHER),
+        }
+
+    def _consumption_view(self, _type: Consumption) -> dict:
+        if not (units := self._units.get(_type)):
+            return {}
         return {
-            "Heating": self._heating,
-            "Water": self._water,
-            "Electricity": self._power,
-            "Other": self._other
+            "Meters": {
+                interval.name.capitalize(): self._store.view(_type, interval)
+                for interval in Interval
+            },
+            "Units": units,
         }
 
-    async def api_wrapper(self, **args) -> ClientResponse:
-        """Get information from the API."""
-        async with async_timeout(TIMEOUT):
+    async def api_wrapper(self, **args) -> bytes:
+        """Get information from the API, returning the body of the response.
+
+        GET requests that time out or fail with a retryable status are tried
+        again after a capped, jittered exponential backoff, or after the delay
+        in a Retry-After header. Failures raise a BrunataError.
+
+        GET requests answered with an ETag or Last-Modified are sent as
+        conditional requests the next time, and a 304 Not Modified returns
+        the body of the earlier response.
+        """
+        url = args["url"]
+        self._circuit.check(url)
+        headers = {**self._headers, **(args.pop("headers", None) or {})}
+        conditional = args["method"] == "GET"
+        if conditional:
+            key = (url, tuple(sorted((args.get("params") or {}).items())))
+            headers.update(validators := self._validators.headers(key))
+        attempts = RETRIES + 1 if conditional else 1
+        for attempt in range(attempts):
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+            cause = None
+            start = time.monotonic()
             try:
-                async with self._session.request(**args) as response:
-                    await response.read()
-                    response.raise_for_status()
-                    return response
+                async with asyncio.timeout(TIMEOUT):
+                    async with self._session.request(headers=headers, **args) as response:
+                        body = await response.read()
             except asyncio.TimeoutError as exception:
-                _LOGGER.error(
-                    "Timeout error fetching information from %s - %s",
-                    args["url"],
-                    exception,
-                )
-
-            except (KeyError, TypeError) as exception:
-                _LOGGER.error(
-                    "Error parsing information from %s - %s",
-                    args["url"],
-                    exception,
+                self._metrics.record(url, "timeout", time.monotonic() - start, retry=attempt > 0)
+                error = BrunataConnectionError(
+                    f"Timeout error fetching information from {url}"
                 )
+                cause = exception
             except (ClientError, gaierror) as exception:
-                _LOGGER.error(
-                    "Error fetching information from %s - %s",
-                    args["url"],
-                    exception,
+                self._metrics.record(url, "error", time.monotonic() - start, retry=attempt > 0)
+                error = BrunataConnectionError(
+                    f"Error fetching information from {url} - {exception}"
+                )
+                cause = exception
+            else:
+                self._metrics.record(
+                    url,
+                    response.status,
+                    time.monotonic() - start,
+                    len(body),
+                    retry=attempt > 0,
+                )
+                if (
+                    response.status == 304
+                    and conditional
+                    and (cached := self._validators.body(key)) is not None
+                ):
+                    self._circuit.record_success()
+                    self._metrics.cache("not_modified", True)
+                    return cached
+                if response.status < 400:
+                    self._circuit.record_success()
+                    if conditional:
+                        if validators:
+                            self._metrics.cache("not_modified", False)
+                        self._validators.put(
+                            key,
+                            response.headers.get("ETag"),
+                            response.headers.get("Last-Modified"),
+                            body,
+                        )
+                    return body
+                if response.status == 401:
+                    # The token may have been revoked, renew it next time
+                    self._tokens.pop("access_token", None)
+                    self._tokens.pop("expires_on", None)
+                    self._headers.pop("Authorization", None)
+                if response.status in (401, 403):
+                    raise BrunataAuthError(
+                        f"Not authorized to fetch information from {url} - {response.status}"
+                    )
+                if response.status not in RETRY_STATUSES:
+                    raise BrunataResponseError(
+                        f"Error fetching information from {url} - {response.status}",
+                        response.status,
+                    )
+                error = BrunataConnectionError(
+                    f"Error fetching information from {url} - {response.status}"
                 )
-            except Exception as exception:  # pylint: disable=broad-except
-                _LOGGER.error("Something really wrong happened! - %s", exception)
+                if (wait := retry_after(response)) is not None:
+                    if wait > BACKOFF_MAX:
+                        # Don't wait that long within a refresh, but respect it
+                        self._circuit.open_for(wait)
+                        break
+                    delay = wait
+            if attempt + 1 < attempts:
+                _LOGGER.debug("%s, retrying in %.1f seconds", error, delay)
+                await asyncio.sleep(delay)
+        _LOGGER.error("%s", error)
+        self._circuit.record_failure()
+        raise error from cause
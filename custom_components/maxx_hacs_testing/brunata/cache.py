@@ -0,0 +1,135 @@
+"""Caches of API responses."""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import time
+
+# Bytes of response bodies kept, the least recently used go first
+CACHE_MAX_BYTES = 16 * 1024 * 1024
+# Seconds a response of a window that is still open is reused
+CACHE_TTL = 300
+# Time after the end of a window before its values are taken as final, late
+# readings are still corrected in the first days of a month
+CLOSED_GRACE = timedelta(days=3)
+# Requests whose validators and last body are kept for conditional requests
+VALIDATORS_MAX_ENTRIES = 256
+
+
+def is_closed(enddate: str, now: datetime | None = None) -> bool:
+    """Returns whether a window ended more than CLOSED_GRACE ago, its values are final"""
+    now = now or datetime.now()
+    return enddate[:10] < (now - CLOSED_GRACE).strftime("%Y-%m-%d")
+
+
+class ResponseCache:
+    """Consumption responses by (allocation unit, interval, startdate, enddate).
+
+    Windows that ended more than CLOSED_GRACE ago never change, their
+    responses are kept until evicted and can be persisted. Responses of open
+    and recently ended windows are only reused for a short TTL. The cache can be shared by the
+    clients of several accounts, allocation units are unique.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL) -> None:
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        # key -> (body, monotonic expiry or None when closed), oldest use first
+        self._entries: OrderedDict[tuple, tuple[bytes, float | None]] = OrderedDict()
+        self._bytes = 0
+        # Changes whenever the closed responses change, to know when to persist
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """Bytes of the cached bodies."""
+        return self._bytes
+
+    def get(self, key: tuple) -> bytes | None:
+        """Return the cached body of a window, if any and not expired."""
+        if (entry := self._entries.get(key)) is None:
+            return None
+        body, expires = entry
+        if expires is not None and expires < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return body
+
+    def put(self, key: tuple, body: bytes) -> None:
+        """Cache the body of a window, for good if the window is closed."""
+        closed = is_closed(key[3])
+        if key in self._entries:
+            self._remove(key)
+        if len(body) > self._max_bytes:
+            return
+        self._entries[key] = (body, None if closed else time.monotonic() + self._ttl)
+        self._bytes += len(body)
+        self.generation += closed
+        while self._bytes > self._max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: tuple) -> None:
+        body, expires = self._entries.pop(key)
+        self._bytes -= len(body)
+        self.generation += expires is None
+
+    def get_state(self) -> list:
+        """Return the responses of closed windows, least recently used first, to persist."""
+        return [
+            [*key, body.decode()]
+            for key, (body, expires) in self._entries.items()
+            if expires is None
+        ]
+
+    def restore_state(self, state: list) -> None:
+        """Restore responses of closed windows returned by get_state."""
+        for *key, body in state:
+            self.put(tuple(key), body.encode())
+        self.generation = 0
+
+
+class ValidatorCache:
+    """ETag, Last-Modified and body of the last response of each request.
+
+    Requests with validators are sent as conditional requests, and a 304 Not
+    Modified is answered with the body kept here.
+    """
+
+    def __init__(self, max_entries: int = VALIDATORS_MAX_ENTRIES) -> None:
+        self._max_entries = max_entries
+        # key -> (etag, last modified, body), oldest use first
+        self._entries: OrderedDict[tuple, tuple[str | None, str | None, bytes]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def headers(self, key: tuple) -> dict:
+        """Return the conditional request headers of a request, if it has validators."""
+        if (entry := self._entries.get(key)) is None:
+            return {}
+        etag, last_modified, _ = entry
+        headers = {}
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def body(self, key: tuple) -> bytes | None:
+        """Return the body of the last response of a request."""
+        if (entry := self._entries.get(key)) is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def put(self, key: tuple, etag: str | None, last_modified: str | None, body: bytes) -> None:
+        """Remember the validators and body of a response, if it has validators."""
+        self._entries.pop(key, None)
+        if etag is None and last_modified is None:
+            return
+        self._entries[key] = (etag, last_modified, body)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
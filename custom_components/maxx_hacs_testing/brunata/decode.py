@@ -0,0 +1,29 @@
+"""Decoding of Brunata Online payloads."""
+
+try:
+    from orjson import loads
+except ImportError:  # orjson is optional, json.loads also takes bytes
+    from json import loads
+
+
+def consumption_lines(body: bytes, key_length: int) -> list[tuple]:
+    """Decode a consumption payload into (meter id, name, values) per meter.
+
+    Only the fields used are read. Values are (date key, consumption) pairs
+    with the date cut to key_length and empty consumptions left out.
+    """
+    lines = []
+    for index, line in enumerate(loads(body).get("consumptionLines") or ()):
+        meter = line.get("meter") or {}
+        lines.append(
+            (
+                meter.get("meterId") or index,
+                meter.get("placement") or index,
+                [
+                    (value["fromDate"][:key_length], consumption)
+                    for value in line.get("consumptionValues") or ()
+                    if (consumption := value.get("consumption")) is not None
+                ],
+            )
+        )
+    return lines
@@ -0,0 +1,25 @@
+"""Exceptions raised by the Brunata API."""
+
+
+class BrunataError(Exception):
+    """Base class for Brunata API errors."""
+
+
+class BrunataConnectionError(BrunataError):
+    """The API could not be reached or kept failing after retries."""
+
+
+class BrunataCircuitOpenError(BrunataConnectionError):
+    """Requests are held back after repeated failures."""
+
+
+class BrunataAuthError(BrunataError):
+    """The API rejected the credentials or tokens."""
+
+
+class BrunataResponseError(BrunataError):
+    """The API answered with an error that retrying won't fix."""
+
+    def __init__(self, message: str, status: int) -> None:
+        super().__init__(message)
+        self.status = status
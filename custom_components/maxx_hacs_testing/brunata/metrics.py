@@ -0,0 +1,167 @@
+"""Request metrics per endpoint."""
+
+from collections import deque
+import time
+from types import SimpleNamespace
+
+from aiohttp import TraceConfig
+
+# Upper bounds in seconds of the latency histogram buckets, the last is open
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Refresh traces kept, and requests kept per trace
+TRACE_COUNT = 10
+TRACE_REQUESTS = 500
+
+
+def endpoint(url) -> str:
+    """Returns the last path segment of a URL, e.g. "consumption" """
+    return str(url).split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+
+
+class EndpointStats:
+    """Counters, bytes and a latency histogram of the requests to one endpoint."""
+
+    __slots__ = (
+        "requests",
+        "errors",
+        "retries",
+        "not_modified",
+        "bytes",
+        "latency",
+        "statuses",
+        "histogram",
+    )
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        # Conditional requests answered with 304 Not Modified
+        self.not_modified = 0
+        self.bytes = 0
+        # Sum of the latencies in seconds
+        self.latency = 0.0
+        self.statuses: dict[str, int] = {}
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def as_dict(self) -> dict:
+        """Return the stats as plain data."""
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "not_modified": self.not_modified,
+            "bytes": self.bytes,
+            "mean_latency": self.latency / self.requests if self.requests else None,
+            "statuses": dict(self.statuses),
+            "latency_histogram": {
+                f"<={bound}": count
+                for bound, count in zip(LATENCY_BUCKETS, self.histogram)
+            }
+            | {f">{LATENCY_BUCKETS[-1]}": self.histogram[-1]},
+        }
+
+
+class RequestMetrics:
+    """Stats of every endpoint requested since the client was created.
+
+    The requests of the last few refreshes are also kept one by one, and
+    cache lookups are counted as hits and misses per cache.
+    """
+
+    def __init__(self, traces: int = TRACE_COUNT) -> None:
+        self._endpoints: dict[str, EndpointStats] = {}
+        self._traces: deque[dict] = deque(maxlen=traces)
+        self._trace: dict | None = None
+        self._caches: dict[str, list[int]] = {}
+
+    def record(
+        self, url, status: int | str, latency: float, size: int = 0, retry: bool = False
+    ) -> None:
+        """Record a request answered with a status, or failed with "timeout" or "error"."""
+        stats = self._endpoints.get(name := endpoint(url))
+        if stats is None:
+            stats = self._endpoints[name] = EndpointStats()
+        stats.requests += 1
+        stats.retries += retry
+        stats.not_modified += status == 304
+        stats.bytes += size
+        stats.latency += latency
+        if not isinstance(status, int) or status >= 400:
+            stats.errors += 1
+        stats.statuses[str(status)] = stats.statuses.get(str(status), 0) + 1
+        bucket = next(
+            (index for index, bound in enumerate(LATENCY_BUCKETS) if latency <= bound),
+            len(LATENCY_BUCKETS),
+        )
+        stats.histogram[bucket] += 1
+        if (trace := self._trace) is not None:
+            if len(trace["requests"]) < TRACE_REQUESTS:
+                trace["requests"].append(
+                    {
+                        "endpoint": name,
+                        "status": status,
+                        "at": round(time.time() - trace["started"], 3),
+                        "latency": round(latency, 3),
+                        "bytes": size,
+                        "retry": retry,
+                    }
+                )
+            else:
+                trace["dropped"] += 1
+
+    def start_trace(self) -> dict:
+        """Start recording the requests of a refresh, returning its trace."""
+        self._trace = {"started": time.time(), "requests": [], "dropped": 0}
+        self._traces.append(self._trace)
+        return self._trace
+
+    def traces(self) -> list[dict]:
+        """Return copies of the traces of the last refreshes, oldest first."""
+        return [dict(trace, requests=list(trace["requests"])) for trace in self._traces]
+
+    def cache(self, name: str, hit: bool) -> None:
+        """Count a lookup in a cache."""
+        counts = self._caches.setdefault(name, [0, 0])
+        counts[0 if hit else 1] += 1
+
+    def cache_stats(self) -> dict:
+        """Return the hits, misses and hit rate of each cache."""
+        return {
+            name: {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+            for name, (hits, misses) in self._caches.items()
+        }
+
+    def totals(self) -> dict:
+        """Return the requests, errors and bytes over all endpoints."""
+        return {
+            key: sum(getattr(stats, key) for stats in self._endpoints.values())
+            for key in ("requests", "errors", "retries", "not_modified", "bytes")
+        }
+
+    def snapshot(self) -> dict:
+        """Return the stats of each endpoint."""
+        return {name: stats.as_dict() for name, stats in self._endpoints.items()}
+
+    def trace_config(self) -> TraceConfig:
+        """Return a TraceConfig recording the requests of a session."""
+
+        async def on_request_start(session, context: SimpleNamespace, params) -> None:
+            context.start = time.monotonic()
+
+        async def on_request_end(session, context: SimpleNamespace, params) -> None:
+            self.record(
+                params.url,
+                params.response.status,
+                time.monotonic() - context.start,
+                params.response.content_length or 0,
+            )
+
+        async def on_request_exception(session, context: SimpleNamespace, params) -> None:
+            self.record(params.url, "error", time.monotonic() - context.start)
+
+        config = TraceConfig()
+        config.on_request_start.append(on_request_start)
+        config.on_request_end.append(on_request_end)
+        config.on_request_exception.append(on_request_exception)
+        return config
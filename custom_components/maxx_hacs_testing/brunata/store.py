@@ -0,0 +1,275 @@
+"""Compact storage of meter values."""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator, Mapping
+from datetime import date
+
+from .aggregate import first_day, monthly_sums
+from .const import Consumption, Interval
+
+
+def key_to_ordinal(key: str, monthly: bool) -> int:
+    """Returns the ordinal of a "YYYY-MM-DD" key, or of a "YYYY-MM" key if monthly"""
+    if monthly:
+        return int(key[:4]) * 12 + int(key[5:7]) - 1
+    return date.fromisoformat(key[:10]).toordinal()
+
+
+def ordinal_to_key(ordinal: int, monthly: bool) -> str:
+    """Returns the key of an ordinal made by key_to_ordinal"""
+    if monthly:
+        year, month = divmod(ordinal, 12)
+        return f"{year:04d}-{month + 1:02d}"
+    return date.fromordinal(ordinal).isoformat()
+
+
+class MeterSeries:
+    """Values of a single meter, as date ordinal and value columns sorted by date."""
+
+    __slots__ = ("name", "monthly", "updated", "_changed", "_ordinals", "_values")
+
+    def __init__(self, name: str, monthly: bool = False) -> None:
+        self.name = name
+        self.monthly = monthly
+        # Timestamp of the last successful fetch of the meter
+        self.updated: float | None = None
+        # Ordinal of the oldest value added or changed since each reader's
+        # last take_changed, None when nothing changed since
+        self._changed: dict[str, int | None] = {}
+        self._ordinals = array("i")
+        self._values = array("d")
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    def merge(self, values: Iterable[tuple[str, float]]) -> int:
+        """Add or replace values by key, returning how many were new or changed."""
+        ordinals = self._ordinals
+        changed = 0
+        for key, value in values:
+            ordinal = key_to_ordinal(key, self.monthly)
+            # New values are almost always appended at the end
+            if not ordinals or ordinal > ordinals[-1]:
+                ordinals.append(ordinal)
+                self._values.append(value)
+            else:
+                index = bisect_left(ordinals, ordinal)
+                if ordinals[index] == ordinal:
+                    if self._values[index] == value:
+                        continue
+                    self._values[index] = value
+                else:
+                    ordinals.insert(index, ordinal)
+                    self._values.insert(index, value)
+            changed += 1
+            self.mark_changed(ordinal)
+        return changed
+
+    def mark_changed(self, ordinal: int, reader: str | None = None) -> None:
+        """Mark the values from an ordinal on as changed, for one reader or all."""
+        for key in self._changed if reader is None else (reader,):
+            changed_from = self._changed.get(key)
+            if changed_from is None or ordinal < changed_from:
+                self._changed[key] = ordinal
+
+    def take_changed(self, reader: str) -> int | None:
+        """Return the ordinal of the oldest value changed for a reader and clear its mark.
+
+        Series can be read by several readers, each gets every change once. A
+        new reader gets all the values.
+        """
+        if reader not in self._changed:
+            self._changed[reader] = None
+            return self._ordinals[0] if self._ordinals else None
+        changed_from, self._changed[reader] = self._changed[reader], None
+        return changed_from
+
+    def latest(self) -> tuple[str, float] | None:
+        """Return the newest key and value."""
+        if not self._ordinals:
+            return None
+        return ordinal_to_key(self._ordinals[-1], self.monthly), self._values[-1]
+
+    def oldest(self) -> tuple[str, float] | None:
+        """Return the oldest key and value."""
+        if not self._ordinals:
+            return None
+        return ordinal_to_key(self._ordinals[0], self.monthly), self._values[0]
+
+    def columns(self, start: str | None = None) -> tuple[array, array]:
+        """Return copies of the ordinal and value columns from start on."""
+        low = 0 if start is None else bisect_left(
+            self._ordinals, key_to_ordinal(start, self.monthly)
+        )
+        return self._ordinals[low:], self._values[low:]
+
+    def get(self, key: str, default: float | None = None) -> float | None:
+        """Return the value of a key."""
+        ordinal = key_to_ordinal(key, self.monthly)
+        index = bisect_left(self._ordinals, ordinal)
+        if index < len(self._ordinals) and self._ordinals[index] == ordinal:
+            return self._values[index]
+        return default
+
+    def range(self, start: str | None = None, end: str | None = None) -> list[tuple[str, float]]:
+        """Return the keys and values from start to end, both included."""
+        low = 0 if start is None else bisect_left(
+            self._ordinals, key_to_ordinal(start, self.monthly)
+        )
+        high = len(self._ordinals) if end is None else bisect_right(
+            self._ordinals, key_to_ordinal(end, self.monthly)
+        )
+        return [
+            (ordinal_to_key(ordinal, self.monthly), value)
+            for ordinal, value in zip(self._ordinals[low:high], self._values[low:high])
+        ]
+
+    def keys(self) -> Iterator[str]:
+        """Iterate over the keys, oldest first."""
+        return (ordinal_to_key(ordinal, self.monthly) for ordinal in self._ordinals)
+
+    def items(self) -> Iterator[tuple[str, float]]:
+        """Iterate over the keys and values, oldest first."""
+        return zip(self.keys(), self._values)
+
+    @property
+    def values(self) -> "MeterValues":
+        """A read-only {key: value} view of the series."""
+        return MeterValues(self)
+
+
+class MeterValues(Mapping):
+    """Read-only mapping of keys to values of a MeterSeries."""
+
+    __slots__ = ("_series",)
+
+    def __init__(self, series: MeterSeries) -> None:
+        self._series = series
+
+    def __getitem__(self, key: str) -> float:
+        if (value := self._series.get(key)) is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return self._series.keys()
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def __repr__(self) -> str:
+        return repr(dict(self._series.items()))
+
+
+class ConsumptionStore:
+    """The meter series of every consumption type and interval.
+
+    The newest key and value of every meter is indexed as values are merged,
+    so aggregates over all meters never touch the history.
+    """
+
+    def __init__(self) -> None:
+        self._meters: dict[tuple[Consumption, Interval], dict] = {
+            (_type, interval): {} for _type in Consumption for interval in Interval
+        }
+        self._latest: dict[tuple[Consumption, Interval], dict] = {
+            (_type, interval): {} for _type in Consumption for interval in Interval
+        }
+
+    def meters(self, _type: Consumption, interval: Interval) -> dict:
+        """Return the series of a type and interval by meter id."""
+        return self._meters[_type, interval]
+
+    def meter(
+        self, _type: Consumption, interval: Interval, meter_id, name: str
+    ) -> MeterSeries:
+        """Return the series of a meter, creating it if needed."""
+        meters = self._meters[_type, interval]
+        if (series := meters.get(meter_id)) is None:
+            series = meters[meter_id] = MeterSeries(name, interval is Interval.MONTH)
+        series.name = name
+        return series
+
+    def merge(
+        self,
+        _type: Consumption,
+        interval: Interval,
+        meter_id,
+        name: str,
+        values: Iterable[tuple[str, float]],
+    ) -> MeterSeries:
+        """Merge values into the series of a meter and update the latest index."""
+        series = self.meter(_type, interval, meter_id, name)
+        series.merge(values)
+        if (latest := series.latest()) is not None:
+            self._latest[_type, interval][meter_id] = latest
+        return series
+
+    def derive_months(
+        self, _type: Consumption, meter_id, start: str | None = None
+    ) -> MeterSeries | None:
+        """Sum the daily values of a meter into its monthly series.
+
+        Only the months from the one of start on are summed again. Months
+        that begin before the oldest daily value are not covered by the
+        daily history and are left to the API.
+        """
+        day = self._meters[_type, Interval.DAY].get(meter_id)
+        if day is None or (oldest := day.oldest()) is None:
+            return None
+        covered_from = key_to_ordinal(oldest[0], False)
+        ordinals, values = day.columns(None if start is None else f"{start[:7]}-01")
+        return self.merge(
+            _type,
+            Interval.MONTH,
+            meter_id,
+            day.name,
+            (
+                (ordinal_to_key(month, True), total)
+                for month, total in monthly_sums(ordinals, values)
+                if first_day(month) >= covered_from
+            ),
+        )
+
+    def latest(self, _type: Consumption, interval: Interval) -> dict:
+        """Return the newest key and value of each meter by meter id."""
+        return self._latest[_type, interval]
+
+    def aggregate(
+        self, _type: Consumption, interval: Interval, how: str = "sum"
+    ) -> tuple[str, float] | None:
+        """Aggregate the newest values of all meters of a type.
+
+        "sum" adds up the values of all meters for the newest key, "latest"
+        returns the value of the first meter with the newest key.
+        """
+        latest = self._latest[_type, interval]
+        if not latest:
+            return None
+        newest = max(key for key, _ in latest.values())
+        newest_values = [value for key, value in latest.values() if key == newest]
+        match how:
+            case "sum":
+                return newest, sum(newest_values)
+            case "latest":
+                return newest, newest_values[0]
+        raise ValueError(f"Unknown aggregate: {how}")
+
+    def sizes(self) -> dict:
+        """Return the number of meters and values of each type and interval."""
+        return {
+            f"{_type.name}/{interval.name}": {
+                "meters": len(meters),
+                "values": sum(len(series) for series in meters.values()),
+            }
+            for (_type, interval), meters in self._meters.items()
+            if meters
+        }
+
+    def view(self, _type: Consumption, interval: Interval) -> dict:
+        """Return the meters of a type in the {id: {"Name", "Values"}} shape."""
+        return {
+            meter_id: {"Name": series.name, "Values": series.values}
+            for meter_id, series in self._meters[_type, interval].items()
+        }
@@ -0,0 +1,124 @@
+"""API clients shared by the config entries and flows of an account."""
+from __future__ import annotations
+
+from datetime import timedelta
+
+import aiohttp
+
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import Event, HomeAssistant
+
+from .api import MaxxHacsTestingApiClient, create_client_session
+from .brunata.cache import ResponseCache
+from .const import DATA_CLIENTS
+from .response_cache import async_get_response_cache
+
+
+class _Account:
+    """The client of an account and the credentials it logs in with."""
+
+    __slots__ = ("username", "password", "client", "session", "previous")
+
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        client: MaxxHacsTestingApiClient,
+        session: aiohttp.ClientSession,
+        previous: _Account | None = None,
+    ) -> None:
+        self.username = username
+        self.password = password
+        self.client = client
+        self.session = session
+        # Account of the same username this one replaced, see async_release
+        self.previous = previous
+
+
+class MaxxHacsTestingClientRegistry:
+    """One client per account, with one session, token set and refresh.
+
+    Config entries hold the client of their account by entry id, config flows
+    by flow id. A flow hands the client it logged in with over to the entry it
+    creates, as the entry is set up before the flow is removed. The session of
+    a client is closed when its last holder releases it, or when Home
+    Assistant stops.
+    """
+
+    def __init__(self, response_cache: ResponseCache | None = None) -> None:
+        """Initialize."""
+        self._response_cache = response_cache
+        # Current account of each username
+        self._accounts: dict[str, _Account] = {}
+        # Account held by each entry or flow
+        self._holders: dict[str, _Account] = {}
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    async def async_acquire(
+        self,
+        holder: str,
+        username: str,
+        password: str,
+        topology_ttl: timedelta | None = None,
+    ) -> MaxxHacsTestingApiClient:
+        """Return the client of an account, creating it for its first holder."""
+        account = self._accounts.get(username)
+        if account is None or account.password != password:
+            # A new password gets its own client, holders of the old one keep it
+            session = create_client_session()
+            client = MaxxHacsTestingApiClient(
+                username=username,
+                password=password,
+                session=session,
+                response_cache=self._response_cache,
+            )
+            account = self._accounts[username] = _Account(
+                username, password, client, session, account
+            )
+        if self._holders.get(holder) is not account:
+            await self.async_release(holder)
+            self._holders[holder] = account
+        if topology_ttl is not None:
+            account.client.topology_ttl = topology_ttl
+        return account.client
+
+    async def async_release(self, holder: str) -> None:
+        """Release the client of an entry or flow, closing it if it was the last holder."""
+        if (account := self._holders.pop(holder, None)) is None:
+            return
+        if self._is_held(account):
+            return
+        if self._accounts.get(account.username) is account:
+            # A password that was never used by an entry, e.g. a wrong one
+            # tried in a flow, gives the account back to the client it replaced
+            if account.previous is not None and self._is_held(account.previous):
+                self._accounts[account.username] = account.previous
+            else:
+                del self._accounts[account.username]
+        await account.session.close()
+
+    async def async_close(self, _event: Event | None = None) -> None:
+        """Close the sessions of all clients, entries are not unloaded at shutdown."""
+        accounts = {id(account): account for account in self._holders.values()}
+        self._holders.clear()
+        self._accounts.clear()
+        for account in accounts.values():
+            await account.session.close()
+
+    def _is_held(self, account: _Account) -> bool:
+        return any(held is account for held in self._holders.values())
+
+
+async def async_get_client_registry(hass: HomeAssistant) -> MaxxHacsTestingClientRegistry:
+    """Return the client registry, creating it with the shared response cache."""
+    if (registry := hass.data.get(DATA_CLIENTS)) is None:
+        response_cache = await async_get_response_cache(hass)
+        # Another caller may have created it while the cache loaded
+        if (registry := hass.data.get(DATA_CLIENTS)) is None:
+            registry = hass.data[DATA_CLIENTS] = MaxxHacsTestingClientRegistry(
+                response_cache
+            )
+            hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, registry.async_close)
+    return registry
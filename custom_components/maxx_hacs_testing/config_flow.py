@@ -1,25 +1,69 @@
 """Config flow for Maxx HACS Testing integration."""
 from __future__ import annotations
 
+from datetime import date
 from typing import Any
 
 import voluptuous as vol
 
 from homeassistant import config_entries
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
 
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
-
-from .api import MaxxHacsTestingApiClient
-from .const import DOMAIN
+from .brunata.exceptions import BrunataError
+from .client_registry import async_get_client_registry
+from .const import (
+    DOMAIN,
+    DATA_CLIENTS,
+    CONF_BACKFILL_START,
+    CONF_DIAGNOSTIC_SENSORS,
+    CONF_MAX_INTERVAL,
+    CONF_MIN_INTERVAL,
+    CONF_POLL_HOURS,
+    CONF_TOPOLOGY_TTL,
+    DEFAULT_MAX_INTERVAL,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_TOPOLOGY_TTL,
+)
+from .schedule import parse_hours
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for Maxx HACS Testing."""
 
     VERSION = 1
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> OptionsFlowHandler:
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler(config_entry)
+
+    async def _async_validate(self, user_input: dict[str, Any]) -> bool:
+        """Log in with the credentials, keeping the client for the entry to set up.
+
+        The client is released again when the credentials do not work.
+        """
+        registry = await async_get_client_registry(self.hass)
+        client = await registry.async_acquire(
+            self.flow_id, user_input[CONF_USERNAME], user_input[CONF_PASSWORD]
+        )
+        valid = False
+        try:
+            valid = await client.async_authenticate()
+        finally:
+            if not valid:
+                await registry.async_release(self.flow_id)
+        return valid
+
+    @callback
+    def async_remove(self) -> None:
+        """Release the client, the entry created by the flow holds it by now."""
+        if (registry := self.hass.data.get(DATA_CLIENTS)) is not None:
+            self.hass.async_create_task(registry.async_release(self.flow_id))
+
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
@@ -28,21 +72,16 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         if user_input is not None:
             # Validate credentials
-            session = async_get_clientsession(self.hass)
-            client = MaxxHacsTestingApiClient(
-                username=user_input[CONF_USERNAME],
-                password=user_input[CONF_PASSWORD],
-                session=session,
-            )
-            
-            valid = await client.async_authenticate()
-            
-            if valid:
-                return self.async_create_entry(
-                    title=user_input[CONF_USERNAME],
-                    data=user_input,
-                )
+            try:
+                valid = await self._async_validate(user_input)
+            except BrunataError:
+                errors["base"] = "cannot_connect"
             else:
+                if valid:
+                    return self.async_create_entry(
+                        title=user_input[CONF_USERNAME],
+                        data=user_input,
+                    )
                 errors["base"] = "invalid_auth"
 
         return self.async_show_form(
@@ -64,21 +103,16 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         entry = self.hass.config_entries.async_get_entry(self.context["entry_id"])
 
         if user_input is not None:
-            session = async_get_clientsession(self.hass)
-            client = MaxxHacsTestingApiClient(
-                username=user_input[CONF_USERNAME],
-                password=user_input[CONF_PASSWORD],
-                session=session,
-            )
-            
-            valid = await client.async_authenticate()
-            
-            if valid:
-                return self.async_update_reload_and_abort(
-                    entry,
-                    data={**entry.data, **user_input},
-                )
+            try:
+                valid = await self._async_validate(user_input)
+            except BrunataError:
+                errors["base"] = "cannot_connect"
             else:
+                if valid:
+                    return self.async_update_reload_and_abort(
+                        entry,
+                        data={**entry.data, **user_input},
+                    )
                 errors["base"] = "invalid_auth"
 
         return self.async_show_form(
@@ -91,3 +125,65 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             ),
             errors=errors,
         )
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle options for Maxx HACS Testing."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        """Initialize options flow."""
+        self._config_entry = config_entry
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage the options."""
+        errors: dict[str, str] = {}
+
+        if user_input is not None:
+            # An empty start date turns the history download off
+            try:
+                if backfill_start := user_input.get(CONF_BACKFILL_START):
+                    date.fromisoformat(backfill_start)
+            except ValueError:
+                errors[CONF_BACKFILL_START] = "invalid_date"
+            try:
+                parse_hours(user_input.get(CONF_POLL_HOURS, ""))
+            except ValueError:
+                errors[CONF_POLL_HOURS] = "invalid_hours"
+            if not errors:
+                return self.async_create_entry(title="", data=user_input)
+
+        options = self._config_entry.options
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(
+                        CONF_TOPOLOGY_TTL,
+                        default=options.get(CONF_TOPOLOGY_TTL, DEFAULT_TOPOLOGY_TTL),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Optional(
+                        CONF_BACKFILL_START,
+                        default=options.get(CONF_BACKFILL_START, ""),
+                    ): str,
+                    vol.Optional(
+                        CONF_MIN_INTERVAL,
+                        default=options.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=5)),
+                    vol.Optional(
+                        CONF_MAX_INTERVAL,
+                        default=options.get(CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=5)),
+                    vol.Optional(
+                        CONF_POLL_HOURS,
+                        default=options.get(CONF_POLL_HOURS, ""),
+                    ): str,
+                    vol.Optional(
+                        CONF_DIAGNOSTIC_SENSORS,
+                        default=options.get(CONF_DIAGNOSTIC_SENSORS, False),
+                    ): bool,
+                }
+            ),
+            errors=errors,
+        )
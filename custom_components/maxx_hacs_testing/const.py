@@ -1,5 +1,45 @@
 """Constants for the Maxx HACS Testing integration."""
+from homeassistant.const import UnitOfEnergy, UnitOfVolume
 
 DOMAIN = "maxx_hacs_testing"
 CONF_USERNAME = "username"
 CONF_PASSWORD = "password"
+
+CONF_TOPOLOGY_TTL = "topology_ttl"
+# Hours before the meter topology is downloaded again
+DEFAULT_TOPOLOGY_TTL = 24
+
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10
+# hass.data key of the response cache shared by all entries
+DATA_RESPONSE_CACHE = f"{DOMAIN}_response_cache"
+# hass.data key of the API client of each account
+DATA_CLIENTS = f"{DOMAIN}_clients"
+
+SERVICE_REDISCOVER_METERS = "rediscover_meters"
+
+CONF_BACKFILL_START = "backfill_start"
+# Months of history downloaded at the same time
+BACKFILL_CONCURRENCY = 2
+
+# Bounds in minutes of the adaptive polling interval
+CONF_MIN_INTERVAL = "min_interval"
+DEFAULT_MIN_INTERVAL = 20
+CONF_MAX_INTERVAL = "max_interval"
+DEFAULT_MAX_INTERVAL = 360
+# Comma separated hours of the day always polled at the minimum interval
+CONF_POLL_HOURS = "poll_hours"
+
+# Whether to add sensors with request and refresh timing stats
+CONF_DIAGNOSTIC_SENSORS = "diagnostic_sensors"
+
+# Seconds before consumption types that failed are fetched again
+PARTIAL_RETRY_DELAY = 120
+
+# Unit of the values of each consumption type
+TYPE_UNITS = {
+    "Heating": UnitOfEnergy.KILO_WATT_HOUR,
+    "Water": UnitOfVolume.LITERS,
+    "Electricity": UnitOfEnergy.KILO_WATT_HOUR,
+    "Other": UnitOfEnergy.KILO_WATT_HOUR,
+}
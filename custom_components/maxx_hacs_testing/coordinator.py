@@ -1,15 +1,25 @@
 """DataUpdateCoordinator for Maxx HACS Testing."""
-from datetime import timedelta
+from __future__ import annotations
+
 import logging
+from typing import TYPE_CHECKING
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
     UpdateFailed,
 )
+from homeassistant.util import dt as dt_util
 
 from .api import MaxxHacsTestingApiClient
-from .const import DOMAIN
+from .schedule import LEARNING_INTERVAL, AdaptivePollSchedule, values_signature
+from .const import DOMAIN, PARTIAL_RETRY_DELAY, STORAGE_SAVE_DELAY
+
+if TYPE_CHECKING:
+    from .backfill import MaxxHacsTestingBackfill
+    from .response_cache import MaxxHacsTestingResponseCache
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,19 +30,171 @@ class MaxxHacsTestingDataUpdateCoordinator(DataUpdateCoordinator):
         self,
         hass: HomeAssistant,
         client: MaxxHacsTestingApiClient,
+        store: Store,
+        backfill: MaxxHacsTestingBackfill | None = None,
+        schedule: AdaptivePollSchedule | None = None,
+        response_cache: MaxxHacsTestingResponseCache | None = None,
     ) -> None:
         """Initialize."""
         self.client = client
+        self._store = store
+        self._backfill = backfill
+        self._schedule = schedule
+        self._response_cache = response_cache
+        self._signature: dict | None = None
+        self._saved_marker: tuple | None = None
+        self._unsub_retry: CALLBACK_TYPE | None = None
+        # Whether this entry is refreshing the client, see async_set_shared_data
+        self._refreshing = False
         super().__init__(
             hass=hass,
             logger=_LOGGER,
             name=DOMAIN,
-            update_interval=timedelta(minutes=30),
+            update_interval=LEARNING_INTERVAL,
+        )
+
+    async def async_load(self) -> None:
+        """Restore cached state from storage."""
+        if not (data := await self._store.async_load()):
+            return
+        if topology := data.get("topology"):
+            self.client.restore_topology(topology)
+        if token_data := data.get("tokens"):
+            self.client.restore_token_data(token_data)
+        if self._backfill is not None and (progress := data.get("backfill")):
+            self._backfill.restore_progress(progress)
+        if self._schedule is not None and (schedule := data.get("schedule")):
+            self._schedule.restore_state(schedule)
+        self._saved_marker = self._save_marker()
+
+    def _save_marker(self) -> tuple:
+        """Return a value that changes whenever the state to persist changes."""
+        return (
+            self.client.get_topology()["fetched_on"],
+            self.client.get_token_data()["tokens"].get("expires_on"),
+            len(self._backfill.get_progress()) if self._backfill is not None else 0,
+            self._schedule.observations if self._schedule is not None else 0,
         )
 
+    @callback
+    def _data_to_save(self) -> dict:
+        """Return the state to persist."""
+        data = {
+            "topology": self.client.get_topology(),
+            "tokens": self.client.get_token_data(),
+        }
+        if self._backfill is not None:
+            data["backfill"] = self._backfill.get_progress()
+        if self._schedule is not None:
+            data["schedule"] = self._schedule.get_state()
+        return data
+
+    @callback
+    def _async_save(self) -> None:
+        """Persist the state if it changed since it was last saved."""
+        if self._response_cache is not None:
+            self._response_cache.async_save()
+        if (marker := self._save_marker()) != self._saved_marker:
+            self._saved_marker = marker
+            self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    async def async_rediscover_meters(self) -> None:
+        """Download the meter topology again and refresh."""
+        await self.client.async_rediscover_meters()
+        await self.async_request_refresh()
+
+    @callback
+    def _async_schedule_retry(self) -> None:
+        """Fetch failed consumption types again soon, without a full refresh."""
+        if self.client.failed_types and self._unsub_retry is None:
+            self._unsub_retry = async_call_later(
+                self.hass, PARTIAL_RETRY_DELAY, self._async_retry_failed
+            )
+
+    async def _async_retry_failed(self, _now) -> None:
+        """Fetch failed consumption types again and publish what was fetched."""
+        self._unsub_retry = None
+        self._refreshing = True
+        try:
+            data = await self.client.async_retry_failed()
+        finally:
+            self._refreshing = False
+        self.async_set_updated_data(data)
+        # Types that failed again are tried once more later
+        self._async_schedule_retry()
+
+    @callback
+    def async_cancel_retry(self) -> None:
+        """Cancel a scheduled fetch of failed consumption types."""
+        if self._unsub_retry is not None:
+            self._unsub_retry()
+            self._unsub_retry = None
+
     async def _async_update_data(self):
         """Update data via library."""
+        self._refreshing = True
         try:
-            return await self.client.async_get_data()
+            data = await self.client.async_get_data()
+            self._async_adapt_interval(data)
         except Exception as exception:
             raise UpdateFailed(exception) from exception
+        finally:
+            self._refreshing = False
+            # tokens may have been renewed even when the refresh failed
+            self._async_save()
+        self._async_schedule_retry()
+        self._async_start_backfill()
+        return data
+
+    @callback
+    def async_set_shared_data(self, data: dict, full: bool) -> None:
+        """Publish the data of a refresh made for another entry of the account.
+
+        Publishing also pushes the next refresh of this entry back, so the
+        entries of an account follow whichever refreshes first instead of
+        each polling on its own.
+        """
+        if self._refreshing:
+            return
+        if full:
+            self._async_adapt_interval(data)
+            self._async_start_backfill()
+        self._async_save()
+        self.async_set_updated_data(data)
+
+    @callback
+    def _async_adapt_interval(self, data: dict) -> None:
+        """Learn whether this refresh found new values and pick the next interval."""
+        if self._schedule is None:
+            return
+        now = dt_util.now()
+        signature = values_signature(data)
+        self._schedule.record(
+            now, self._signature is not None and signature != self._signature
+        )
+        self._signature = signature
+        self.update_interval = self._schedule.next_interval(now)
+        self.logger.debug("Next refresh in %s", self.update_interval)
+
+    @callback
+    def _async_start_backfill(self) -> None:
+        """Download missing history in the background, unless already running.
+
+        It runs as a background task of the entry, so it does not hold up the
+        start of Home Assistant and is cancelled when the entry unloads.
+        Months that fail are tried again after a later refresh.
+        """
+        if self._backfill is None or self._backfill.running:
+            return
+        if self._backfill.remaining():
+            self.config_entry.async_create_background_task(
+                self.hass,
+                self._backfill.async_run(self._async_backfill_progress),
+                name=f"{DOMAIN} backfill",
+            )
+
+    @callback
+    def _async_backfill_progress(self) -> None:
+        """Save the backfill progress and let listeners see the new history."""
+        self._async_save()
+        self.async_update_listeners()
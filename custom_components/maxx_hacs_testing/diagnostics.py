@@ -0,0 +1,38 @@
+"""Diagnostics support for Maxx HACS Testing."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_PASSWORD, CONF_USERNAME, DOMAIN
+from .coordinator import MaxxHacsTestingDataUpdateCoordinator
+
+TO_REDACT = {
+    CONF_USERNAME,
+    CONF_PASSWORD,
+    "access_token",
+    "refresh_token",
+    "id_token",
+    "Authorization",
+}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry, built from memory only."""
+    coordinator: MaxxHacsTestingDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    return async_redact_data(
+        {
+            "entry": {"data": dict(entry.data), "options": dict(entry.options)},
+            "coordinator": {
+                "last_update_success": coordinator.last_update_success,
+                "update_interval": str(coordinator.update_interval),
+            },
+            "client": coordinator.client.get_diagnostics(),
+        },
+        TO_REDACT,
+    )
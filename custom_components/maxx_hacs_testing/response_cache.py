@@ -0,0 +1,46 @@
+"""Response cache shared by all config entries."""
+from __future__ import annotations
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .brunata.cache import ResponseCache
+from .const import DATA_RESPONSE_CACHE, DOMAIN, STORAGE_VERSION
+
+# Seconds before new responses of closed windows are written to disk
+RESPONSE_CACHE_SAVE_DELAY = 60
+
+
+class MaxxHacsTestingResponseCache(ResponseCache):
+    """The response cache of all accounts, closed windows persisted in one store.
+
+    Reloads, restarts and other entries then never fetch a finished month twice.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize."""
+        super().__init__()
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.responses")
+        self._saved_generation = 0
+
+    async def async_load(self) -> None:
+        """Restore the responses of closed windows from storage."""
+        if state := await self._store.async_load():
+            self.restore_state(state)
+        self._saved_generation = self.generation
+
+    @callback
+    def async_save(self) -> None:
+        """Persist the responses of closed windows if they changed."""
+        if self.generation != self._saved_generation:
+            self._saved_generation = self.generation
+            self._store.async_delay_save(self.get_state, RESPONSE_CACHE_SAVE_DELAY)
+
+
+async def async_get_response_cache(hass: HomeAssistant) -> MaxxHacsTestingResponseCache:
+    """Return the shared response cache, loading it for the first entry."""
+    if (cache := hass.data.get(DATA_RESPONSE_CACHE)) is None:
+        # Set before loading, so entries set up meanwhile share it
+        cache = hass.data[DATA_RESPONSE_CACHE] = MaxxHacsTestingResponseCache(hass)
+        await cache.async_load()
+    return cache
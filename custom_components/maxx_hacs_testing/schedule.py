@@ -0,0 +1,108 @@
+"""Adaptive polling schedule learned from when new values show up."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+# Interval while nothing has been learned yet
+LEARNING_INTERVAL = timedelta(minutes=30)
+# Weight kept by the other hours each time new values show up
+DECAY = 0.95
+# Share of the top weight that makes an hour busy
+BUSY_SHARE = 0.5
+
+
+def hours_between(start: datetime, end: datetime) -> list[int]:
+    """Return the hours of the day from start until end, both included."""
+    hours = []
+    hour = start.replace(minute=0, second=0, microsecond=0)
+    while hour <= end and len(hours) < 24:
+        hours.append(hour.hour)
+        hour += timedelta(hours=1)
+    return hours
+
+
+def parse_hours(hours: str) -> set[int]:
+    """Parse comma separated hours of the day, raising ValueError if invalid."""
+    parsed = {int(hour) for hour in hours.split(",") if hour.strip()}
+    if any(hour < 0 or hour > 23 for hour in parsed):
+        raise ValueError(f"Hours must be 0-23: {hours}")
+    return parsed
+
+
+def values_signature(data: dict) -> dict:
+    """Return the newest date and value of every meter in the coordinator data."""
+    return {
+        (consumption_type, meter_id): (meter["date"], meter["value"])
+        for consumption_type, meters in data.get("meters", {}).items()
+        for meter_id, meter in meters.items()
+    }
+
+
+class AdaptivePollSchedule:
+    """Polls often in the hours new values usually show up, rarely otherwise.
+
+    When a refresh finds new values, the hours since the previous refresh
+    share one unit of weight and older weights decay. During busy hours the
+    interval is the minimum, otherwise it lasts until the next busy hour,
+    within the minimum and maximum. Fixed poll hours replace the learned ones.
+    """
+
+    def __init__(
+        self,
+        min_interval: timedelta,
+        max_interval: timedelta,
+        poll_hours: set[int] | None = None,
+    ) -> None:
+        """Initialize."""
+        self._min_interval = min_interval
+        self._max_interval = max(max_interval, min_interval)
+        self._poll_hours = poll_hours
+        self._weights = [0.0] * 24
+        self._observations = 0
+        self._last_poll: datetime | None = None
+
+    @property
+    def observations(self) -> int:
+        """Return how many times new values were seen."""
+        return self._observations
+
+    def get_state(self) -> dict:
+        """Return what was learned, to persist."""
+        return {"weights": self._weights, "observations": self._observations}
+
+    def restore_state(self, state: dict) -> None:
+        """Restore what was learned before a restart."""
+        if len(weights := state.get("weights", [])) == 24:
+            self._weights = [float(weight) for weight in weights]
+            self._observations = state.get("observations", 0)
+
+    def record(self, now: datetime, changed: bool) -> None:
+        """Record a refresh and whether it brought new values."""
+        if changed and self._last_poll is not None:
+            hours = hours_between(self._last_poll, now)
+            self._weights = [weight * DECAY for weight in self._weights]
+            for hour in hours:
+                self._weights[hour] += 1 / len(hours)
+            self._observations += 1
+        self._last_poll = now
+
+    def busy_hours(self) -> set[int]:
+        """Return the hours of the day polled at the minimum interval."""
+        if self._poll_hours:
+            return self._poll_hours
+        if not (top := max(self._weights)):
+            return set()
+        return {hour for hour, weight in enumerate(self._weights) if weight >= top * BUSY_SHARE}
+
+    def next_interval(self, now: datetime) -> timedelta:
+        """Return the time until the next refresh."""
+        if not (busy := self.busy_hours()):
+            interval = LEARNING_INTERVAL
+        elif now.hour in busy:
+            interval = self._min_interval
+        else:
+            step = next(step for step in range(1, 25) if (now.hour + step) % 24 in busy)
+            interval = now.replace(minute=0, second=0, microsecond=0) + timedelta(
+                hours=step
+            ) - now
+        return max(self._min_interval, min(interval, self._max_interval))
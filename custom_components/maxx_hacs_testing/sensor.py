@@ -5,14 +5,69 @@ from homeassistant.components.sensor import (
     SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import UnitOfEnergy, UnitOfVolume
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EntityCategory, UnitOfInformation, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from .const import DOMAIN
+from .const import CONF_DIAGNOSTIC_SENSORS, DOMAIN, TYPE_UNITS
 from .coordinator import MaxxHacsTestingDataUpdateCoordinator
 
+# Device class of each consumption type
+TYPE_DEVICE_CLASSES = {
+    "Heating": SensorDeviceClass.ENERGY,
+    "Water": SensorDeviceClass.WATER,
+    "Electricity": SensorDeviceClass.ENERGY,
+    "Other": SensorDeviceClass.ENERGY,
+}
+
+# key: name, device class, state class, unit and the path in get_metrics()
+METRIC_SENSORS = {
+    "refresh_duration": (
+        "Refresh Duration",
+        SensorDeviceClass.DURATION,
+        SensorStateClass.MEASUREMENT,
+        UnitOfTime.SECONDS,
+        ("phases", "total"),
+    ),
+    "requests": (
+        "Requests",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        None,
+        ("totals", "requests"),
+    ),
+    "request_errors": (
+        "Request Errors",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        None,
+        ("totals", "errors"),
+    ),
+    "not_modified": (
+        "Not Modified Responses",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        None,
+        ("totals", "not_modified"),
+    ),
+    "bytes_received": (
+        "Bytes Received",
+        SensorDeviceClass.DATA_SIZE,
+        SensorStateClass.TOTAL_INCREASING,
+        UnitOfInformation.BYTES,
+        ("totals", "bytes"),
+    ),
+}
+
+# Unique ids of the original fixed sensors, not scoped to the entry, and the
+# consumption type of the totals that replaced them
+LEGACY_UNIQUE_IDS = {
+    f"{DOMAIN}_water_usage": "Water",
+    f"{DOMAIN}_electricity_usage": "Other",
+}
+
 async def async_setup_entry(
     hass: HomeAssistant,
     entry: ConfigEntry,
@@ -20,25 +75,48 @@ async def async_setup_entry(
 ) -> None:
     """Set up the sensor platform."""
     coordinator: MaxxHacsTestingDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
-    
-    entities = [
-        MaxxHacsTestingSensor(
-            coordinator=coordinator,
-            key="electricity_usage",
-            name="Electricity Usage",
-            device_class=SensorDeviceClass.ENERGY,
-            native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
-        ),
-        MaxxHacsTestingSensor(
-            coordinator=coordinator,
-            key="water_usage",
-            name="Water Usage",
-            device_class=SensorDeviceClass.WATER,
-            native_unit_of_measurement=UnitOfVolume.LITERS,
-        ),
-    ]
-    
-    async_add_entities(entities)
+    known: set[tuple] = set()
+
+    @callback
+    def _async_migrate_unique_id(entity_entry: er.RegistryEntry) -> dict | None:
+        """Scope the unique id of an original sensor to the entry, keeping its history."""
+        if (consumption_type := LEGACY_UNIQUE_IDS.get(entity_entry.unique_id)) is None:
+            return None
+        return {"new_unique_id": f"{DOMAIN}_{entry.entry_id}_{consumption_type}"}
+
+    await er.async_migrate_entries(hass, entry.entry_id, _async_migrate_unique_id)
+
+    @callback
+    def _async_add_new_entities() -> None:
+        """Add sensors for types and meters that appeared since the last refresh."""
+        if not coordinator.data:
+            return
+        entities = []
+        for consumption_type in coordinator.data.get("totals", {}):
+            if (consumption_type,) not in known:
+                known.add((consumption_type,))
+                entities.append(
+                    MaxxHacsTestingTotalSensor(coordinator, entry, consumption_type)
+                )
+        for consumption_type, meters in coordinator.data.get("meters", {}).items():
+            for meter_id in meters:
+                if (consumption_type, meter_id) not in known:
+                    known.add((consumption_type, meter_id))
+                    entities.append(
+                        MaxxHacsTestingMeterSensor(
+                            coordinator, entry, consumption_type, meter_id
+                        )
+                    )
+        if entities:
+            async_add_entities(entities)
+
+    _async_add_new_entities()
+    entry.async_on_unload(coordinator.async_add_listener(_async_add_new_entities))
+
+    if entry.options.get(CONF_DIAGNOSTIC_SENSORS):
+        async_add_entities(
+            MaxxHacsTestingMetricSensor(coordinator, entry, key) for key in METRIC_SENSORS
+        )
 
 class MaxxHacsTestingSensor(CoordinatorEntity, SensorEntity):
     """Maxx HACS Testing Sensor class."""
@@ -47,20 +125,144 @@ class MaxxHacsTestingSensor(CoordinatorEntity, SensorEntity):
         self,
         coordinator: MaxxHacsTestingDataUpdateCoordinator,
         key: str,
+        path: tuple,
         name: str,
         device_class: SensorDeviceClass,
         native_unit_of_measurement: str,
     ) -> None:
         """Initialize the sensor."""
         super().__init__(coordinator)
-        self._key = key
+        # Keys leading to the data of the sensor in the coordinator data
+        self._path = path
         self._attr_name = f"Maxx HACS Testing {name}"
         self._attr_unique_id = f"{DOMAIN}_{key}"
         self._attr_device_class = device_class
         self._attr_native_unit_of_measurement = native_unit_of_measurement
         self._attr_state_class = SensorStateClass.TOTAL_INCREASING
+        self._written_state = None
+
+    @property
+    def _entry(self) -> dict | None:
+        """Return the value of the sensor and when it was fetched, None when it is gone."""
+        entry = self.coordinator.data or {}
+        for key in self._path:
+            if (entry := entry.get(key)) is None:
+                return None
+        return entry
+
+    @property
+    def available(self) -> bool:
+        """Return if the coordinator is up and still reports the sensor."""
+        return super().available and self._entry is not None
 
     @property
     def native_value(self):
         """Return the native value of the sensor."""
-        return self.coordinator.data.get(self._key)
+        if (entry := self._entry) is None:
+            return None
+        return entry["value"]
+
+    @property
+    def extra_state_attributes(self) -> dict | None:
+        """Return when the value was last fetched, it is kept if a fetch fails."""
+        if (entry := self._entry) is None:
+            return None
+        attributes = {
+            key: entry[key]
+            for key in ("date", "month_to_date", "stale")
+            if entry.get(key) is not None
+        }
+        if updated := entry.get("updated"):
+            attributes["last_updated"] = updated
+        return attributes or None
+
+    def _state_snapshot(self) -> tuple:
+        """Return what a state write would change, the fetch time is left out."""
+        entry = self._entry or {}
+        return (
+            self.available,
+            entry.get("value"),
+            entry.get("date"),
+            entry.get("month_to_date"),
+            entry.get("stale"),
+        )
+
+    async def async_added_to_hass(self) -> None:
+        """Remember the state written when the sensor was added."""
+        await super().async_added_to_hass()
+        self._written_state = self._state_snapshot()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only when it changed, most refreshes bring the same values."""
+        snapshot = self._state_snapshot()
+        if snapshot == self._written_state:
+            return
+        self._written_state = snapshot
+        self.async_write_ha_state()
+
+class MaxxHacsTestingTotalSensor(MaxxHacsTestingSensor):
+    """Sum of the newest values of all meters of a consumption type."""
+
+    def __init__(
+        self,
+        coordinator: MaxxHacsTestingDataUpdateCoordinator,
+        config_entry: ConfigEntry,
+        consumption_type: str,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(
+            coordinator,
+            f"{config_entry.entry_id}_{consumption_type}",
+            ("totals", consumption_type),
+            f"{consumption_type} Usage",
+            TYPE_DEVICE_CLASSES[consumption_type],
+            TYPE_UNITS[consumption_type],
+        )
+
+class MaxxHacsTestingMeterSensor(MaxxHacsTestingSensor):
+    """Newest value of a single meter."""
+
+    def __init__(
+        self,
+        coordinator: MaxxHacsTestingDataUpdateCoordinator,
+        config_entry: ConfigEntry,
+        consumption_type: str,
+        meter_id,
+    ) -> None:
+        """Initialize the sensor."""
+        meter = coordinator.data["meters"][consumption_type][meter_id]
+        super().__init__(
+            coordinator,
+            f"{config_entry.entry_id}_{consumption_type}_{meter_id}",
+            ("meters", consumption_type, meter_id),
+            f"{consumption_type} {meter['name'] or meter_id}",
+            TYPE_DEVICE_CLASSES[consumption_type],
+            TYPE_UNITS[consumption_type],
+        )
+
+class MaxxHacsTestingMetricSensor(CoordinatorEntity, SensorEntity):
+    """Request or refresh timing stat of the API client."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(
+        self,
+        coordinator: MaxxHacsTestingDataUpdateCoordinator,
+        config_entry: ConfigEntry,
+        key: str,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        name, device_class, state_class, unit, self._path = METRIC_SENSORS[key]
+        self._attr_name = f"Maxx HACS Testing {name}"
+        self._attr_unique_id = f"{DOMAIN}_{config_entry.entry_id}_{key}"
+        self._attr_device_class = device_class
+        self._attr_state_class = state_class
+        self._attr_native_unit_of_measurement = unit
+
+    @property
+    def native_value(self):
+        """Return the stat from the metrics of the client."""
+        group, key = self._path
+        return self.coordinator.client.get_metrics()[group].get(key)
@@ -0,0 +1,125 @@
+"""Import of the daily meter values as long-term statistics."""
+from __future__ import annotations
+
+import asyncio
+from datetime import date, datetime, timedelta
+import logging
+import re
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    statistics_during_period,
+)
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .api import MaxxHacsTestingApiClient
+from .brunata.store import MeterSeries, ordinal_to_key
+from .const import DOMAIN, TYPE_UNITS
+
+_LOGGER = logging.getLogger(__name__)
+
+# How far back to look for the sum a re-import continues from
+SUM_LOOKBACK = timedelta(days=366)
+
+
+def statistic_id(entry_id: str, consumption_type: str, meter_id) -> str:
+    """Return the external statistic id of a meter."""
+    slug = re.sub(r"[^a-z0-9_]+", "_", f"{entry_id}_{consumption_type}_{meter_id}".lower())
+    return f"{DOMAIN}:{slug}"
+
+
+def start_of_day(key: str) -> datetime:
+    """Return the start of a "YYYY-MM-DD" day in the local time zone."""
+    return dt_util.start_of_local_day(date.fromisoformat(key))
+
+
+class MaxxHacsTestingStatisticsImporter:
+    """Imports the daily values of every meter on their real dates.
+
+    Each meter is sent in one recorder call holding only the days changed
+    since its last import, with sums continuing from what is already recorded.
+    The entries of an account share the series, each importer keeps its own
+    change marks.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, client: MaxxHacsTestingApiClient, entry_id: str
+    ) -> None:
+        """Initialize."""
+        self._hass = hass
+        self._client = client
+        self._entry_id = entry_id
+        self._lock = asyncio.Lock()
+        # The first imported ordinal of each statistic and the sum before it
+        self._bases: dict[str, tuple[int, float]] = {}
+
+    @callback
+    def async_schedule_import(self) -> None:
+        """Import the changed values in the background."""
+        self._hass.async_create_task(self.async_import())
+
+    async def async_import(self) -> None:
+        """Import the values changed since the last import."""
+        async with self._lock:
+            for consumption_type, meter_id, series in self._client.get_daily_series():
+                if (changed_from := series.take_changed(self._entry_id)) is None:
+                    continue
+                try:
+                    await self._async_import_meter(
+                        consumption_type, meter_id, series, changed_from
+                    )
+                except Exception:  # pylint: disable=broad-except
+                    # Try these days again on the next import
+                    series.mark_changed(changed_from, self._entry_id)
+                    _LOGGER.exception("Error importing statistics of meter %s", meter_id)
+
+    async def _async_import_meter(
+        self, consumption_type: str, meter_id, series: MeterSeries, changed_from: int
+    ) -> None:
+        """Import the values of a meter from an ordinal on."""
+        statistic = statistic_id(self._entry_id, consumption_type, meter_id)
+        base = self._bases.get(statistic)
+        if base is None or changed_from < base[0]:
+            base = (changed_from, await self._async_sum_before(statistic, changed_from))
+        base_ordinal, total = base
+
+        changed_key = ordinal_to_key(changed_from, False)
+        statistics = []
+        for key, value in series.range(ordinal_to_key(base_ordinal, False)):
+            total += value
+            if key >= changed_key:
+                statistics.append(
+                    StatisticData(start=start_of_day(key), state=value, sum=total)
+                )
+
+        metadata = StatisticMetaData(
+            has_mean=False,
+            has_sum=True,
+            name=f"Maxx HACS Testing {consumption_type} {series.name or meter_id}",
+            source=DOMAIN,
+            statistic_id=statistic,
+            unit_of_measurement=TYPE_UNITS[consumption_type],
+        )
+        async_add_external_statistics(self._hass, metadata, statistics)
+        self._bases[statistic] = base
+        _LOGGER.debug("Imported %d days of %s", len(statistics), statistic)
+
+    async def _async_sum_before(self, statistic: str, ordinal: int) -> float:
+        """Return the recorded sum before the day of an ordinal."""
+        end = start_of_day(ordinal_to_key(ordinal, False))
+        rows = await get_instance(self._hass).async_add_executor_job(
+            statistics_during_period,
+            self._hass,
+            end - SUM_LOOKBACK,
+            end,
+            {statistic},
+            "hour",
+            None,
+            {"sum"},
+        )
+        if not (rows := rows.get(statistic)):
+            return 0.0
+        return rows[-1]["sum"] or 0.0
@@ -1,8 +1,13 @@
 """Global fixtures for Maxx HACS Testing integration."""
+from contextlib import AsyncExitStack
 import sys
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
+
+from aiohttp import ClientSession
 import pytest
 
+from fake_brunata import FakeBrunata
+
 # Mock homeassistant module
 module_mock = MagicMock()
 sys.modules["homeassistant"] = module_mock
@@ -11,7 +16,46 @@ sys.modules["homeassistant.const"] = module_mock
 sys.modules["homeassistant.core"] = module_mock
 sys.modules["homeassistant.helpers"] = module_mock
 sys.modules["homeassistant.helpers.update_coordinator"] = module_mock
+sys.modules["homeassistant.helpers.storage"] = module_mock
+sys.modules["homeassistant.helpers.event"] = module_mock
+sys.modules["homeassistant.components"] = module_mock
+sys.modules["homeassistant.components.recorder"] = module_mock
+sys.modules["homeassistant.components.recorder.models"] = module_mock
+sys.modules["homeassistant.components.recorder.statistics"] = module_mock
+sys.modules["homeassistant.util"] = module_mock
 
 @pytest.fixture
 def anyio_backend():
     return "asyncio"
+
+@pytest.fixture(name="client_session")
+async def client_session_fixture():
+    """An aiohttp session, closed after the test."""
+    async with ClientSession() as session:
+        yield session
+
+@pytest.fixture(name="fake_brunata")
+async def fake_brunata_fixture(request):
+    """Return a factory starting a FakeBrunata server, stopped after the test.
+
+    The Brunata API the test module imported (its BrunataOnlineApiClient) is
+    pointed at the server, extra module constants can be patched too.
+    """
+    api_globals = request.module.BrunataOnlineApiClient._b2c_auth.__globals__
+    async with AsyncExitStack() as stack:
+
+        async def start(constants: dict | None = None, **kwargs) -> FakeBrunata:
+            server = await stack.enter_async_context(FakeBrunata(**kwargs))
+            stack.enter_context(patch.dict(api_globals, {**server.urls(), **(constants or {})}))
+            return server
+
+        yield start
+
+@pytest.fixture(name="brunata_client")
+def brunata_client_fixture(request, client_session):
+    """Return a factory of Brunata clients of the test module using one session."""
+
+    def create(username: str = "user", password: str = "pass", **kwargs):
+        return request.module.BrunataOnlineApiClient(username, password, client_session, **kwargs)
+
+    return create
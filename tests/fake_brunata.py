@@ -0,0 +1,194 @@
+"""Local stand-in for the Brunata B2C login and REST endpoints."""
+import asyncio
+from datetime import datetime, timedelta
+import hashlib
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+B2C_PATH = "/b2c"
+REST_PATH = "/online-webservice/v1/rest"
+AUTH_REST_PATH = "/online-auth-webservice/v1/rest"
+
+
+class FakeBrunata:
+    """aiohttp server answering the requests made by BrunataOnlineApiClient."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        units: dict[int, list[str]] | None = None,
+        meters_per_unit: int = 1,
+        etags: bool = False,
+        today: datetime | None = None,
+    ) -> None:
+        self.latency = latency
+        # Last day with values, the current one when not pinned
+        self.today = today
+        # Whether GET responses carry an ETag and honor If-None-Match
+        self.etags = etags
+        # superAllocationUnit -> allocation units
+        self.units = units if units is not None else {2: ["K"], 6: ["M"]}
+        self.meters_per_unit = meters_per_unit
+        self.requests: list[tuple[str, str]] = []
+        self.bytes_sent = 0
+        self.consumption_queries: list[dict] = []
+        self.grants: list[str] = []
+        # Faults answered instead of the real response, in order, per path suffix
+        self.faults: dict[str, list] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._authenticated = False
+        self._server: TestServer | None = None
+
+    async def __aenter__(self) -> "FakeBrunata":
+        app = web.Application(middlewares=[self._record])
+        app.router.add_get(f"{AUTH_REST_PATH}/authorize", self._authorize)
+        app.router.add_post(f"{B2C_PATH}/SelfAsserted", self._self_asserted)
+        app.router.add_get(
+            f"{B2C_PATH}/api/CombinedSigninAndSignup/confirmed", self._confirmed
+        )
+        app.router.add_post(f"{B2C_PATH}/oauth2/v2.0/token", self._token)
+        app.router.add_get(
+            f"{REST_PATH}/consumer/superallocationunits", self._superallocationunits
+        )
+        app.router.add_get(f"{REST_PATH}/consumer/consumption", self._consumption)
+        self._server = TestServer(app, host="127.0.0.1")
+        await self._server.start_server()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._server.close()
+
+    @property
+    def base_url(self) -> str:
+        """Root URL of the server, as a hostname so cookies are accepted."""
+        return f"http://localhost:{self._server.port}"
+
+    def urls(self) -> dict:
+        """Module constants of brunata.api pointing at this server."""
+        return {
+            "API_URL": f"{self.base_url}{REST_PATH}",
+            "AUTHN_URL": f"{self.base_url}{B2C_PATH}",
+            "OAUTH2_URL": f"{self.base_url}{B2C_PATH}/oauth2/v2.0",
+            "CONSUMPTION_URL": f"{self.base_url}/consumption-overview",
+        }
+
+    def inject(self, path_suffix: str, *faults) -> None:
+        """Answer the next requests to a path with faults.
+
+        A fault is a status code, a (status, Retry-After) tuple, or "timeout"
+        to hang for a second.
+        """
+        self.faults.setdefault(path_suffix, []).extend(faults)
+
+    def _next_fault(self, path: str):
+        for suffix, faults in self.faults.items():
+            if path.endswith(suffix) and faults:
+                return faults.pop(0)
+        return None
+
+    @web.middleware
+    async def _record(self, request: web.Request, handler):
+        self.requests.append((request.method, request.path))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            fault = self._next_fault(request.path)
+            if fault == "timeout":
+                await asyncio.sleep(1)
+            elif isinstance(fault, tuple):
+                return web.Response(status=fault[0], headers={"Retry-After": fault[1]})
+            elif fault is not None:
+                return web.Response(status=fault)
+            response = await handler(request)
+            if self.etags and request.method == "GET" and isinstance(response.body, bytes):
+                etag = f'"{hashlib.sha1(response.body).hexdigest()}"'
+                if request.headers.get("If-None-Match") == etag:
+                    return web.Response(status=304, headers={"ETag": etag})
+                response.headers["ETag"] = etag
+            if isinstance(response.body, bytes):
+                self.bytes_sent += len(response.body)
+            return response
+        finally:
+            self.in_flight -= 1
+
+    async def _authorize(self, request: web.Request) -> web.Response:
+        response = web.Response(
+            text='<script>var SETTINGS = {"csrf":"fake-csrf","transId":"StateProperties=fake"};</script>',
+            content_type="text/html",
+        )
+        response.set_cookie("x-ms-cpim-csrf", "fake-csrf")
+        return response
+
+    async def _self_asserted(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        if request.headers.get("X-Csrf-Token") != "fake-csrf":
+            return web.json_response({"status": "403"})
+        self._authenticated = form.get("password") == "pass"
+        return web.json_response({"status": "200"})
+
+    async def _confirmed(self, request: web.Request) -> web.Response:
+        if not self._authenticated:
+            return web.Response(text="Invalid credentials")
+        raise web.HTTPFound("https://online.brunata.com/auth-response?code=fake-code")
+
+    async def _token(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        self.grants.append(form.get("grant_type"))
+        if form.get("grant_type") == "authorization_code" and form.get("code") != "fake-code":
+            return web.json_response({"error": "invalid_grant"}, status=400)
+        return web.json_response(
+            {
+                "access_token": "fake-access",
+                "token_type": "Bearer",
+                "expires_in": 3600,
+                "expires_on": int(time.time()) + 3600,
+                "refresh_token": "fake-refresh",
+                "refresh_token_expires_in": 86400,
+            }
+        )
+
+    async def _superallocationunits(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            [
+                {"superAllocationUnit": super_unit, "allocationUnits": units}
+                for super_unit, units in self.units.items()
+            ]
+        )
+
+    async def _consumption(self, request: web.Request) -> web.Response:
+        self.consumption_queries.append(dict(request.query))
+        unit = request.query["allocationunit"]
+        today = self.today or datetime.now()
+        date = datetime.fromisoformat(request.query["startdate"][:19])
+        end = datetime.fromisoformat(request.query["enddate"][:19])
+        values = []
+        while date <= end:
+            values.append(
+                {
+                    "fromDate": f"{date.isoformat()}.000Z",
+                    "consumption": float(date.day) if date <= today else None,
+                }
+            )
+            if request.query["interval"] == "D":
+                date += timedelta(days=1)
+            else:
+                date = (date.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return web.json_response(
+            {
+                "consumptionLines": [
+                    {
+                        "meter": {
+                            "meterId": f"meter-{unit}-{index}" if index else f"meter-{unit}",
+                            "placement": unit,
+                        },
+                        "consumptionValues": values,
+                    }
+                    for index in range(self.meters_per_unit)
+                ]
+            }
+        )
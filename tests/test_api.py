@@ -1,16 +1,40 @@
 """Tests for MaxxHacsTestingApiClient."""
+import asyncio
 import sys
 import pytest
 from unittest.mock import MagicMock, AsyncMock, patch
 from types import SimpleNamespace
 import os
 
+# The real clients, for the tests against the fake Brunata server
+mock_hass = SimpleNamespace()
+mock_hass.helpers = SimpleNamespace()
+mock_hass.helpers.aiohttp_client = SimpleNamespace()
+mock_hass.helpers.aiohttp_client.async_get_clientsession = MagicMock()
+mock_hass.helpers.storage = SimpleNamespace(Store=MagicMock)
+mock_hass.helpers.event = SimpleNamespace(async_call_later=MagicMock())
+
+with patch.dict(sys.modules, {
+    "homeassistant": mock_hass,
+    "homeassistant.helpers": mock_hass.helpers,
+    "homeassistant.helpers.aiohttp_client": mock_hass.helpers.aiohttp_client,
+    "homeassistant.helpers.storage": mock_hass.helpers.storage,
+    "homeassistant.helpers.event": mock_hass.helpers.event,
+}):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from custom_components.maxx_hacs_testing.api import MaxxHacsTestingApiClient
+    from custom_components.maxx_hacs_testing.brunata.api import BrunataOnlineApiClient
+    from custom_components.maxx_hacs_testing.brunata.exceptions import BrunataResponseError
+
 # Internal mocks
 mock_brunata_client_instance = MagicMock()
 mock_brunata_client_instance._get_tokens = AsyncMock(return_value=True)
 mock_brunata_client_instance.fetch_meters = AsyncMock()
 mock_brunata_client_instance.fetch_consumption = AsyncMock()
 mock_brunata_client_instance.get_consumption = MagicMock() # Will set return value in test
+mock_brunata_client_instance.aggregate = MagicMock(return_value=None)
+mock_brunata_client_instance.get_meter_updated = MagicMock(return_value={})
+mock_brunata_client_instance.get_meter_info = MagicMock(return_value={})
 
 mock_session_instance = MagicMock()
 
@@ -28,7 +52,7 @@ def mock_modules_fixture():
     mock_brunata_api_module.BrunataOnlineApiClient = MagicMock(return_value=mock_brunata_client_instance)
     # Mock enums
     mock_brunata_api_module.Consumption = SimpleNamespace(WATER="Water", ELECTRICITY="Electricity", HEATING="Heating", OTHER="Other")
-    mock_brunata_api_module.Interval = SimpleNamespace(DAY="Day")
+    mock_brunata_api_module.Interval = SimpleNamespace(DAY="Day", MONTH="Month")
 
     # Patch sys.modules
     with patch.dict(sys.modules, {
@@ -89,22 +113,50 @@ async def test_async_get_data(mock_modules):
     }
     
     mock_brunata_client_instance.get_consumption.return_value = sample_json
-    
-    data = await api.async_get_data()
+
+    # Sum the newest values of all meters of a type, like the consumption store
+    def aggregate(consumption_type, interval, how):
+        meters = sample_json[consumption_type].get("Meters", {}).get(interval, {})
+        latest = [max(meter["Values"].items()) for meter in meters.values() if meter["Values"]]
+        if not latest:
+            return None
+        newest = max(key for key, _ in latest)
+        return newest, sum(value for key, value in latest if key == newest)
+
+    # The newest value of each meter
+    def get_meter_info(consumption_type, interval):
+        meters = sample_json[consumption_type].get("Meters", {}).get(interval, {})
+        return {
+            meter_id: {
+                "name": meter["Name"],
+                "date": (newest := max(meter["Values"].items()))[0],
+                "value": newest[1],
+                "updated": None,
+            }
+            for meter_id, meter in meters.items()
+        }
+
+    mock_brunata_client_instance.aggregate.side_effect = aggregate
+    with patch.object(
+        mock_brunata_client_instance, "get_meter_info", MagicMock(side_effect=get_meter_info)
+    ), patch.object(mock_brunata_client_instance, "get_latest", MagicMock(return_value={})):
+        data = await api.async_get_data()
+    mock_brunata_client_instance.aggregate.side_effect = None
     
     # Verify calls
     assert mock_brunata_client_instance.fetch_meters.await_count == 1
     assert mock_brunata_client_instance.fetch_consumption.await_count == 4
     
-    # Verify data extraction
-    assert "electricity_usage" in data
-    assert "water_usage" in data
-    
-    # Map Other -> electricity_usage (latest value is 7)
-    assert data["electricity_usage"] == 7
-    
-    # Map Water -> water_usage (latest value is 1.0)
-    assert data["water_usage"] == 1.0
+    # Verify data extraction, types without meters have no totals
+    assert set(data["totals"]) == {"Water", "Other"}
+
+    # Newest value of the Other meter is 7
+    assert data["totals"]["Other"]["value"] == 7
+    assert data["totals"]["Other"]["date"] == "2026-01-02"
+
+    # Newest value of the Water meter is 1.0
+    assert data["totals"]["Water"]["value"] == 1.0
+    assert data["meters"]["Water"]["12709726"]["value"] == 1.0
 
 @pytest.mark.anyio
 async def test_async_authenticate(mock_modules):
@@ -117,3 +169,277 @@ async def test_async_authenticate(mock_modules):
     
     mock_brunata_client_instance._get_tokens.return_value = False
     assert await api.async_authenticate() is False
+
+@pytest.mark.anyio
+async def test_async_get_data_fetches_types_concurrently(mock_modules):
+    """Test that all consumption types are fetched at the same time."""
+    import asyncio
+    api_class = mock_modules
+    api = api_class("user", "pass", mock_session_instance)
+
+    in_flight = 0
+    max_in_flight = 0
+
+    async def slow_fetch(*args, **kwargs):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    mock_brunata_client_instance._get_tokens.reset_mock()
+    mock_brunata_client_instance._get_tokens.return_value = True
+    mock_brunata_client_instance.get_consumption.return_value = {}
+    with patch.object(mock_brunata_client_instance, "fetch_consumption", AsyncMock(side_effect=slow_fetch)):
+        await api.async_get_data()
+
+    assert max_in_flight == 4
+    # The token is fetched once up front
+    assert mock_brunata_client_instance._get_tokens.await_count == 1
+
+@pytest.mark.anyio
+async def test_topology_is_cached(mock_modules):
+    """Test that the meter topology is only downloaded once within its TTL."""
+    api_class = mock_modules
+    api = api_class("user", "pass", mock_session_instance)
+
+    mock_brunata_client_instance._get_tokens.return_value = True
+    mock_brunata_client_instance.get_consumption.return_value = {}
+    mock_brunata_client_instance.get_topology.return_value = [{"superAllocationUnit": 2}]
+    mock_brunata_client_instance.fetch_meters.reset_mock()
+
+    await api.async_get_data()
+    await api.async_get_data()
+    assert mock_brunata_client_instance.fetch_meters.await_count == 1
+
+    await api.async_rediscover_meters()
+    assert mock_brunata_client_instance.fetch_meters.await_count == 2
+
+    # A restored topology within its TTL needs no download at all
+    restored = api_class("user", "pass", mock_session_instance)
+    restored.restore_topology(api.get_topology())
+    mock_brunata_client_instance.set_topology.assert_called_with([{"superAllocationUnit": 2}])
+    await restored.async_get_data()
+    assert mock_brunata_client_instance.fetch_meters.await_count == 2
+
+@pytest.mark.anyio
+async def test_restore_token_data_checks_account(mock_modules):
+    """Test that saved tokens are only restored for the same account."""
+    api_class = mock_modules
+    api = api_class("user", "pass", mock_session_instance)
+    mock_brunata_client_instance.set_token_data.reset_mock()
+
+    api.restore_token_data({"username": "other", "tokens": {"access_token": "a"}})
+    mock_brunata_client_instance.set_token_data.assert_not_called()
+
+    with patch.object(
+        mock_brunata_client_instance, "get_token_data", MagicMock(return_value={})
+    ):
+        api.restore_token_data({"username": "user", "tokens": {"access_token": "a"}})
+    mock_brunata_client_instance.set_token_data.assert_called_once_with({"access_token": "a"})
+
+@pytest.mark.anyio
+async def test_restore_keeps_newer_state(mock_modules):
+    """Test that a client shared by entries keeps tokens and topology newer than saved ones."""
+    api = mock_modules("user", "pass", mock_session_instance)
+    mock_brunata_client_instance.set_token_data.reset_mock()
+    mock_brunata_client_instance.set_topology.reset_mock()
+
+    with patch.object(
+        mock_brunata_client_instance,
+        "get_token_data",
+        MagicMock(return_value={"access_token": "b", "expires_on": 200}),
+    ):
+        api.restore_token_data(
+            {"username": "user", "tokens": {"access_token": "a", "expires_on": 100}}
+        )
+        mock_brunata_client_instance.set_token_data.assert_not_called()
+        api.restore_token_data(
+            {"username": "user", "tokens": {"access_token": "c", "expires_on": 300}}
+        )
+        mock_brunata_client_instance.set_token_data.assert_called_once_with(
+            {"access_token": "c", "expires_on": 300}
+        )
+
+    api.restore_topology({"meters": [{"superAllocationUnit": 2}], "fetched_on": 200})
+    api.restore_topology({"meters": [{"superAllocationUnit": 6}], "fetched_on": 100})
+    mock_brunata_client_instance.set_topology.assert_called_once_with(
+        [{"superAllocationUnit": 2}]
+    )
+    assert api.get_topology()["fetched_on"] == 200
+
+def test_injected_session_is_used(mock_modules):
+    """Test that the client uses the session it is given instead of creating one."""
+    api_class = mock_modules
+    session = MagicMock()
+    mock_brunata_api = sys.modules["custom_components.maxx_hacs_testing.brunata.api"]
+    mock_brunata_api.BrunataOnlineApiClient.reset_mock()
+
+    api = api_class("user", "pass", session)
+
+    assert api._session is session
+    mock_brunata_api.BrunataOnlineApiClient.assert_called_once_with("user", "pass", session)
+    sys.modules["aiohttp"].ClientSession.assert_not_called()
+
+@pytest.mark.anyio
+async def test_async_get_data_partial_failure(mock_modules):
+    """Test that one failing consumption type doesn't fail the refresh."""
+    api_class = mock_modules
+    api = api_class("user", "pass", mock_session_instance)
+    mock_brunata_client_instance._get_tokens.return_value = True
+    mock_brunata_client_instance.get_consumption.return_value = {}
+
+    async def fetch(consumption_type, *args, **kwargs):
+        if consumption_type == "Heating":
+            raise ConnectionError("timeout")
+
+    fetch_mock = AsyncMock(side_effect=fetch)
+    with patch.object(mock_brunata_client_instance, "fetch_consumption", fetch_mock):
+        data = await api.async_get_data()
+        assert "totals" in data
+        assert api.failed_types == {"Heating"}
+
+        # Only the failed type is fetched again
+        fetch_mock.reset_mock()
+        await api.async_retry_failed()
+        assert [call.args[0] for call in fetch_mock.await_args_list] == ["Heating"]
+
+        # Tokens that can't be renewed keep the types failed for the next retry
+        fetch_mock.reset_mock()
+        with patch.object(
+            mock_brunata_client_instance,
+            "_get_tokens",
+            AsyncMock(side_effect=ConnectionError("circuit open")),
+        ):
+            assert "totals" in await api.async_retry_failed()
+        fetch_mock.assert_not_awaited()
+        assert api.failed_types == {"Heating"}
+
+    # When every type fails the refresh fails
+    with patch.object(
+        mock_brunata_client_instance,
+        "fetch_consumption",
+        AsyncMock(side_effect=ConnectionError("down")),
+    ):
+        with pytest.raises(ConnectionError):
+            await api.async_get_data()
+
+    # Types without units don't count, when all types with units fail it fails
+    async def fetch_with_units(consumption_type, *args, **kwargs):
+        if consumption_type in ("Water", "Other"):
+            raise ConnectionError("down")
+
+    with patch.object(
+        mock_brunata_client_instance,
+        "get_units",
+        MagicMock(side_effect=lambda consumption_type: ["K"] if consumption_type in ("Water", "Other") else []),
+    ), patch.object(
+        mock_brunata_client_instance,
+        "fetch_consumption",
+        AsyncMock(side_effect=fetch_with_units),
+    ):
+        with pytest.raises(ConnectionError):
+            await api.async_get_data()
+
+
+@pytest.mark.anyio
+async def test_async_get_data_shared(mock_modules):
+    """Test that a refresh asked for while another one runs reuses its result."""
+    api = mock_modules("user", "pass", mock_session_instance)
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def get_tokens():
+        started.set()
+        await release.wait()
+        return False
+
+    with patch.object(
+        mock_brunata_client_instance, "_get_tokens", AsyncMock(side_effect=get_tokens)
+    ) as get_tokens_mock:
+        first = asyncio.ensure_future(api.async_get_data())
+        await started.wait()
+        second = asyncio.ensure_future(api.async_get_data())
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(first, second)
+        assert get_tokens_mock.await_count == 1
+        assert results[0] == results[1]
+
+        # A refresh asked for afterwards fetches again
+        await api.async_get_data()
+        assert get_tokens_mock.await_count == 2
+
+
+@pytest.mark.anyio
+async def test_data_listeners(mock_modules):
+    """Test that the entries sharing a client learn of every refresh."""
+    api = mock_modules("user", "pass", mock_session_instance)
+    listener = MagicMock()
+    remove = api.add_data_listener(listener)
+
+    with patch.object(
+        mock_brunata_client_instance, "_get_tokens", AsyncMock(return_value=False)
+    ):
+        data = await api.async_get_data()
+        listener.assert_called_once_with(data, True)
+
+        await api.async_retry_failed()
+        assert listener.call_args.args[1] is False
+
+        remove()
+        await api.async_get_data()
+        assert listener.call_count == 2
+
+
+@pytest.mark.anyio
+async def test_refresh_phase_timings(fake_brunata, client_session):
+    """Test that a refresh records how long each phase took."""
+    server = await fake_brunata()
+    client = MaxxHacsTestingApiClient("user", "pass", client_session)
+    await client.async_get_data()
+
+    metrics = client.get_metrics()
+    assert set(metrics["phases"]) == {
+        "token", "topology", "Heating", "Water", "Electricity", "Other", "total"
+    }
+    assert metrics["totals"]["requests"] == len(server.requests)
+    assert metrics["endpoints"]["consumption"]["requests"] == 2
+
+
+@pytest.mark.anyio
+async def test_refresh_fails_when_every_type_with_units_fails(fake_brunata, client_session):
+    """Test that a refresh fails when no consumption at all could be fetched."""
+    server = await fake_brunata()
+    client = MaxxHacsTestingApiClient("user", "pass", client_session)
+    server.inject("/consumer/consumption", 404, 404)
+    with pytest.raises(BrunataResponseError):
+        await client.async_get_data()
+
+    # One of the two types with units is enough
+    server.inject("/consumer/consumption", 404)
+    await client.async_get_data()
+    assert len(client.failed_types) == 1
+
+
+@pytest.mark.anyio
+async def test_diagnostics_without_requests(fake_brunata, client_session):
+    """Test that diagnostics hold traces and cache stats but no tokens or requests."""
+    server = await fake_brunata()
+    client = MaxxHacsTestingApiClient("user", "pass", client_session)
+    await client.async_get_data()
+    await client.async_get_data()
+    requests = len(server.requests)
+    diagnostics = client.get_diagnostics()
+    assert len(server.requests) == requests
+
+    assert "fake-access" not in str(diagnostics)
+    assert 3500 < diagnostics["tokens"]["expires_on"] <= 3600
+    assert diagnostics["caches"]["topology"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+    assert diagnostics["store"]["WATER/DAY"]["meters"] == 1
+    first, second = diagnostics["traces"]
+    assert {request["endpoint"] for request in first["requests"]} >= {
+        "token", "superallocationunits", "consumption"
+    }
+    assert [request["endpoint"] for request in second["requests"]] == ["consumption"] * 2
+    assert second["phases"]["total"] > 0
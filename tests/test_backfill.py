@@ -0,0 +1,86 @@
+"""Tests for the history backfill."""
+from datetime import date, timedelta
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+# Mock generic HA modules
+mock_hass = SimpleNamespace()
+mock_hass.helpers = SimpleNamespace()
+mock_hass.helpers.aiohttp_client = SimpleNamespace()
+mock_hass.helpers.aiohttp_client.async_get_clientsession = MagicMock()
+mock_hass.helpers.storage = SimpleNamespace(Store=MagicMock)
+mock_hass.helpers.event = SimpleNamespace(async_call_later=MagicMock())
+
+# Patch sys.modules BEFORE import
+with patch.dict(sys.modules, {
+    "homeassistant": mock_hass,
+    "homeassistant.helpers": mock_hass.helpers,
+    "homeassistant.helpers.aiohttp_client": mock_hass.helpers.aiohttp_client,
+    "homeassistant.helpers.storage": mock_hass.helpers.storage,
+    "homeassistant.helpers.event": mock_hass.helpers.event,
+}):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from custom_components.maxx_hacs_testing.api import MaxxHacsTestingApiClient
+    from custom_components.maxx_hacs_testing.backfill import MaxxHacsTestingBackfill, months_back
+    from custom_components.maxx_hacs_testing.brunata.api import BrunataOnlineApiClient
+
+def test_months_back():
+    """Test that the months of the history are listed newest first."""
+    assert months_back(date(2023, 11, 15), date(2024, 2, 3)) == [
+        "2024-01", "2023-12", "2023-11"
+    ]
+    assert months_back(date(2024, 2, 1), date(2024, 2, 3)) == []
+
+@pytest.mark.anyio
+async def test_backfill_oldest_first():
+    """Test that history is fetched oldest first, so imported sums only move forward."""
+    client = MagicMock()
+    client.get_consumption_types = MagicMock(return_value=["Water"])
+    client.async_fetch_month = AsyncMock()
+    start = date(date.today().year - 1, 1, 1)
+    backfill = MaxxHacsTestingBackfill(client, start, max_concurrency=1)
+
+    running = []
+    client.async_fetch_month.side_effect = lambda *args: running.append(backfill.running)
+    assert await backfill.async_run(MagicMock())
+    assert running and all(running)
+    assert not backfill.running
+    months = [call.args[1] for call in client.async_fetch_month.await_args_list]
+    assert months[0] == f"{start.year}-01"
+    assert months == sorted(months)
+
+@pytest.mark.anyio
+async def test_backfill_resumes_from_progress(fake_brunata, client_session):
+    """Test that history is fetched by month and a new run skips finished months."""
+    start = (date.today().replace(day=1) - timedelta(days=40)).replace(day=1)
+    months = months_back(start, date.today())
+    server = await fake_brunata()
+    client = MaxxHacsTestingApiClient("user", "pass", client_session)
+    await client._brunata_client.fetch_meters()
+    types = client.get_consumption_types()
+    assert len(types) == 2
+
+    backfill = MaxxHacsTestingBackfill(client, start, max_concurrency=1)
+    progress = MagicMock()
+    server.inject("/consumer/consumption", 404)
+    assert not await backfill.async_run(progress)
+    assert progress.call_count == len(months) * len(types) - 1
+
+    resumed = MaxxHacsTestingBackfill(client, start)
+    resumed.restore_progress(backfill.get_progress())
+    assert len(resumed.remaining()) == 1
+    queries = len(server.consumption_queries)
+    assert await resumed.async_run(MagicMock())
+    assert len(server.consumption_queries) == queries + 1
+    assert resumed.remaining() == []
+
+    # The history went into the same store as the regular refreshes
+    assert all(
+        series.get(f"{month}-01") == 1.0
+        for month in months
+        for _, _, series in client.get_daily_series()
+    )
@@ -1,4 +1,7 @@
 """Test BrunataOnlineApiClient internal logic."""
+import asyncio
+from datetime import datetime, timedelta
+import json
 import pytest
 from unittest.mock import MagicMock
 import sys
@@ -11,15 +14,33 @@ mock_hass = SimpleNamespace()
 mock_hass.helpers = SimpleNamespace()
 mock_hass.helpers.aiohttp_client = SimpleNamespace()
 mock_hass.helpers.aiohttp_client.async_get_clientsession = MagicMock()
+mock_hass.helpers.storage = SimpleNamespace(Store=MagicMock)
+mock_hass.helpers.event = SimpleNamespace(async_call_later=MagicMock())
 
 # Patch sys.modules BEFORE import
 with patch.dict(sys.modules, {
     "homeassistant": mock_hass,
     "homeassistant.helpers": mock_hass.helpers,
     "homeassistant.helpers.aiohttp_client": mock_hass.helpers.aiohttp_client,
+    "homeassistant.helpers.storage": mock_hass.helpers.storage,
+    "homeassistant.helpers.event": mock_hass.helpers.event,
 }):
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from custom_components.maxx_hacs_testing.brunata.api import BrunataOnlineApiClient
+    from custom_components.maxx_hacs_testing.brunata.api import (
+        BrunataOnlineApiClient,
+        Consumption,
+        CircuitBreaker,
+        Interval,
+        month_window,
+        sync_window,
+    )
+    from custom_components.maxx_hacs_testing.brunata import decode
+    from custom_components.maxx_hacs_testing.brunata.exceptions import (
+        BrunataAuthError,
+        BrunataCircuitOpenError,
+        BrunataConnectionError,
+        BrunataResponseError,
+    )
 
 def test_init_does_not_modify_session_headers():
     """Test that __init__ does not modify the session headers."""
@@ -93,3 +114,355 @@ async def test_auth_flow_is_async():
         
         # Check it used session.request (async)
         assert params_mock_session.request.called
+
+@pytest.mark.anyio
+async def test_b2c_auth_does_not_stall_event_loop(fake_brunata, brunata_client):
+    """Test that a full login against a local B2C stand-in never blocks the loop."""
+    server = await fake_brunata(latency=0.05)
+    client = brunata_client()
+
+    loop = asyncio.get_running_loop()
+    max_stall = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal max_stall
+        while not done.is_set():
+            before = loop.time()
+            await asyncio.sleep(0.005)
+            max_stall = max(max_stall, loop.time() - before - 0.005)
+
+    tick = asyncio.create_task(ticker())
+    try:
+        assert await asyncio.wait_for(client._get_tokens(), 5) is True
+    finally:
+        done.set()
+        await tick
+
+    assert client._tokens["access_token"] == "fake-access"
+    assert ("POST", "/b2c/oauth2/v2.0/token") in server.requests
+    # Each of the four round trips takes 50 ms, a blocking login would stall
+    # the loop for at least that long
+    assert max_stall < 0.04
+
+@pytest.mark.anyio
+async def test_b2c_auth_invalid_credentials(fake_brunata, brunata_client):
+    """Test that rejected credentials give no tokens instead of raising."""
+    await fake_brunata()
+    client = brunata_client(password="wrong")
+    assert await client._get_tokens() is False
+
+@pytest.mark.anyio
+async def test_fetch_consumption_bounded_fan_out(fake_brunata, brunata_client):
+    """Test that allocation units are fetched concurrently, capped and in order."""
+    units = [f"U{i:02d}" for i in range(12)]
+    server = await fake_brunata(latency=0.02, units={2: units})
+    client = brunata_client(max_concurrency=3)
+    await client.fetch_meters()
+    await client.fetch_consumption(Consumption.WATER, Interval.DAY)
+
+    assert server.max_in_flight == 3
+    meters = client.get_consumption()["Water"]["Meters"]["Day"]
+    assert list(meters) == [f"meter-{unit}" for unit in units]
+
+def test_sync_window_crosses_month_and_year():
+    """Test that the incremental window is computed across rollovers."""
+    start, end = sync_window(Interval.DAY, "2027-01-01", timedelta(days=2))
+    assert start == "2026-12-30T00:00:00.000Z"
+    assert end.endswith("T23:59:59.999Z")
+
+    start, _ = sync_window(Interval.MONTH, "2027-01", timedelta(days=2))
+    assert start == "2026-12-01T00:00:00.000Z"
+
+@pytest.mark.anyio
+async def test_fetch_consumption_incremental(fake_brunata, brunata_client):
+    """Test that later incremental fetches only ask for the overlap window."""
+    server = await fake_brunata(units={2: ["K"]})
+    client = brunata_client()
+    await client.fetch_meters()
+    await client.fetch_consumption(Consumption.WATER, Interval.DAY, incremental=True)
+    await client.fetch_consumption(Consumption.WATER, Interval.DAY, incremental=True)
+
+    first, second = server.consumption_queries
+    today = datetime.now()
+    assert first["startdate"].startswith(today.strftime("%Y-%m-01"))
+    assert second["startdate"].startswith((today - timedelta(days=2)).strftime("%Y-%m-%d"))
+    values = client.get_consumption()["Water"]["Meters"]["Day"]["meter-K"]["Values"]
+    assert max(values) == today.strftime("%Y-%m-%d")
+    assert len(values) >= today.day
+
+@pytest.mark.anyio
+async def test_restored_tokens_skip_login(fake_brunata, brunata_client):
+    """Test that a client restored from saved tokens does not log in again."""
+    server = await fake_brunata()
+    client = brunata_client()
+    assert await client._get_tokens() is True
+    login_requests = len(server.requests)
+
+    restored = brunata_client()
+    restored.set_token_data(client.get_token_data())
+    assert await restored._get_tokens() is True
+    await restored.fetch_meters()
+
+    # Only the superallocationunits request was made after the restore
+    assert server.requests[login_requests:] == [
+        ("GET", "/online-webservice/v1/rest/consumer/superallocationunits")
+    ]
+    assert restored._headers["Authorization"] == "Bearer fake-access"
+
+@pytest.mark.anyio
+async def test_concurrent_get_tokens_single_flight(fake_brunata, brunata_client):
+    """Test that concurrent callers share one login, then renew ahead of expiry."""
+    server = await fake_brunata(latency=0.01)
+    client = brunata_client()
+    results = await asyncio.gather(*(client._get_tokens() for _ in range(5)))
+    assert results == [True] * 5
+    assert server.grants == ["authorization_code"]
+
+    # An access token expiring within the skew is renewed with the
+    # refresh token, once, without a new login
+    client._tokens["expires_on"] = int(datetime.now().timestamp()) + 60
+    results = await asyncio.gather(*(client._get_tokens() for _ in range(5)))
+    assert results == [True] * 5
+    assert server.grants == ["authorization_code", "refresh_token"]
+
+    # Once the refresh token is about to expire, a new login is made
+    client._tokens["expires_on"] = 0
+    client._tokens["refresh_token_expires_on"] = int(datetime.now().timestamp()) + 60
+    assert await client._get_tokens() is True
+    assert server.grants[-1] == "authorization_code"
+    assert client._is_token_valid("refresh_token")
+
+    # When the renewal fails, the callers that waited for it don't go
+    # on with the expired token
+    client._tokens["expires_on"] = 0
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise BrunataConnectionError("down")
+
+    with patch.object(client, "_update_tokens", fail):
+        results = await asyncio.gather(
+            *(client._get_tokens() for _ in range(3)), return_exceptions=True
+        )
+    assert isinstance(results[0], BrunataConnectionError)
+    assert results[1:] == [False, False]
+
+METERS_PATH = "/consumer/superallocationunits"
+
+
+def _meter_requests(server):
+    return sum(1 for _, path in server.requests if path.endswith(METERS_PATH))
+
+
+@pytest.mark.anyio
+async def test_api_wrapper_retries_transient_errors(fake_brunata, brunata_client):
+    """Test that GET requests survive transient 5xx errors and timeouts."""
+    server = await fake_brunata(constants={"TIMEOUT": 0.2, "BACKOFF_BASE": 0.001})
+    client = brunata_client()
+    server.inject(METERS_PATH, 503, "timeout", 500)
+    await client.fetch_meters()
+
+    assert _meter_requests(server) == 4
+    assert client.get_topology()
+    stats = client.metrics.snapshot()["superallocationunits"]
+    assert stats["requests"] == 4
+    assert stats["retries"] == 3
+    assert stats["errors"] == 3
+    assert stats["statuses"] == {"503": 1, "timeout": 1, "500": 1, "200": 1}
+    assert stats["bytes"] > 0
+    assert sum(stats["latency_histogram"].values()) == 4
+    # The login requests are recorded from the trace config of its session
+    assert client.metrics.snapshot()["token"]["requests"] == 1
+
+@pytest.mark.anyio
+async def test_api_wrapper_honors_retry_after(fake_brunata, brunata_client):
+    """Test that a Retry-After header replaces the backoff delay."""
+    server = await fake_brunata(constants={"BACKOFF_BASE": 30, "BACKOFF_MAX": 60})
+    client = brunata_client()
+    server.inject(METERS_PATH, (429, "0"))
+    # The 30 second backoff would exceed the timeout
+    await asyncio.wait_for(client.fetch_meters(), 2)
+
+    # A Retry-After beyond the backoff cap is not waited for, but
+    # holds back further requests
+    server.inject(METERS_PATH, (503, "3600"))
+    with pytest.raises(BrunataConnectionError):
+        await asyncio.wait_for(client.fetch_meters(), 2)
+    with pytest.raises(BrunataCircuitOpenError):
+        await client.fetch_meters()
+
+    assert _meter_requests(server) == 3
+
+@pytest.mark.anyio
+async def test_circuit_breaker_opens_after_failures(fake_brunata, brunata_client):
+    """Test that requests stop once the API keeps failing."""
+    server = await fake_brunata(constants={"BACKOFF_BASE": 0.001, "RETRIES": 1})
+    client = brunata_client()
+    client._circuit = CircuitBreaker(threshold=2, reset=60)
+    server.inject(METERS_PATH, *[500] * 10)
+    for _ in range(2):
+        with pytest.raises(BrunataConnectionError):
+            await client.fetch_meters()
+    assert _meter_requests(server) == 4
+
+    with pytest.raises(BrunataCircuitOpenError):
+        await client.fetch_meters()
+    assert _meter_requests(server) == 4
+
+@pytest.mark.anyio
+async def test_api_wrapper_does_not_retry_client_errors(fake_brunata, brunata_client):
+    """Test that a 4xx error is raised straight away."""
+    server = await fake_brunata()
+    client = brunata_client()
+    server.inject(METERS_PATH, 404)
+    with pytest.raises(BrunataResponseError) as error:
+        await client.fetch_meters()
+
+    assert error.value.status == 404
+    assert _meter_requests(server) == 1
+
+@pytest.mark.anyio
+async def test_fetch_consumption_keeps_values_of_failed_units(fake_brunata, brunata_client):
+    """Test that a failing unit keeps its last values while the others update."""
+    server = await fake_brunata(units={2: ["A", "B"]})
+    client = brunata_client(max_concurrency=1)
+    await client.fetch_meters()
+    await client.fetch_consumption(Consumption.WATER, Interval.DAY)
+    before = dict(client.get_meter_updated(Interval.DAY))
+
+    server.inject("/consumer/consumption", 404)
+    with pytest.raises(BrunataResponseError):
+        await client.fetch_consumption(Consumption.WATER, Interval.DAY)
+
+    meters = client.get_consumption()["Water"]["Meters"]["Day"]
+    assert meters["meter-A"]["Values"] and meters["meter-B"]["Values"]
+    after = client.get_meter_updated(Interval.DAY)
+    # Units are fetched in order with one request at a time, so A failed
+    assert after["meter-A"] == before["meter-A"]
+    assert after["meter-B"] > before["meter-B"]
+    info = client.get_meter_info(Consumption.WATER, Interval.DAY)
+    assert set(info) == {"meter-A", "meter-B"}
+    assert info["meter-A"]["updated"] == before["meter-A"]
+
+@pytest.mark.anyio
+async def test_fetch_month_only_asks_uncovered_months(fake_brunata, brunata_client):
+    """Test that monthly values come from the daily history, the API fills the rest once."""
+    today = datetime.now()
+    server = await fake_brunata(units={2: ["K"]})
+    client = brunata_client()
+    await client.fetch_meters()
+    await client.fetch_consumption(Consumption.WATER, Interval.DAY)
+    await client.fetch_consumption(Consumption.WATER, Interval.MONTH)
+    await client.fetch_consumption(Consumption.WATER, Interval.MONTH)
+
+    queries = server.consumption_queries
+    # The daily fetch, then a single monthly one for the months before this one
+    assert [query["interval"] for query in queries] == ["D"] + ["M"] * (today.month > 1)
+    if today.month > 1:
+        assert queries[1]["startdate"].startswith(f"{today.year}-01-01")
+        assert queries[1]["enddate"].startswith(f"{today.year}-{today.month - 1:02d}")
+    months = client.get_consumption()["Water"]["Meters"]["Month"]["meter-K"]["Values"]
+    # The fake server answers the day of the month for each day
+    assert months[today.strftime("%Y-%m")] == sum(range(1, today.day + 1))
+    assert len(months) == today.month
+    assert client.metrics.cache_stats()["month"]["hits"] == (1 if today.month > 1 else 2)
+
+@pytest.mark.anyio
+async def test_conditional_requests_serve_not_modified_from_last_body(fake_brunata, brunata_client):
+    """Test that validators are sent again and a 304 reuses the body without a merge."""
+    server = await fake_brunata(units={2: ["K"]}, etags=True)
+    client = brunata_client()
+    await client.fetch_meters()
+    await client.fetch_consumption(Consumption.WATER, Interval.DAY)
+    received = server.bytes_sent
+    before = client.get_meter_updated(Interval.DAY)["meter-K"]
+    with patch.object(decode, "loads", side_effect=AssertionError("decoded")):
+        await client.fetch_consumption(Consumption.WATER, Interval.DAY)
+
+    assert server.bytes_sent == received
+    assert client.get_meter_updated(Interval.DAY)["meter-K"] > before
+    values = client.get_consumption()["Water"]["Meters"]["Day"]["meter-K"]["Values"]
+    assert len(values) > 0
+    metrics = client.metrics
+    assert metrics.snapshot()["consumption"]["statuses"] == {"200": 1, "304": 1}
+    assert metrics.totals()["not_modified"] == 1
+    caches = metrics.cache_stats()
+    assert caches["not_modified"] == {"hits": 1, "misses": 0, "hit_rate": 1.0}
+    assert caches["payload"]["hits"] == 1
+
+@pytest.mark.anyio
+async def test_unchanged_payload_without_validators_skips_merge(fake_brunata, brunata_client):
+    """Test that without validators an identical payload is still not merged again."""
+    await fake_brunata(units={2: ["K"]})
+    client = brunata_client()
+    await client.fetch_meters()
+    await client.fetch_consumption(Consumption.WATER, Interval.DAY)
+    with patch.object(client._store, "merge", side_effect=AssertionError("merged")):
+        await client.fetch_consumption(Consumption.WATER, Interval.DAY)
+
+    assert "not_modified" not in client.metrics.cache_stats()
+    assert client.metrics.cache_stats()["payload"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+@pytest.mark.anyio
+async def test_unauthorized_renews_token(fake_brunata, brunata_client):
+    """Test that a token rejected with a 401 is renewed before the next request."""
+    server = await fake_brunata()
+    client = brunata_client()
+    await client.fetch_meters()
+    grants = len(server.grants)
+
+    server.inject("/consumer/consumption", 401)
+    with pytest.raises(BrunataAuthError):
+        await client.fetch_consumption(Consumption.WATER, Interval.DAY)
+    assert "access_token" not in client.get_token_data()
+    assert "Authorization" not in client._headers
+
+    await client.fetch_consumption(Consumption.WATER, Interval.DAY)
+    assert len(server.grants) == grants + 1
+    assert "access_token" in client.get_token_data()
+
+@pytest.mark.anyio
+async def test_window_fetch_keeps_sync_state(fake_brunata, brunata_client):
+    """Test that fetching history leaves the state of the incremental sync alone."""
+    await fake_brunata()
+    client = brunata_client()
+    await client.fetch_meters()
+    await client.fetch_consumption(Consumption.WATER, Interval.DAY, incremental=True)
+    unit_meters = {unit: list(meters) for unit, meters in client._unit_meters[Interval.DAY].items()}
+    hashes = dict(client._payload_hashes)
+
+    await client.fetch_consumption(
+        Consumption.WATER, Interval.DAY, window=month_window("2020-01")
+    )
+    assert client._unit_meters[Interval.DAY] == unit_meters
+    assert client._payload_hashes == hashes
+
+    # A month can't be fetched without tokens, it is not silently skipped
+    with patch.object(client, "_get_tokens", AsyncMock(return_value=False)):
+        with pytest.raises(BrunataAuthError):
+            await client.fetch_consumption(
+                Consumption.WATER, Interval.DAY, window=month_window("2020-02")
+            )
+
+def test_consumption_lines_same_with_json_fallback():
+    """Test that the stdlib fallback decodes payloads like orjson."""
+    body = json.dumps({"consumptionLines": [
+        {
+            "meter": {"meterId": "m1", "placement": "Kitchen"},
+            "consumptionValues": [
+                {"fromDate": "2024-01-01T00:00:00.000Z", "consumption": 1.5},
+                {"fromDate": "2024-01-02T00:00:00.000Z", "consumption": None},
+                {"fromDate": "2024-01-03T00:00:00.000Z", "consumption": 0},
+            ],
+        },
+        {"meter": {}, "consumptionValues": None},
+    ]}).encode()
+
+    lines = decode.consumption_lines(body, 10)
+    with patch.object(decode, "loads", json.loads):
+        assert decode.consumption_lines(body, 10) == lines
+    assert lines == [
+        ("m1", "Kitchen", [("2024-01-01", 1.5), ("2024-01-03", 0)]),
+        (1, 1, []),
+    ]
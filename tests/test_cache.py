@@ -0,0 +1,92 @@
+"""Tests for the response cache."""
+from datetime import datetime
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Mock generic HA modules
+mock_hass = SimpleNamespace()
+mock_hass.helpers = SimpleNamespace()
+mock_hass.helpers.aiohttp_client = SimpleNamespace()
+mock_hass.helpers.aiohttp_client.async_get_clientsession = MagicMock()
+mock_hass.helpers.storage = SimpleNamespace(Store=MagicMock)
+mock_hass.helpers.event = SimpleNamespace(async_call_later=MagicMock())
+
+# Patch sys.modules BEFORE import
+with patch.dict(sys.modules, {
+    "homeassistant": mock_hass,
+    "homeassistant.helpers": mock_hass.helpers,
+    "homeassistant.helpers.aiohttp_client": mock_hass.helpers.aiohttp_client,
+    "homeassistant.helpers.storage": mock_hass.helpers.storage,
+    "homeassistant.helpers.event": mock_hass.helpers.event,
+}):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from custom_components.maxx_hacs_testing.brunata import cache as brunata_cache
+    from custom_components.maxx_hacs_testing.brunata.api import (
+        BrunataOnlineApiClient,
+        Consumption,
+        Interval,
+        month_window,
+    )
+    from custom_components.maxx_hacs_testing.brunata.cache import ResponseCache, is_closed
+
+def test_response_cache_closed_open_and_lru():
+    """Test that closed windows are kept, open ones expire and the LRU is bounded."""
+    now = datetime(2026, 3, 15)
+    assert is_closed("2026-02-28T23:59:59.999Z", now)
+    assert not is_closed("2026-03-31T23:59:59.999Z", now)
+    # The previous month is only final a few days into this one
+    assert not is_closed("2026-02-28T23:59:59.999Z", datetime(2026, 3, 1))
+    assert not is_closed("2026-02-28T23:59:59.999Z", datetime(2026, 3, 3))
+    assert is_closed("2026-02-28T23:59:59.999Z", datetime(2026, 3, 4))
+
+    closed = ("K", "D", "2020-01-01T00:00:00.000Z", "2020-01-31T23:59:59.999Z")
+    open_ = ("K", "D", "2099-01-01T00:00:00.000Z", "2099-01-31T23:59:59.999Z")
+    cache = ResponseCache(max_bytes=10, ttl=60)
+    with patch.object(brunata_cache, "time") as clock:
+        clock.monotonic.return_value = 1000
+        cache.put(closed, b"abcd")
+        cache.put(open_, b"efgh")
+        assert cache.get(open_) == b"efgh"
+        clock.monotonic.return_value = 1061
+        assert cache.get(open_) is None
+        assert cache.get(closed) == b"abcd"
+        assert (len(cache), cache.size) == (1, 4)
+
+        # The least recently used response goes first when the cache is full
+        other = ("M", "D", *closed[2:])
+        cache.put(other, b"ijkl")
+        cache.get(closed)
+        cache.put(("N", "D", *closed[2:]), b"mnop")
+        assert cache.get(other) is None
+        assert cache.get(closed) == b"abcd"
+        assert cache.size <= 10
+
+    restored = ResponseCache()
+    restored.restore_state(cache.get_state())
+    assert restored.get(closed) == b"abcd"
+    assert restored.generation == 0
+
+@pytest.mark.anyio
+async def test_response_cache_shared_between_clients(fake_brunata, brunata_client):
+    """Test that a finished month is fetched once for all clients sharing a cache."""
+    cache = ResponseCache()
+    server = await fake_brunata(units={2: ["K"]})
+    clients = [brunata_client(cache=cache) for _ in range(2)]
+    for client in clients:
+        await client.fetch_meters()
+        await client.fetch_consumption(
+            Consumption.WATER, Interval.DAY, window=month_window("2025-01")
+        )
+        # The open window of this month is reused within the TTL
+        await client.fetch_consumption(Consumption.WATER, Interval.DAY)
+
+    assert len(server.consumption_queries) == 2
+    for client in clients:
+        values = client.get_consumption()["Water"]["Meters"]["Day"]["meter-K"]["Values"]
+        assert values["2025-01-31"] == 31.0
+    assert clients[1].metrics.cache_stats()["response"]["hits"] == 2
+    assert [entry[2][:7] for entry in cache.get_state()] == ["2025-01"]
@@ -0,0 +1,98 @@
+"""Test the registry of the API clients of each account."""
+import os
+import sys
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+
+# Import inside a patch so the package is imported afresh by the other tests
+with patch.dict(sys.modules):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from custom_components.maxx_hacs_testing.client_registry import (
+        MaxxHacsTestingClientRegistry,
+    )
+
+
+@pytest.mark.anyio
+async def test_entries_share_client():
+    """Test that the entries of an account share a client, closed with the last one."""
+    registry = MaxxHacsTestingClientRegistry()
+    first = await registry.async_acquire("entry1", "user", "pass")
+    second = await registry.async_acquire(
+        "entry2", "user", "pass", topology_ttl=timedelta(hours=6)
+    )
+    other = await registry.async_acquire("entry3", "other", "pass")
+
+    assert first is second
+    assert other is not first
+    assert first.topology_ttl == timedelta(hours=6)
+    assert len(registry) == 2
+
+    await registry.async_release("entry1")
+    assert not first._session.closed
+    await registry.async_release("entry2")
+    assert first._session.closed
+    assert await registry.async_acquire("entry1", "user", "pass") is not first
+
+    await registry.async_release("entry1")
+    await registry.async_release("entry3")
+    # Releasing what is not held does nothing
+    await registry.async_release("entry3")
+    assert len(registry) == 0
+
+
+@pytest.mark.anyio
+async def test_new_password_gets_new_client():
+    """Test that a changed password does not reuse the client of the old one."""
+    registry = MaxxHacsTestingClientRegistry()
+    old = await registry.async_acquire("entry", "user", "old")
+    new = await registry.async_acquire("flow", "user", "new")
+
+    assert new is not old
+    assert not old._session.closed
+    # The entry moves over to the new client when it is set up again
+    assert await registry.async_acquire("entry", "user", "new") is new
+    assert old._session.closed
+
+    await registry.async_release("flow")
+    assert not new._session.closed
+    await registry.async_release("entry")
+    assert new._session.closed
+    assert len(registry) == 0
+
+
+@pytest.mark.anyio
+async def test_wrong_password_keeps_client():
+    """Test that a flow trying a wrong password does not replace the client of an entry."""
+    registry = MaxxHacsTestingClientRegistry()
+    client = await registry.async_acquire("entry1", "user", "pass")
+    wrong = await registry.async_acquire("flow", "user", "wrong")
+    await registry.async_release("flow")
+
+    assert wrong._session.closed
+    assert await registry.async_acquire("entry2", "user", "pass") is client
+
+    await registry.async_release("entry1")
+    await registry.async_release("entry2")
+    assert client._session.closed
+    assert len(registry) == 0
+
+
+@pytest.mark.anyio
+async def test_close_closes_every_session():
+    """Test that the sessions of all held clients are closed when Home Assistant stops."""
+    registry = MaxxHacsTestingClientRegistry()
+    first = await registry.async_acquire("entry1", "user", "pass")
+    await registry.async_acquire("entry2", "user", "pass")
+    old = await registry.async_acquire("entry3", "user", "old")
+    other = await registry.async_acquire("flow", "other", "pass")
+
+    await registry.async_close()
+
+    assert first._session.closed
+    assert old._session.closed
+    assert other._session.closed
+    assert len(registry) == 0
+    # The entries unloaded afterwards have nothing left to release
+    await registry.async_release("entry1")
@@ -1,7 +1,7 @@
 """Test the config flow."""
 import sys
 import pytest
-from unittest.mock import MagicMock, AsyncMock, patch
+from unittest.mock import ANY, MagicMock, AsyncMock, patch
 from types import SimpleNamespace
 import os
 import importlib
@@ -12,12 +12,31 @@ class MockConst:
     CONF_PASSWORD = "password"
     class Platform:
         SENSOR = "sensor"
+    EVENT_HOMEASSISTANT_CLOSE = "homeassistant_close"
     DOMAIN = "maxx_hacs_testing"
+    CONF_TOPOLOGY_TTL = "topology_ttl"
+    DEFAULT_TOPOLOGY_TTL = 24
+    STORAGE_VERSION = 1
+    STORAGE_SAVE_DELAY = 10
+    DATA_RESPONSE_CACHE = "maxx_hacs_testing_response_cache"
+    DATA_CLIENTS = "maxx_hacs_testing_clients"
+    SERVICE_REDISCOVER_METERS = "rediscover_meters"
+    PARTIAL_RETRY_DELAY = 120
+    CONF_BACKFILL_START = "backfill_start"
+    BACKFILL_CONCURRENCY = 2
+    CONF_MIN_INTERVAL = "min_interval"
+    DEFAULT_MIN_INTERVAL = 20
+    CONF_MAX_INTERVAL = "max_interval"
+    DEFAULT_MAX_INTERVAL = 360
+    CONF_POLL_HOURS = "poll_hours"
+    CONF_DIAGNOSTIC_SENSORS = "diagnostic_sensors"
+    TYPE_UNITS = {"Heating": "kWh", "Water": "L", "Electricity": "kWh", "Other": "kWh"}
 
 class MockConfigFlowParent:
     def __init__(self):
         self.hass = None
         self.context = {}
+        self.flow_id = "flow"
     
     def __init_subclass__(cls, **kwargs):
         pass
@@ -36,6 +55,7 @@ class MockConfigFlowParent:
 mock_brunata_client_instance = MagicMock()
 mock_brunata_client_instance._get_tokens = AsyncMock()
 mock_session_instance = MagicMock()
+mock_session_instance.close = AsyncMock()
 
 @pytest.fixture(name="mock_modules", autouse=True)
 def mock_modules_fixture():
@@ -44,8 +64,13 @@ def mock_modules_fixture():
     mock_config_entries_module = SimpleNamespace()
     mock_config_entries_module.ConfigFlow = MockConfigFlowParent
     mock_config_entries_module.ConfigEntry = MagicMock
+    mock_config_entries_module.OptionsFlow = MockConfigFlowParent
     mock_core_module = SimpleNamespace()
     mock_core_module.HomeAssistant = MagicMock
+    mock_core_module.ServiceCall = MagicMock
+    mock_core_module.Event = MagicMock
+    mock_core_module.CALLBACK_TYPE = MagicMock
+    mock_core_module.callback = lambda f: f
     mock_data_entry_flow_module = SimpleNamespace()
     mock_data_entry_flow_module.FlowResult = dict
     mock_ha_const_module = MockConst()
@@ -63,6 +88,10 @@ def mock_modules_fixture():
     mock_voluptuous_module = SimpleNamespace()
     mock_voluptuous_module.Schema = MockSchema
     mock_voluptuous_module.Required = MockRequired
+    mock_voluptuous_module.Optional = MockRequired
+    mock_voluptuous_module.All = lambda *validators: validators
+    mock_voluptuous_module.Coerce = lambda type_: type_
+    mock_voluptuous_module.Range = lambda **kwargs: kwargs
     
     # Link package submodules
     mock_hass_module.config_entries = mock_config_entries_module
@@ -73,13 +102,21 @@ def mock_modules_fixture():
     mock_helpers_module = SimpleNamespace()
     mock_helpers_module.aiohttp_client = SimpleNamespace()
     mock_helpers_module.aiohttp_client.async_get_clientsession = MagicMock(return_value=mock_session_instance)
+    mock_helpers_module.storage = SimpleNamespace(
+        Store=MagicMock(return_value=MagicMock(async_load=AsyncMock(return_value=None)))
+    )
+    mock_helpers_module.event = SimpleNamespace(async_call_later=MagicMock())
 
     # External libs
     mock_aiohttp_module = SimpleNamespace()
     mock_aiohttp_module.ClientSession = MagicMock(return_value=mock_session_instance)
+    mock_aiohttp_module.TCPConnector = MagicMock()
     
     mock_brunata_api_module = SimpleNamespace()
     mock_brunata_api_module.BrunataOnlineApiClient = MagicMock(return_value=mock_brunata_client_instance)
+    mock_brunata_api_module.Consumption = SimpleNamespace(WATER="Water", ELECTRICITY="Electricity", HEATING="Heating", OTHER="Other")
+    mock_brunata_api_module.Interval = SimpleNamespace(DAY="Day")
+    mock_brunata_api_module.MAX_CONCURRENT_REQUESTS = 4
 
     # Patch sys.modules
     with patch.dict(sys.modules, {
@@ -89,6 +126,8 @@ def mock_modules_fixture():
         "homeassistant.data_entry_flow": mock_data_entry_flow_module,
         "homeassistant.const": mock_ha_const_module,
         "homeassistant.helpers.aiohttp_client": mock_helpers_module.aiohttp_client,
+        "homeassistant.helpers.storage": mock_helpers_module.storage,
+        "homeassistant.helpers.event": mock_helpers_module.event,
         "voluptuous": mock_voluptuous_module,
         "custom_components.maxx_hacs_testing.const": mock_local_const_module,
         "aiohttp": mock_aiohttp_module,
@@ -111,6 +150,7 @@ def mock_modules_fixture():
 def mock_hass_fixture():
     m = MagicMock()
     m.config_entries.async_get_entry = MagicMock()
+    m.data = {}
     return m
 
 @pytest.mark.anyio
@@ -136,9 +176,37 @@ async def test_form_valid_auth(hass, mock_modules):
     assert result["data"] == {CONF_USERNAME: "u", CONF_PASSWORD: "p"}
     
     # Verify interaction
-    mock_brunata_api_module.BrunataOnlineApiClient.assert_called_with("u", "p", mock_session_instance)
+    mock_brunata_api_module.BrunataOnlineApiClient.assert_called_with(
+        "u", "p", mock_session_instance, cache=ANY
+    )
     mock_brunata_client_instance._get_tokens.assert_called() # loose check
 
+@pytest.mark.anyio
+async def test_form_hands_client_to_entry(hass, mock_modules):
+    """Test that the entry set up from the flow reuses the client it logged in with."""
+    config_flow, DOMAIN, CONF_USERNAME, CONF_PASSWORD, mock_brunata_api_module = mock_modules
+    flow = config_flow.ConfigFlow()
+    flow.hass = hass
+    mock_brunata_client_instance._get_tokens.return_value = True
+    mock_brunata_api_module.BrunataOnlineApiClient.reset_mock()
+    mock_session_instance.close.reset_mock()
+
+    await flow.async_step_user({CONF_USERNAME: "u", CONF_PASSWORD: "p"})
+    registry = await config_flow.async_get_client_registry(hass)
+    client = await registry.async_acquire("entry", "u", "p")
+    # The sessions are closed when Home Assistant stops without unloading
+    hass.bus.async_listen_once.assert_called_once_with(
+        MockConst.EVENT_HOMEASSISTANT_CLOSE, registry.async_close
+    )
+    await registry.async_release(flow.flow_id)
+
+    assert mock_brunata_api_module.BrunataOnlineApiClient.call_count == 1
+    assert client._brunata_client is mock_brunata_client_instance
+    mock_session_instance.close.assert_not_called()
+    await registry.async_release("entry")
+    mock_session_instance.close.assert_awaited_once()
+    assert len(registry) == 0
+
 @pytest.mark.anyio
 async def test_form_invalid_auth(hass, mock_modules):
     config_flow, DOMAIN, CONF_USERNAME, CONF_PASSWORD, _ = mock_modules
@@ -150,6 +218,8 @@ async def test_form_invalid_auth(hass, mock_modules):
     result = await flow.async_step_user({CONF_USERNAME: "u", CONF_PASSWORD: "p"})
     assert result["type"] == "form"
     assert result["errors"] == {"base": "invalid_auth"}
+    # The client of credentials that do not work is not kept
+    assert len(hass.data[MockConst.DATA_CLIENTS]) == 0
 
 @pytest.mark.anyio
 async def test_reconfigure(hass, mock_modules):
@@ -168,3 +238,18 @@ async def test_reconfigure(hass, mock_modules):
     mock_brunata_client_instance._get_tokens.return_value = True
     result = await flow.async_step_reconfigure({CONF_USERNAME: "new", CONF_PASSWORD: "new"})
     assert result["type"] == "abort"
+
+@pytest.mark.anyio
+async def test_form_cannot_connect(hass, mock_modules):
+    config_flow, DOMAIN, CONF_USERNAME, CONF_PASSWORD, _ = mock_modules
+    flow = config_flow.ConfigFlow()
+    flow.hass = hass
+
+    with patch.object(
+        mock_brunata_client_instance,
+        "_get_tokens",
+        AsyncMock(side_effect=config_flow.BrunataError("down")),
+    ):
+        result = await flow.async_step_user({CONF_USERNAME: "u", CONF_PASSWORD: "p"})
+    assert result["type"] == "form"
+    assert result["errors"] == {"base": "cannot_connect"}
@@ -0,0 +1,45 @@
+"""Test the diagnostics."""
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+
+def _redact(data, to_redact):
+    if isinstance(data, dict):
+        return {
+            key: "**REDACTED**" if key in to_redact else _redact(value, to_redact)
+            for key, value in data.items()
+        }
+    return data
+
+
+with patch.dict(sys.modules, {
+    "homeassistant.components.diagnostics": SimpleNamespace(async_redact_data=_redact),
+}):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from custom_components.maxx_hacs_testing import diagnostics
+
+
+@pytest.mark.anyio
+async def test_config_entry_diagnostics():
+    """Test that credentials are redacted and the client state is included."""
+    coordinator = MagicMock(last_update_success=True, update_interval="0:20:00")
+    coordinator.client.get_diagnostics = MagicMock(
+        return_value={"tokens": {"expires_on": 100}, "traces": []}
+    )
+    hass = MagicMock()
+    hass.data = {diagnostics.DOMAIN: {"entry": coordinator}}
+    entry = MagicMock(
+        entry_id="entry",
+        data={"username": "user", "password": "secret"},
+        options={"topology_ttl": 24},
+    )
+
+    result = await diagnostics.async_get_config_entry_diagnostics(hass, entry)
+
+    assert result["entry"]["data"] == {"username": "**REDACTED**", "password": "**REDACTED**"}
+    assert result["entry"]["options"] == {"topology_ttl": 24}
+    assert result["client"] == {"tokens": {"expires_on": 100}, "traces": []}
@@ -0,0 +1,78 @@
+"""Test the adaptive polling schedule."""
+import os
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+# Import inside a patch so the package is imported afresh by the other tests
+with patch.dict(sys.modules):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from custom_components.maxx_hacs_testing.schedule import (
+        AdaptivePollSchedule,
+        hours_between,
+        parse_hours,
+    )
+
+
+def _simulate(schedule, days, publish_at):
+    """Poll for some days with new values published daily, return polls and lags."""
+    now = datetime(2024, 1, 1)
+    end = now + timedelta(days=days)
+    published = None
+    polls, lags = 0, []
+    while now < end:
+        today_publish = now.replace(hour=publish_at.hour, minute=publish_at.minute)
+        changed = now >= today_publish and published != now.date()
+        if changed:
+            published = now.date()
+            lags.append(now - today_publish)
+        schedule.record(now, changed)
+        polls += 1
+        now += schedule.next_interval(now)
+    return polls, lags
+
+
+def test_schedule_learns_publication_hour():
+    """Test that polling gets sparse away from the hour values show up."""
+    schedule = AdaptivePollSchedule(timedelta(minutes=20), timedelta(hours=6))
+    _simulate(schedule, 7, datetime(2024, 1, 1, 6, 10))
+    assert 6 in schedule.busy_hours()
+
+    polls, lags = _simulate(schedule, 7, datetime(2024, 1, 1, 6, 10))
+    # 48 polls a day at a fixed 30 minutes
+    assert polls / 7 < 12
+    assert max(lags) <= timedelta(minutes=20)
+
+
+def test_schedule_bounds_and_fixed_hours():
+    """Test the interval bounds and the manually set poll hours."""
+    schedule = AdaptivePollSchedule(
+        timedelta(minutes=20), timedelta(hours=2), poll_hours={6, 18}
+    )
+    assert schedule.next_interval(datetime(2024, 1, 1, 6, 30)) == timedelta(minutes=20)
+    assert schedule.next_interval(datetime(2024, 1, 1, 17, 50)) == timedelta(minutes=20)
+    assert schedule.next_interval(datetime(2024, 1, 1, 17, 30)) == timedelta(minutes=30)
+    assert schedule.next_interval(datetime(2024, 1, 1, 8, 0)) == timedelta(hours=2)
+
+    learning = AdaptivePollSchedule(timedelta(minutes=20), timedelta(hours=2))
+    assert learning.next_interval(datetime(2024, 1, 1, 8, 0)) == timedelta(minutes=30)
+
+
+def test_schedule_state_round_trip():
+    schedule = AdaptivePollSchedule(timedelta(minutes=20), timedelta(hours=6))
+    schedule.record(datetime(2024, 1, 1, 5, 50), False)
+    schedule.record(datetime(2024, 1, 1, 6, 10), True)
+    restored = AdaptivePollSchedule(timedelta(minutes=20), timedelta(hours=6))
+    restored.restore_state(schedule.get_state())
+    assert restored.busy_hours() == schedule.busy_hours() == {5, 6}
+    assert restored.observations == 1
+
+
+def test_parse_hours():
+    assert hours_between(datetime(2024, 1, 1, 23, 30), datetime(2024, 1, 2, 1, 0)) == [23, 0, 1]
+    assert parse_hours("6, 18,") == {6, 18}
+    assert parse_hours("") == set()
+    with pytest.raises(ValueError):
+        parse_hours("24")
@@ -4,7 +4,6 @@ import pytest
 from unittest.mock import MagicMock, AsyncMock, patch
 from types import SimpleNamespace
 import os
-import datetime
 
 # Define simple mocks
 class MockConst:
@@ -13,8 +12,29 @@ class MockConst:
     CONF_PASSWORD = "password"
     UnitOfEnergy = SimpleNamespace(KILO_WATT_HOUR="kWh")
     UnitOfVolume = SimpleNamespace(LITERS="L")
+    UnitOfTime = SimpleNamespace(SECONDS="s")
+    UnitOfInformation = SimpleNamespace(BYTES="B")
+    EntityCategory = SimpleNamespace(DIAGNOSTIC="diagnostic")
+    CONF_TOPOLOGY_TTL = "topology_ttl"
+    DEFAULT_TOPOLOGY_TTL = 24
+    STORAGE_VERSION = 1
+    STORAGE_SAVE_DELAY = 10
+    DATA_RESPONSE_CACHE = "maxx_hacs_testing_response_cache"
+    DATA_CLIENTS = "maxx_hacs_testing_clients"
+    SERVICE_REDISCOVER_METERS = "rediscover_meters"
+    PARTIAL_RETRY_DELAY = 120
+    CONF_BACKFILL_START = "backfill_start"
+    BACKFILL_CONCURRENCY = 2
+    CONF_MIN_INTERVAL = "min_interval"
+    DEFAULT_MIN_INTERVAL = 20
+    CONF_MAX_INTERVAL = "max_interval"
+    DEFAULT_MAX_INTERVAL = 360
+    CONF_POLL_HOURS = "poll_hours"
+    CONF_DIAGNOSTIC_SENSORS = "diagnostic_sensors"
+    TYPE_UNITS = {"Heating": "kWh", "Water": "L", "Electricity": "kWh", "Other": "kWh"}
     class Platform:
         SENSOR = "sensor"
+    EVENT_HOMEASSISTANT_CLOSE = "homeassistant_close"
 
 class MockEntity:
     def __init__(self, *args, **kwargs):
@@ -29,6 +49,10 @@ class MockCoordinatorEntity(MockEntity):
     def __init__(self, coordinator):
         super().__init__()
         self.coordinator = coordinator
+        self.async_write_ha_state = MagicMock()
+    @property
+    def available(self):
+        return self.coordinator.last_update_success
 
 class MockSensorEntity(MockEntity):
     pass
@@ -51,6 +75,9 @@ def mock_modules_fixture():
     mock_core_module = SimpleNamespace()
     mock_core_module.HomeAssistant = MagicMock
     mock_core_module.callback = lambda f: f
+    mock_core_module.ServiceCall = MagicMock
+    mock_core_module.Event = MagicMock
+    mock_core_module.CALLBACK_TYPE = MagicMock
     
     mock_helpers_module = SimpleNamespace()
     mock_helpers_module.aiohttp_client = SimpleNamespace()
@@ -59,10 +86,16 @@ def mock_modules_fixture():
     # No restore_state needed anymore
     mock_helpers_module.restore_state = SimpleNamespace() 
     
+    mock_helpers_module.storage = SimpleNamespace(Store=MagicMock)
+    mock_helpers_module.event = SimpleNamespace(async_call_later=MagicMock())
+
     mock_helpers_module.entity = SimpleNamespace()
     mock_helpers_module.entity.Entity = MockEntity
     mock_helpers_module.entity_platform = SimpleNamespace()
     mock_helpers_module.entity_platform.AddEntitiesCallback = MagicMock()
+    mock_helpers_module.entity_registry = SimpleNamespace(
+        RegistryEntry=MagicMock, async_migrate_entries=AsyncMock()
+    )
     
     mock_update_coordinator_module = SimpleNamespace()
     mock_update_coordinator_module.DataUpdateCoordinator = MockCoordinator
@@ -73,8 +106,12 @@ def mock_modules_fixture():
     mock_sensor_module.SensorEntity = MockSensorEntity
     mock_sensor_module.SensorDeviceClass = SimpleNamespace()
     mock_sensor_module.SensorDeviceClass.ENERGY = "energy"
+    mock_sensor_module.SensorDeviceClass.WATER = "water"
+    mock_sensor_module.SensorDeviceClass.DURATION = "duration"
+    mock_sensor_module.SensorDeviceClass.DATA_SIZE = "data_size"
     mock_sensor_module.SensorStateClass = SimpleNamespace()
     mock_sensor_module.SensorStateClass.TOTAL_INCREASING = "total_increasing"
+    mock_sensor_module.SensorStateClass.MEASUREMENT = "measurement"
     
     mock_ha_const_module = MockConst()
     mock_local_const_module = MockConst()
@@ -85,6 +122,8 @@ def mock_modules_fixture():
     
     mock_brunata_api_module = SimpleNamespace()
     mock_brunata_api_module.BrunataOnlineApiClient = MagicMock(return_value=mock_brunata_client_instance)
+    mock_brunata_api_module.Consumption = SimpleNamespace(WATER="Water", ELECTRICITY="Electricity", HEATING="Heating", OTHER="Other")
+    mock_brunata_api_module.Interval = SimpleNamespace(DAY="Day")
 
     # Patch sys.modules
     with patch.dict(sys.modules, {
@@ -93,8 +132,11 @@ def mock_modules_fixture():
         "homeassistant.const": mock_ha_const_module,
         "homeassistant.helpers": mock_helpers_module,
         "homeassistant.helpers.restore_state": mock_helpers_module.restore_state,
+        "homeassistant.helpers.storage": mock_helpers_module.storage,
+        "homeassistant.helpers.event": mock_helpers_module.event,
         "homeassistant.helpers.entity": mock_helpers_module.entity,
         "homeassistant.helpers.entity_platform": mock_helpers_module.entity_platform,
+        "homeassistant.helpers.entity_registry": mock_helpers_module.entity_registry,
         "homeassistant.helpers.update_coordinator": mock_update_coordinator_module,
         "homeassistant.helpers.aiohttp_client": mock_helpers_module.aiohttp_client,
         "homeassistant.components.sensor": mock_sensor_module,
@@ -115,14 +157,147 @@ def mock_modules_fixture():
 @pytest.fixture(name="coordinator")
 def mock_coordinator():
     coord = MockCoordinator(None, None, "test")
-    # timestamp still in data but unused by sensor
-    coord.data = {"electricity_usage": 10.0, "timestamp": datetime.datetime.now().isoformat()}
+    coord.data = {"totals": {"Other": {"value": 10.0, "date": "2024-01-02"}}}
     return coord
 
 @pytest.mark.anyio
 async def test_sensor_params(mock_modules, coordinator):
     sensor_module = mock_modules
-    sensor = sensor_module.MaxxHacsTestingSensor(
-        coordinator, "electricity_usage", "Electricity", "energy", "kWh"
+    sensor = sensor_module.MaxxHacsTestingTotalSensor(
+        coordinator, MagicMock(entry_id="entry"), "Other"
     )
     assert sensor.native_value == 10.0
+    assert sensor._attr_unique_id == "maxx_hacs_testing_entry_Other"
+
+
+def _meters_data(meters):
+    return {
+        "totals": {
+            "Water": {
+                "value": sum(value for _, value in meters.values()),
+                "date": "2024-01-02",
+                "updated": "2024-01-02T00:00:00+00:00",
+                "stale": False,
+            }
+        },
+        "meters": {
+            "Water": {
+                meter_id: {
+                    "name": name,
+                    "value": value,
+                    "date": "2024-01-02",
+                    "updated": "2024-01-02T00:00:00+00:00",
+                    "stale": False,
+                }
+                for meter_id, (name, value) in meters.items()
+            }
+        },
+    }
+
+@pytest.mark.anyio
+async def test_entities_from_meters(mock_modules, coordinator):
+    sensor_module = mock_modules
+    coordinator.data = _meters_data({"m1": ("Kitchen", 1.0)})
+    hass = MagicMock()
+    hass.data = {"maxx_hacs_testing": {"entry": coordinator}}
+    entry = MagicMock(entry_id="entry", options={})
+    add_entities = MagicMock()
+
+    await sensor_module.async_setup_entry(hass, entry, add_entities)
+
+    entities = add_entities.call_args[0][0]
+    assert [entity._attr_unique_id for entity in entities] == [
+        "maxx_hacs_testing_entry_Water",
+        "maxx_hacs_testing_entry_Water_m1",
+    ]
+    assert [entity.native_value for entity in entities] == [1.0, 1.0]
+    assert entities[1]._attr_name == "Maxx HACS Testing Water Kitchen"
+    assert entities[1]._attr_device_class == "water"
+
+    # A meter discovered later is added without a reload
+    coordinator.data = _meters_data({"m1": ("Kitchen", 1.0), "m2": ("Bath", 2.0)})
+    listener = coordinator.async_add_listener.call_args[0][0]
+    listener()
+    added = add_entities.call_args[0][0]
+    assert [entity._attr_unique_id for entity in added] == [
+        "maxx_hacs_testing_entry_Water_m2"
+    ]
+    listener()
+    assert add_entities.call_count == 2
+
+@pytest.mark.anyio
+async def test_state_written_only_on_change(mock_modules, coordinator):
+    sensor_module = mock_modules
+    coordinator.data = _meters_data({"m1": ("Kitchen", 1.0)})
+    sensor = sensor_module.MaxxHacsTestingMeterSensor(
+        coordinator, MagicMock(entry_id="entry"), "Water", "m1"
+    )
+    await sensor.async_added_to_hass()
+
+    # A new fetch time alone does not write the state
+    coordinator.data["meters"]["Water"]["m1"]["updated"] = "2024-01-02T01:00:00+00:00"
+    sensor._handle_coordinator_update()
+    sensor.async_write_ha_state.assert_not_called()
+
+    coordinator.data["meters"]["Water"]["m1"]["value"] = 3.0
+    sensor._handle_coordinator_update()
+    sensor._handle_coordinator_update()
+    sensor.async_write_ha_state.assert_called_once()
+
+    # A meter that is no longer reported becomes unavailable
+    coordinator.data = {}
+    assert not sensor.available
+    sensor._handle_coordinator_update()
+    assert sensor.async_write_ha_state.call_count == 2
+
+@pytest.mark.anyio
+async def test_metric_sensors(mock_modules, coordinator):
+    sensor_module = mock_modules
+    coordinator.data = {}
+    coordinator.client = MagicMock()
+    coordinator.client.get_metrics = MagicMock(
+        return_value={
+            "totals": {"requests": 7, "errors": 1, "not_modified": 3, "bytes": 2048},
+            "phases": {"total": 0.5},
+        }
+    )
+    hass = MagicMock()
+    hass.data = {"maxx_hacs_testing": {"entry": coordinator}}
+    entry = MagicMock(entry_id="entry", options={"diagnostic_sensors": True})
+    add_entities = MagicMock()
+
+    await sensor_module.async_setup_entry(hass, entry, add_entities)
+
+    sensors = list(add_entities.call_args[0][0])
+    assert {sensor._attr_name: sensor.native_value for sensor in sensors} == {
+        "Maxx HACS Testing Refresh Duration": 0.5,
+        "Maxx HACS Testing Requests": 7,
+        "Maxx HACS Testing Request Errors": 1,
+        "Maxx HACS Testing Not Modified Responses": 3,
+        "Maxx HACS Testing Bytes Received": 2048,
+    }
+    assert all(sensor._attr_entity_category == "diagnostic" for sensor in sensors)
+
+
+@pytest.mark.anyio
+async def test_legacy_unique_ids_migrated(mock_modules, coordinator):
+    """Test that the original sensors move to unique ids scoped to the entry."""
+    sensor_module = mock_modules
+    hass = MagicMock()
+    hass.data = {"maxx_hacs_testing": {"entry": coordinator}}
+    entry = MagicMock(entry_id="entry", options={})
+    migrate = sensor_module.er.async_migrate_entries
+    migrate.reset_mock()
+
+    await sensor_module.async_setup_entry(hass, entry, MagicMock())
+
+    migrate.assert_awaited_once()
+    assert migrate.await_args.args[:2] == (hass, "entry")
+    migrate_unique_id = migrate.await_args.args[2]
+    assert migrate_unique_id(SimpleNamespace(unique_id="maxx_hacs_testing_water_usage")) == {
+        "new_unique_id": "maxx_hacs_testing_entry_Water"
+    }
+    assert migrate_unique_id(
+        SimpleNamespace(unique_id="maxx_hacs_testing_electricity_usage")
+    ) == {"new_unique_id": "maxx_hacs_testing_entry_Other"}
+    assert migrate_unique_id(SimpleNamespace(unique_id="maxx_hacs_testing_entry_Water_m1")) is None
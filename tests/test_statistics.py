@@ -0,0 +1,127 @@
+"""Test the long-term statistics import."""
+import os
+import sys
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+mock_recorder = SimpleNamespace(get_instance=MagicMock())
+mock_recorder_models = SimpleNamespace(StatisticData=dict, StatisticMetaData=dict)
+mock_recorder_statistics = SimpleNamespace(
+    async_add_external_statistics=MagicMock(), statistics_during_period=MagicMock()
+)
+mock_dt = SimpleNamespace(
+    start_of_local_day=lambda day: datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+)
+
+with patch.dict(sys.modules, {
+    "homeassistant.components.recorder": mock_recorder,
+    "homeassistant.components.recorder.models": mock_recorder_models,
+    "homeassistant.components.recorder.statistics": mock_recorder_statistics,
+    "homeassistant.util": SimpleNamespace(dt=mock_dt),
+}):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from custom_components.maxx_hacs_testing import statistics
+    from custom_components.maxx_hacs_testing.brunata.store import MeterSeries
+
+
+@pytest.fixture(name="recorder")
+def mock_recorder_fixture():
+    """Patch the recorder functions used by the importer."""
+    instance = MagicMock()
+    instance.async_add_executor_job = AsyncMock(
+        side_effect=lambda func, *args: func(*args)
+    )
+    add_statistics = MagicMock()
+    during_period = MagicMock(
+        return_value={"maxx_hacs_testing:entry_water_m1": [{"sum": 10.0}]}
+    )
+    with patch.dict(statistics.__dict__, {
+        "get_instance": MagicMock(return_value=instance),
+        "async_add_external_statistics": add_statistics,
+        "statistics_during_period": during_period,
+        "StatisticData": dict,
+        "StatisticMetaData": dict,
+        "dt_util": mock_dt,
+    }):
+        yield add_statistics, during_period
+
+
+def _imported(add_statistics):
+    """Return the days and sums of the last import."""
+    metadata, rows = add_statistics.call_args[0][1:]
+    assert metadata["statistic_id"] == "maxx_hacs_testing:entry_water_m1"
+    return [(row["start"].date().isoformat(), row["sum"]) for row in rows]
+
+
+@pytest.mark.anyio
+async def test_import_only_changed_days(recorder):
+    """Test that values are imported on their dates, sending only changed days."""
+    add_statistics, during_period = recorder
+    series = MeterSeries("Kitchen")
+    series.merge([("2024-01-01", 1.0), ("2024-01-02", 2.0), ("2024-01-03", 3.0)])
+    client = MagicMock()
+    client.get_daily_series = MagicMock(return_value=[("Water", "m1", series)])
+    importer = statistics.MaxxHacsTestingStatisticsImporter(MagicMock(), client, "entry")
+
+    await importer.async_import()
+    # Sums continue from what the recorder has before the first day
+    assert _imported(add_statistics) == [
+        ("2024-01-01", 11.0), ("2024-01-02", 13.0), ("2024-01-03", 16.0)
+    ]
+
+    # Nothing changed, nothing is sent
+    await importer.async_import()
+    assert add_statistics.call_count == 1
+
+    series.merge([("2024-01-02", 2.0), ("2024-01-03", 4.0), ("2024-01-04", 1.0)])
+    await importer.async_import()
+    assert _imported(add_statistics) == [("2024-01-03", 17.0), ("2024-01-04", 18.0)]
+    # The sum before the changed day is known, the recorder is asked only once
+    assert during_period.call_count == 1
+
+
+@pytest.mark.anyio
+async def test_import_retries_failed_meter(recorder):
+    """Test that the days of a meter that failed to import are sent again."""
+    add_statistics, _ = recorder
+    add_statistics.side_effect = [RuntimeError("recorder"), None]
+    series = MeterSeries("Kitchen")
+    series.merge([("2024-01-01", 1.0)])
+    client = MagicMock()
+    client.get_daily_series = MagicMock(return_value=[("Water", "m1", series)])
+    importer = statistics.MaxxHacsTestingStatisticsImporter(MagicMock(), client, "entry")
+
+    await importer.async_import()
+    await importer.async_import()
+    assert _imported(add_statistics) == [("2024-01-01", 11.0)]
+
+
+@pytest.mark.anyio
+async def test_entries_sharing_series_all_import(recorder):
+    """Test that every entry of an account imports the days that changed."""
+    add_statistics, _ = recorder
+    series = MeterSeries("Kitchen")
+    series.merge([("2024-01-01", 1.0)])
+    client = MagicMock()
+    client.get_daily_series = MagicMock(return_value=[("Water", "m1", series)])
+    first = statistics.MaxxHacsTestingStatisticsImporter(MagicMock(), client, "entry")
+    second = statistics.MaxxHacsTestingStatisticsImporter(MagicMock(), client, "other")
+
+    await first.async_import()
+    series.merge([("2024-01-02", 2.0)])
+    await first.async_import()
+    # The second entry was set up later and still gets all the days
+    await second.async_import()
+
+    days = [
+        (call.args[1]["statistic_id"], [row["start"].date().isoformat() for row in call.args[2]])
+        for call in add_statistics.call_args_list
+    ]
+    assert days == [
+        ("maxx_hacs_testing:entry_water_m1", ["2024-01-01"]),
+        ("maxx_hacs_testing:entry_water_m1", ["2024-01-02"]),
+        ("maxx_hacs_testing:other_water_m1", ["2024-01-01", "2024-01-02"]),
+    ]
@@ -0,0 +1,98 @@
+"""Tests for the consumption store and its aggregates."""
+from array import array
+from datetime import date
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Mock generic HA modules
+mock_hass = SimpleNamespace()
+mock_hass.helpers = SimpleNamespace()
+mock_hass.helpers.aiohttp_client = SimpleNamespace()
+mock_hass.helpers.aiohttp_client.async_get_clientsession = MagicMock()
+mock_hass.helpers.storage = SimpleNamespace(Store=MagicMock)
+mock_hass.helpers.event = SimpleNamespace(async_call_later=MagicMock())
+
+# Patch sys.modules BEFORE import
+with patch.dict(sys.modules, {
+    "homeassistant": mock_hass,
+    "homeassistant.helpers": mock_hass.helpers,
+    "homeassistant.helpers.aiohttp_client": mock_hass.helpers.aiohttp_client,
+    "homeassistant.helpers.storage": mock_hass.helpers.storage,
+    "homeassistant.helpers.event": mock_hass.helpers.event,
+}):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from custom_components.maxx_hacs_testing.brunata import aggregate
+    from custom_components.maxx_hacs_testing.brunata.api import Consumption, Interval
+    from custom_components.maxx_hacs_testing.brunata.store import ConsumptionStore, MeterSeries
+
+def test_meter_series():
+    """Test merging into and reading from the columnar meter series."""
+    series = MeterSeries("Kitchen")
+    assert series.merge([("2026-01-02", 2.0), ("2026-01-03", 3.0)]) == 2
+    # Unchanged values are not counted, older and changed values are
+    assert series.merge([("2026-01-03", 3.0), ("2026-01-01", 1.0), ("2026-01-02", 2.5)]) == 2
+
+    assert series.latest() == ("2026-01-03", 3.0)
+    assert series.range("2026-01-02", "2026-01-05") == [("2026-01-02", 2.5), ("2026-01-03", 3.0)]
+    assert series.values == {"2026-01-01": 1.0, "2026-01-02": 2.5, "2026-01-03": 3.0}
+    assert max(series.values) == "2026-01-03"
+    assert "2026-01-04" not in series.values
+
+    monthly = MeterSeries("Kitchen", monthly=True)
+    monthly.merge([("2026-12", 5.0), ("2027-01", 6.0)])
+    assert monthly.range("2026-12", "2026-12") == [("2026-12", 5.0)]
+    assert monthly.latest() == ("2027-01", 6.0)
+
+def test_monthly_sums_and_derived_months():
+    """Test that daily values are summed per month, only for covered months."""
+    days = ["2026-01-30", "2026-01-31", "2026-02-01", "2026-02-28", "2026-04-02"]
+    ordinals = array("i", (date.fromisoformat(day).toordinal() for day in days))
+    values = array("d", [1.0, 2.0, 3.0, 4.0, 5.0])
+    assert aggregate.monthly_sums(ordinals, values) == [
+        (2026 * 12, 3.0), (2026 * 12 + 1, 7.0), (2026 * 12 + 3, 5.0)
+    ]
+    assert aggregate.monthly_sums(array("i"), array("d")) == []
+
+    store = ConsumptionStore()
+    store.merge(Consumption.WATER, Interval.DAY, "1", "Kitchen", zip(days, values))
+    store.derive_months(Consumption.WATER, "1")
+    # January only has the last days, it is left to the API
+    assert dict(store.meters(Consumption.WATER, Interval.MONTH)["1"].items()) == {
+        "2026-02": 7.0, "2026-04": 5.0
+    }
+    store.merge(Consumption.WATER, Interval.DAY, "1", "Kitchen", [("2026-04-03", 1.5)])
+    store.derive_months(Consumption.WATER, "1", "2026-04-03")
+    assert store.latest(Consumption.WATER, Interval.MONTH) == {"1": ("2026-04", 6.5)}
+
+def test_monthly_sums_numpy_matches_pure_python():
+    """Test that the vectorized sums equal the pure Python ones."""
+    numpy = pytest.importorskip("numpy")
+    start = date(2023, 11, 15).toordinal()
+    ordinals = array("i", range(start, start + 3000, 2))
+    values = array("d", (index % 7 * 0.25 for index in range(len(ordinals))))
+    with patch.object(aggregate, "NUMPY_MIN_VALUES", len(ordinals) + 1):
+        expected = aggregate.monthly_sums(ordinals, values)
+    assert aggregate._numpy_sums(numpy, ordinals, values) == pytest.approx(expected)
+
+def test_consumption_store_aggregates_all_meters():
+    """Test the latest-value index and aggregates over all meters of a type."""
+    store = ConsumptionStore()
+    store.merge(Consumption.WATER, Interval.DAY, "1", "Kitchen", [("2026-01-01", 1.0), ("2026-01-02", 2.0)])
+    store.merge(Consumption.WATER, Interval.DAY, "2", "Bath", [("2026-01-02", 3.0)])
+    store.merge(Consumption.WATER, Interval.DAY, "3", "Old", [("2025-12-31", 9.0)])
+
+    assert store.latest(Consumption.WATER, Interval.DAY) == {
+        "1": ("2026-01-02", 2.0),
+        "2": ("2026-01-02", 3.0),
+        "3": ("2025-12-31", 9.0),
+    }
+    # Meters without a value for the newest date don't count
+    assert store.aggregate(Consumption.WATER, Interval.DAY, "sum") == ("2026-01-02", 5.0)
+    assert store.aggregate(Consumption.WATER, Interval.DAY, "latest") == ("2026-01-02", 2.0)
+    assert store.aggregate(Consumption.HEATING, Interval.DAY) is None
+    with pytest.raises(ValueError):
+        store.aggregate(Consumption.WATER, Interval.DAY, "mean")